@@ -0,0 +1,11 @@
+"""Configuration for benchmark app"""
+
+from django.apps import AppConfig
+
+
+class BenchConf(AppConfig):
+    """Config for benchmark app holding synthetic point, line and polygon datasets"""
+
+    name = "benchmarks.bench_app"
+    label = "bench_app"
+    default_auto_field = "django.db.models.BigAutoField"
@@ -0,0 +1,40 @@
+"""Models holding synthetic datasets used in benchmarks"""
+
+from django.contrib.gis.db import models
+
+from django_mapengine.managers import MVTManager
+
+COLUMNS = ["id", "name", "category", "value"]
+
+
+class BenchFeature(models.Model):
+    """Abstract benchmark feature; `prepared_tiles` runs tile queries as prepared statements"""
+
+    name = models.CharField(max_length=255)
+    category = models.IntegerField()
+    value = models.FloatField()
+
+    objects = models.Manager()
+    vector_tiles = MVTManager(columns=COLUMNS)
+    prepared_tiles = MVTManager(columns=COLUMNS, parameterized=True)
+
+    class Meta:
+        abstract = True
+
+
+class BenchPoint(BenchFeature):
+    """Synthetic points"""
+
+    geom = models.PointField(srid=4326, spatial_index=True)
+
+
+class BenchLine(BenchFeature):
+    """Synthetic lines"""
+
+    geom = models.LineStringField(srid=4326, spatial_index=True)
+
+
+class BenchPolygon(BenchFeature):
+    """Synthetic polygons"""
+
+    geom = models.PolygonField(srid=4326, spatial_index=True)
@@ -0,0 +1,91 @@
+"""
+Synthetic point, line and polygon datasets for benchmarks
+
+Features are generated by PostGIS within given bounding box using a fixed seed, thus datasets are reproducible.
+"""
+
+from typing import Optional
+
+from django.db import connection
+
+# Germany
+DEFAULT_BBOX = (5.9, 47.3, 15.0, 55.0)
+
+GEOMETRIES = {
+    "BenchPoint": "ST_MakePoint(x, y)",
+    "BenchLine": (
+        "ST_MakeLine(ARRAY[ST_MakePoint(x, y), ST_MakePoint(x + dx, y + dy), ST_MakePoint(x + 2 * dx, y - dy)])"
+    ),
+    "BenchPolygon": "ST_Buffer(ST_MakePoint(x, y), 0.001 + abs(dx), 8)",
+}
+
+
+def get_models() -> dict:
+    """Return benchmark models by name"""
+    # pylint: disable=C0415
+    from benchmarks.bench_app import models
+
+    return {name: getattr(models, name) for name in GEOMETRIES}
+
+
+def get_fixture_key(size: int, bbox: tuple[float, float, float, float], seed: float) -> str:
+    """Return key of generated dataset, which is stored as table comment in order to detect changed parameters"""
+    return f"mapengine benchmark fixture: size={size} bbox={','.join(map(str, bbox))} seed={seed}"
+
+
+def get_table_comment(table: str) -> Optional[str]:
+    """Return comment of given table"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT obj_description(%s::regclass, 'pg_class')", [connection.ops.quote_name(table)])
+        return cursor.fetchone()[0]
+
+
+def load(sizes: dict[str, int], bbox: tuple[float, float, float, float] = DEFAULT_BBOX, seed: float = 0.42) -> None:
+    """
+    Create tables of benchmark models and fill them with synthetic features
+
+    Tables are only rebuilt, if size, bounding box or seed differ from parameters used to fill them
+    (stored as table comment).
+
+    Parameters
+    ----------
+    sizes : dict[str, int]
+        Number of features per model name ("BenchPoint", "BenchLine", "BenchPolygon")
+    bbox : tuple[float, float, float, float]
+        WGS84 bounding box features are generated in
+    seed : float
+        Seed of random generator in PostGIS (between -1 and 1)
+    """
+    tables = connection.introspection.table_names()
+    xmin, ymin, xmax, ymax = bbox
+    for name, model in get_models().items():
+        table = model._meta.db_table  # noqa: SLF001  # pylint: disable=W0212
+        fixture_key = get_fixture_key(sizes[name], bbox, seed)
+        if table in tables and get_table_comment(table) == fixture_key:
+            continue
+        with connection.schema_editor() as editor:
+            if table in tables:
+                editor.delete_model(model)
+            editor.create_model(model)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT setseed(%s)", [seed])
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(table)} (name, category, value, geom) "  # noqa: S608
+                f"SELECT 'feature ' || i, floor(random() * 10)::int, random() * 100, "
+                f"ST_SetSRID({GEOMETRIES[name]}, 4326) "
+                "FROM ("
+                "SELECT i, %s + random() * %s AS x, %s + random() * %s AS y, "
+                "(random() - 0.5) * 0.02 AS dx, (random() - 0.5) * 0.02 AS dy "
+                "FROM generate_series(1, %s) i"
+                ") AS p",
+                [xmin, xmax - xmin, ymin, ymax - ymin, sizes[name]],
+            )
+            cursor.execute(f"COMMENT ON TABLE {connection.ops.quote_name(table)} IS %s", [fixture_key])
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+
+def get_postgis_version() -> str:
+    """Return PostGIS version of benchmark database"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT postgis_full_version()")
+        return cursor.fetchone()[0]
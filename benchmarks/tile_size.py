@@ -0,0 +1,81 @@
+"""
+Benchmark comparing bytes per tile with and without per-zoom column sets and size pruning
+
+Compares MVTs of all sources in `MAP_ENGINE_API_MVTS` as set up in project settings ("after")
+against MVTs using all non-geometry columns and no size pruning ("before").
+Needs a project database holding data for the sources.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=config.settings python benchmarks/tile_size.py --zooms 8 9 10 --tiles 20
+"""
+
+import argparse
+import copy
+import itertools
+import json
+
+import django
+
+
+def get_unpruned_layers(layers):
+    """Return layers using all non-geometry columns without size pruning"""
+    # pylint: disable=C0415
+    from django_mapengine import mvt
+
+    unpruned_layers = []
+    for layer in layers:
+        manager = copy.copy(layer.queryset)
+        manager.columns = None
+        manager.min_area = None
+        manager.min_length = None
+        unpruned_layers.append(mvt.MVTSourceLayer(layer.name, queryset=manager))
+    return unpruned_layers
+
+
+def run(zooms: list[int], num_tiles: int) -> dict:
+    """Render sample tiles for each source and zoom and return bytes per tile before and after pruning"""
+    # pylint: disable=C0415
+    from django.conf import settings
+
+    from django_mapengine import distill, mvt, utils
+
+    results = {}
+    for source, mvt_apis in settings.MAP_ENGINE_API_MVTS.items():
+        layers = [mvt.MVTSourceLayer(api.layer_id, queryset=api.manager, columns=api.columns) for api in mvt_apis]
+        after = mvt.MVTView(source=source, layers=layers)
+        before = mvt.MVTView(source=source, layers=get_unpruned_layers(layers))
+        extent = distill.get_source_extent(distill.get_source_managers(source))
+        if extent is None:
+            continue
+        results[source] = {}
+        for z in zooms:
+            tiles = list(itertools.islice(utils.get_tiles_for_bbox(extent, z), num_tiles))
+            bytes_before = [len(before._create_mvt(z, x, y, {}) or b"") for x, y in tiles]  # pylint: disable=W0212
+            bytes_after = [len(after._create_mvt(z, x, y, {}) or b"") for x, y in tiles]  # pylint: disable=W0212
+            results[source][z] = {
+                "tiles": len(tiles),
+                "bytes_per_tile_before": sum(bytes_before) / len(tiles),
+                "bytes_per_tile_after": sum(bytes_after) / len(tiles),
+            }
+    return results
+
+
+def main():
+    """Parse arguments, run benchmark and print results"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zooms", type=int, nargs="+", default=[8, 9, 10, 11, 12])
+    parser.add_argument("--tiles", type=int, default=20, help="Number of tiles per source and zoom")
+    args = parser.parse_args()
+
+    django.setup()
+    results = run(args.zooms, args.tiles)
+    for source, zoom_results in results.items():
+        for z, result in zoom_results.items():
+            before, after = result["bytes_per_tile_before"], result["bytes_per_tile_after"]
+            reduction = 1 - after / before if before else 0
+            print(f"{source:<20} z={z:<3} before={before:>10.0f} B after={after:>10.0f} B ({reduction:.0%} smaller)")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from typing import Dict, List, Tuple
 
 import environ
 from appconf import AppConf
+from django.apps import AppConfig
 from django.conf import settings
 
 from . import choropleth, setup
@@ -95,6 +96,79 @@ class MapEngineConf(AppConf):
     SOURCES = []
     LAYERS = []
 
+    # TILE CACHE
+    # Set to an instance of `django_mapengine.cache.TileCache` in order to cache rendered MVTs
+    TILE_CACHE = None
+
+    # TILE COMPRESSION
+    # Compress rendered and distilled MVTs once using "gzip" or "br" (requires package `brotli`); None disables it
+    TILE_COMPRESSION = None
+    # Compression level of live tiles, defaults to 6 (gzip) or 5 (brotli); distilled tiles use highest level
+    TILE_COMPRESSION_LEVEL = None
+
+    # CONDITIONAL TILE REQUESTS
+    # Track data revision per model (via signals) in order to answer "If-None-Match" without rendering tiles;
+    # otherwise, ETags are derived from tile content
+    TILE_REVISIONS = False
+    # Django cache holding data revisions
+    REVISION_CACHE = "default"
+    # Cache-Control header of live tiles; "no-cache" lets clients revalidate each tile using its ETag
+    TILE_CACHE_CONTROL = "no-cache"
+
+    # METRICS
+    # Set to instance (or list of instances) of `django_mapengine.metrics.MetricsSink` in order to record metrics
+    METRICS = None
+    # Expose metrics of in-memory sink at URL "metrics/" (off by default, as metrics reveal sources and traffic)
+    METRICS_VIEW = False
+    # IP addresses allowed to request metrics URL; None allows any client (protect URL by other means then)
+    METRICS_ALLOWED_IPS = None
+
+    # SLOW TILES
+    # Seconds after which tile queries are explained (`EXPLAIN (ANALYZE, BUFFERS)`) and stored as `SlowTile`;
+    # None disables profiling
+    SLOW_TILE_THRESHOLD = None
+    # Fraction of slow tiles being explained (EXPLAIN ANALYZE runs tile queries again)
+    SLOW_TILE_SAMPLE_RATE = 1.0
+
+    # CLUSTERS
+    # Maximum number of decimal digits of coordinates in cluster GeoJSONs (also used, if no zoom is requested)
+    CLUSTER_PRECISION = 6
+    # Number of features fetched from server-side cursor at once while streaming cluster GeoJSONs
+    CLUSTER_CHUNK_SIZE = 2000
+    # Folder holding compressed snapshots of cluster GeoJSONs written by `mapengine_cluster_snapshots`; None disables
+    # snapshots. Snapshots are outdated by data revisions (see `TILE_REVISIONS`), if activated.
+    CLUSTER_SNAPSHOT_DIR = None
+
+    # TILE HITS
+    # Count requests of unfiltered tiles in order to pre-warm tile cache with most requested tiles (`mapengine_prewarm`)
+    RECORD_TILE_HITS = False
+    # Seconds between writes of counted requests to database
+    TILE_HIT_FLUSH_INTERVAL = 60
+
+    # MVT QUERIES
+    # Encode all layers of a source in one query ("combined") or each layer in its own, concurrent query ("layers")
+    MVT_QUERY_MODE = "combined"
+    # Maximum number of threads running layer queries (mode "layers")
+    LAYER_WORKERS = 4
+
+    # REQUEST COALESCING
+    # Render tile only once for concurrent requests of same tile within process
+    TILE_COALESCING = True
+    # Django cache (shared by all workers) holding locks, thus only one worker renders a tile; requires tile cache
+    TILE_LOCK_CACHE = None
+    # Seconds until lock expires; waiting workers render tile on their own afterwards
+    TILE_LOCK_TIMEOUT = 10
+
+    # ASYNC MVTS
+    # Serve live MVTs via async views (requires ASGI and packages `psycopg` and `psycopg-pool`)
+    ASYNC_MVTS = False
+    # Django database used by async connection pool
+    ASYNC_DATABASE = "default"
+    ASYNC_POOL_MIN_SIZE = 2
+    ASYNC_POOL_MAX_SIZE = 20
+    # Maximum number of concurrent tile queries per source
+    ASYNC_SOURCE_CONCURRENCY = 10
+
     # LAYERS
     LAYERS_AT_STARTUP: List[str] = []
 
@@ -108,6 +182,14 @@ class MapEngineConf(AppConf):
     POPUPS: List[str] = []
 
     # DISTILL
+    # Record extents of changed features via signals in order to re-distill affected tiles only
+    TRACK_CHANGES = False
+    # Either derive distilled tiles from data extent of each source ("data") or use fixed rectangle below ("fixed")
+    DISTILL_EXTENT = "data"
+    # Store distilled tiles as single files ("files") or as one MBTiles archive per source ("mbtiles")
+    DISTILL_FORMAT = "files"
+    # Folder holding MBTiles archives, defaults to DISTILL_DIR
+    DISTILL_ARCHIVE_DIR = None
     X_AT_MIN_Z = 136
     Y_AT_MIN_Z = 84
     X_OFFSET = 1  # Defines how many tiles to the right are added at first level
@@ -124,3 +206,20 @@ class MapEngineConf(AppConf):
         """
 
         prefix = "MAP_ENGINE"
+
+
+class MapEngineConfig(AppConfig):
+    """Django app config for mapengine"""
+
+    name = "django_mapengine"
+    default_auto_field = "django.db.models.BigAutoField"
+
+    def ready(self):
+        """Connect signals to track changes of features and data revisions"""
+        # pylint: disable=C0415
+        from . import signals
+
+        if settings.MAP_ENGINE_TRACK_CHANGES:
+            signals.connect_change_tracking()
+        if settings.MAP_ENGINE_TILE_REVISIONS:
+            signals.connect_revision_tracking()
@@ -0,0 +1,185 @@
+"""Module to store distilled MVTs in MBTiles archives (one SQLite file per source) and read tiles from them."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+# Memory-map up to 1 GB of each archive when reading tiles
+MMAP_SIZE = 1024**3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS map (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT,
+    PRIMARY KEY (zoom_level, tile_column, tile_row)
+);
+CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+CREATE VIEW IF NOT EXISTS tiles AS
+    SELECT map.zoom_level, map.tile_column, map.tile_row, images.tile_data
+    FROM map JOIN images ON images.tile_id = map.tile_id;
+"""
+
+
+def get_archive_dir() -> Optional[pathlib.Path]:
+    """Return folder holding MBTiles archives (setting `MAP_ENGINE_DISTILL_ARCHIVE_DIR`, defaults to `DISTILL_DIR`)"""
+    archive_dir = settings.MAP_ENGINE_DISTILL_ARCHIVE_DIR or getattr(settings, "DISTILL_DIR", None)
+    return pathlib.Path(archive_dir) if archive_dir else None
+
+
+def get_archive_path(source: str, archive_dir: Optional[pathlib.Path] = None) -> pathlib.Path:
+    """Return path to MBTiles archive of given source"""
+    archive_dir = archive_dir or get_archive_dir()
+    if archive_dir is None:
+        raise RuntimeError("Set 'MAP_ENGINE_DISTILL_ARCHIVE_DIR' or 'DISTILL_DIR' in order to use MBTiles archives.")
+    return archive_dir / f"{source}.mbtiles"
+
+
+def flip_y(z: int, y: int) -> int:
+    """Convert XYZ tile row to TMS tile row (as used in MBTiles) and vice versa"""
+    return 2**z - 1 - y
+
+
+class MBTilesWriter:
+    """
+    Writes tiles into MBTiles archive
+
+    Identical tiles (i.e. fully covered tiles of large polygons) are stored only once.
+    If `replace` is set, archive is written to a temporary file, which replaces existing archive on `close()`;
+    thus, archive can be served meanwhile. Otherwise, tiles are updated in place.
+    Tiles are expected to be compressed with given encoding already, which is stored in metadata.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        path: pathlib.Path,
+        source: str,
+        *,
+        replace: bool = False,
+        resume: bool = False,
+        encoding: Optional[str] = None,
+    ) -> None:  # pylint: disable=R0913
+        self.path = pathlib.Path(path)
+        self.replace = replace
+        self.write_path = self.path.with_name(f"{self.path.name}.tmp") if replace else self.path
+        self.write_path.parent.mkdir(parents=True, exist_ok=True)
+        if replace and not resume:
+            self.write_path.unlink(missing_ok=True)
+        self.connection = sqlite3.connect(self.write_path)
+        self.connection.executescript(SCHEMA)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+            [
+                ("name", source),
+                ("format", "pbf"),
+                ("minzoom", str(settings.MAP_ENGINE_MIN_ZOOM)),
+                ("maxzoom", str(settings.MAP_ENGINE_MAX_DISTILLED_ZOOM)),
+                ("compression", encoding or "none"),
+            ],
+        )
+
+    def write_tiles(self, z: int, x: int, tiles: Iterable[tuple[int, bytes]]) -> None:
+        """
+        Write tiles of one tile column; empty tiles are removed from archive
+
+        Parameters
+        ----------
+        z : int
+            Zoom level
+        x : int
+            x-coordinate of tile column
+        tiles : Iterable[tuple[int, bytes]]
+            y-coordinate and data of each tile
+        """
+        with self.connection:
+            for y, tile in tiles:
+                if not tile:
+                    self.connection.execute(
+                        "DELETE FROM map WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                        (z, x, flip_y(z, y)),
+                    )
+                    continue
+                tile_id = hashlib.sha1(tile).hexdigest()  # noqa: S324
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)", (tile_id, sqlite3.Binary(tile))
+                )
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+                    (z, x, flip_y(z, y), tile_id),
+                )
+
+    def close(self) -> None:
+        """Remove unused tiles, close archive and replace former archive if needed"""
+        with self.connection:
+            self.connection.execute("DELETE FROM images WHERE tile_id NOT IN (SELECT tile_id FROM map)")
+        self.connection.close()
+        if self.replace:
+            os.replace(self.write_path, self.path)
+
+
+class MBTilesReader:
+    """
+    Reads tiles from MBTiles archive using memory-mapped I/O
+
+    Connections are opened read-only per thread and reopened if archive has been replaced.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = pathlib.Path(path)
+        self._local = threading.local()
+
+    def _get_connection(self) -> Optional[sqlite3.Connection]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if getattr(self._local, "version", None) != version:
+            if getattr(self._local, "connection", None) is not None:
+                self._local.connection.close()
+            connection = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True)
+            connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            row = connection.execute("SELECT value FROM metadata WHERE name = 'compression'").fetchone()
+            self._local.connection = connection
+            self._local.encoding = row[0] if row and row[0] != "none" else None
+            self._local.version = version
+        return self._local.connection
+
+    def get_encoding(self) -> Optional[str]:
+        """Return content encoding of tiles in archive or None if tiles are not compressed"""
+        if self._get_connection() is None:
+            return None
+        return self._local.encoding
+
+    def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """
+        Return tile from archive
+
+        Parameters
+        ----------
+        z : int
+            Zoom level
+        x : int
+            x-coordinate of tile
+        y : int
+            y-coordinate of tile (XYZ scheme)
+
+        Returns
+        -------
+        Optional[bytes]
+            Tile data or None if tile (or archive) does not exist
+        """
+        connection = self._get_connection()
+        if connection is None:
+            return None
+        row = connection.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, flip_y(z, y)),
+        ).fetchone()
+        return bytes(row[0]) if row else None
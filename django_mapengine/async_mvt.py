@@ -0,0 +1,256 @@
+"""
+Module containing async MVT views, which run tile queries via psycopg 3 async connection pools under ASGI
+
+Requires package `psycopg` incl. pool (install via `pip install django-mapengine[async]`) and Django >= 4.1
+(which dispatches async handlers of class-based views).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from typing import Optional
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.serializers import ValidationError
+
+from . import cache, coalesce, compression, metrics, prewarm, profiling
+from .mvt import BYTE_BUDGET_ATTEMPTS, MVTView
+
+_pools = {}
+_semaphores = {}
+
+
+def _get_pool_class():  # noqa: ANN202
+    try:
+        from psycopg_pool import AsyncConnectionPool  # pylint: disable=C0415
+    except ImportError as error:
+        raise ImportError(
+            "Async MVT views require packages 'psycopg' and 'psycopg-pool', "
+            "install them via 'pip install django-mapengine[async]'."
+        ) from error
+    return AsyncConnectionPool
+
+
+def get_conninfo(alias: str) -> str:
+    """Return libpq connection string for given django database"""
+    # pylint: disable=C0415
+    from psycopg.conninfo import make_conninfo
+
+    database = settings.DATABASES[alias]
+    params = {
+        "dbname": database.get("NAME"),
+        "user": database.get("USER"),
+        "password": database.get("PASSWORD"),
+        "host": database.get("HOST"),
+        "port": database.get("PORT"),
+    }
+    params.update(database.get("OPTIONS", {}))
+    return make_conninfo(**{key: value for key, value in params.items() if value})
+
+
+async def _open_pool(alias: str):  # noqa: ANN202
+    pool = _get_pool_class()(
+        get_conninfo(alias),
+        min_size=settings.MAP_ENGINE_ASYNC_POOL_MIN_SIZE,
+        max_size=settings.MAP_ENGINE_ASYNC_POOL_MAX_SIZE,
+        open=False,
+    )
+    await pool.open()
+    return pool
+
+
+async def get_pool():  # noqa: ANN201
+    """
+    Return async connection pool of database `MAP_ENGINE_ASYNC_DATABASE`; pool is opened on first request
+
+    Returns
+    -------
+    AsyncConnectionPool
+        Pool sized by `MAP_ENGINE_ASYNC_POOL_MIN_SIZE` and `MAP_ENGINE_ASYNC_POOL_MAX_SIZE`
+    """
+    alias = settings.MAP_ENGINE_ASYNC_DATABASE
+    if alias not in _pools:
+        # Concurrent first requests wait for same pool to be opened
+        _pools[alias] = asyncio.ensure_future(_open_pool(alias))
+    return await _pools[alias]
+
+
+async def close_pools() -> None:
+    """Close all connection pools (i.e. on ASGI lifespan shutdown)"""
+    while _pools:
+        _, pool = _pools.popitem()
+        await (await pool).close()
+
+
+def get_semaphore(source: Optional[str]) -> asyncio.Semaphore:
+    """Return semaphore bounding number of concurrent tile queries of given source"""
+    if source not in _semaphores:
+        _semaphores[source] = asyncio.Semaphore(settings.MAP_ENGINE_ASYNC_SOURCE_CONCURRENCY)
+    return _semaphores[source]
+
+
+class AsyncMVTView(View):
+    """
+    Async variant of MVTView
+
+    Building tile queries via django ORM and accessing tile cache and data revisions are run in threads,
+    whereas tile queries are run via async connection pool without blocking a worker thread.
+    Number of concurrent tile queries per source is bounded by `MAP_ENGINE_ASYNC_SOURCE_CONCURRENCY`,
+    thus a map pan on a single source cannot exhaust the pool.
+    """
+
+    source: Optional[str] = None
+    layers: list = []
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        # Sync view is used to build tile queries and set headers
+        self.mvt_view = MVTView(source=self.source, layers=self.layers)
+
+    async def get(self, request, z, x, y):  # noqa: ANN001,ANN201
+        """Return MVT, 204 response if tile is empty or 400 response if filters are invalid"""
+        start = time.perf_counter()
+        response = await self._get_response(request, z, x, y)
+        metrics.record_tile(self.source, z, response.status_code, time.perf_counter() - start)
+        return response
+
+    async def _get_response(self, request, z, x, y):  # noqa: ANN001,ANN202
+        params = request.GET.dict()
+        mvt = b""
+        status = 400
+        encoding = compression.get_encoding()
+
+        prewarm.record_hit(self.source, z, x, y, params)
+
+        version, last_modified, not_modified = await sync_to_async(self.mvt_view._check_revision)(  # noqa: SLF001
+            request, encoding
+        )
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            mvt = await self._get_mvt(z, x, y, params, version)
+            status = 200 if mvt else 204
+        except ValidationError:
+            pass
+
+        if mvt:
+            metrics.observe("mapengine_tile_bytes", len(mvt), source=self.source, z=z)
+        mvt, content_encoding = compression.negotiate(request, mvt, encoding)
+        response = HttpResponse(mvt, content_type="application/vnd.mapbox-vector-tile", status=status)
+        compression.set_encoding_headers(response, content_encoding, compressed=encoding is not None)
+        # pylint: disable=W0212
+        return self.mvt_view._set_validators(request, response, mvt, version, last_modified, encoding)  # noqa: SLF001
+
+    async def _get_mvt(self, z, x, y, filters, version=None):  # noqa: ANN001,ANN202
+        """Return MVT from tile cache if activated, otherwise MVT is rendered (and cached); requests are coalesced"""
+        if self.source is None:
+            return await self._render_mvt(z, x, y, filters)
+        tile_cache = cache.get_tile_cache()
+        # pylint: disable=W0212
+        if version is None:
+            cache_filters = await sync_to_async(self.mvt_view._get_cache_filters)(filters)  # noqa: SLF001
+        else:
+            cache_filters = self.mvt_view._get_cache_filters(filters, version)  # noqa: SLF001
+        rendered = []
+
+        async def render_mvt():  # noqa: ANN202
+            rendered.append(True)
+            return await self._render_mvt(z, x, y, filters)
+
+        if tile_cache is None:
+            render = render_mvt
+        else:
+            render = functools.partial(
+                coalesce.aget_or_render, tile_cache, self.source, z, x, y, cache_filters, render_mvt
+            )
+        if settings.MAP_ENGINE_TILE_COALESCING:
+            key = coalesce.get_flight_key(self.source, z, x, y, cache_filters)
+            mvt = await coalesce.async_single_flight.do(key, render)
+        else:
+            mvt = await render()
+        if tile_cache is not None:
+            metrics.increment("mapengine_tile_cache_total", source=self.source, result="miss" if rendered else "hit")
+        return mvt
+
+    async def _render_mvt(self, z, x, y, filters):  # noqa: ANN001,ANN202
+        """Create MVT and compress it, if tile compression is activated"""
+        start = time.perf_counter()
+        mvt = await self._create_mvt(z, x, y, filters)
+        seconds = time.perf_counter() - start
+        if self.layers and profiling.is_slow(seconds):
+            # pylint: disable=W0212
+            queries = await sync_to_async(self.mvt_view._get_profile_queries)(z, x, y, filters)  # noqa: SLF001
+            profiling.record_slow_tile(self.source, z, x, y, filters, seconds, queries)
+        encoding = compression.get_encoding()
+        if mvt and encoding is not None:
+            with metrics.timer("mapengine_tile_compress_seconds", source=self.source, z=z):
+                mvt = await sync_to_async(compression.compress, thread_sensitive=False)(mvt, encoding)
+        return mvt
+
+    async def _create_mvt(self, z, x, y, filters):  # noqa: ANN001,ANN202
+        if not self.layers:
+            return b""
+        if settings.MAP_ENGINE_MVT_QUERY_MODE == "layers":
+            return await self._create_layer_mvts(z, x, y, filters)
+        # pylint: disable=W0212
+        query, params = await sync_to_async(self.mvt_view._get_mvt_query)(z, x, y, filters)  # noqa: SLF001
+        with metrics.timer("mapengine_tile_sql_seconds", source=self.source, z=z):
+            mvt_rows = await self._fetch(query, params)
+        layer_mvts = [bytes(row[0]) for row in mvt_rows]
+        features = [row[1] if len(row) > 1 else 0 for row in mvt_rows]
+        await self._apply_byte_budgets(layer_mvts, features, range(len(self.layers)), z, x, y, filters)
+        self.mvt_view._record_all_layer_metrics(layer_mvts, features)  # noqa: SLF001
+        return b"".join(layer_mvts)
+
+    async def _apply_byte_budgets(self, layer_mvts, features, indices, z, x, y, filters):  # noqa: ANN001,ANN202
+        """Re-encode given layers exceeding their byte budget with fewer features"""
+        # pylint: disable=W0212,R0913
+        for i in indices:
+            for _ in range(BYTE_BUDGET_ATTEMPTS):
+                query = await sync_to_async(self.mvt_view._get_byte_budget_query)(  # noqa: SLF001
+                    i, layer_mvts[i], features[i], z, x, y, filters
+                )
+                if query is None:
+                    break
+                rows = await self._fetch(query[1], query[2])
+                layer_mvts[i], features[i] = bytes(rows[0][0]), rows[0][1]
+
+    async def _create_layer_mvts(self, z, x, y, filters):  # noqa: ANN001,ANN202
+        """Create MVT by encoding layers independently; queries of layers are run concurrently"""
+        # pylint: disable=W0212
+        indices = range(len(self.layers))
+        queries = await sync_to_async(self.mvt_view._get_layer_queries)(indices, z, x, y, filters)  # noqa: SLF001
+        with metrics.timer("mapengine_tile_sql_seconds", source=self.source, z=z):
+            results = await asyncio.gather(*(self._fetch(query, params) for _, query, params, _ in queries))
+        layer_mvts, features = self.mvt_view._collect_layer_mvts(results)  # noqa: SLF001
+        await self._apply_byte_budgets(layer_mvts, features, indices, z, x, y, filters)
+        self.mvt_view._record_all_layer_metrics(layer_mvts, features)  # noqa: SLF001
+        return b"".join(layer_mvts)
+
+    async def _fetch(self, query, params):  # noqa: ANN001,ANN202
+        """Run query via connection pool, bounded by concurrency limit of source"""
+        pool = await get_pool()
+        async with get_semaphore(self.source), pool.connection() as conn:
+            # psycopg prepares statements by itself after being executed several times on same connection
+            cursor = await conn.execute(query, params or None)
+            return await cursor.fetchall()
+
+
+def async_mvt_view_factory(classname, layers):  # noqa: ANN001,ANN201
+    """Factory method for creating async MVT views from settings"""
+    if django.VERSION < (4, 1):
+        # Older versions of django do not await async handlers of class-based views
+        raise ImproperlyConfigured("Async MVT views ('MAP_ENGINE_ASYNC_MVTS') require Django >= 4.1.")
+    return type(
+        f"{classname}AsyncMVTView",
+        (AsyncMVTView,),
+        {"source": classname, "layers": layers},
+    ).as_view()
@@ -0,0 +1,434 @@
+"""Module holding server-side caches for rendered MVTs."""
+
+from __future__ import annotations
+
+import abc
+import hashlib
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_filter_key(filters: Optional[dict] = None) -> str:
+    """
+    Return normalized key for given filters
+
+    Order of filters does not matter, as filters are sorted before hashing.
+
+    Parameters
+    ----------
+    filters : Optional[dict]
+        Filters given in tile request
+
+    Returns
+    -------
+    str
+        Hash of sorted filters or "all" if no filters are given
+    """
+    if not filters:
+        return "all"
+    normalized = urlencode(sorted((str(key), str(value)) for key, value in filters.items()))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]  # noqa: S324
+
+
+class TileCache(abc.ABC):
+    """
+    Base class for MVT caches
+
+    Tiles are cached by source, z, x, y and normalized filters.
+    Timeouts (in seconds) can be set globally via `timeout` or per source via `timeouts`;
+    a timeout of None means tiles are cached until source is invalidated.
+    """
+
+    def __init__(self, timeout: Optional[int] = None, timeouts: Optional[dict[str, Optional[int]]] = None) -> None:
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+
+    def get_timeout(self, source: str) -> Optional[int]:
+        """Return timeout for given source"""
+        return self.timeouts.get(source, self.timeout)
+
+    @abc.abstractmethod
+    def get(self, source: str, z: int, x: int, y: int, filters: Optional[dict] = None) -> Optional[bytes]:
+        """
+        Return cached tile
+
+        Parameters
+        ----------
+        source : str
+            Name of MVT source
+        z : int
+            z-coordinate of tile
+        x : int
+            x-coordinate of tile
+        y : int
+            y-coordinate of tile
+        filters : Optional[dict]
+            Filters applied to tile
+
+        Returns
+        -------
+        Optional[bytes]
+            Cached tile (empty tiles are cached as b"") or None if tile is not cached
+        """
+
+    # pylint: disable=R0913
+    @abc.abstractmethod
+    def set(self, source: str, z: int, x: int, y: int, filters: Optional[dict], tile: bytes) -> None:  # noqa: PLR0913
+        """Store tile in cache"""
+
+    @abc.abstractmethod
+    def invalidate(self, source: str) -> None:
+        """Remove all cached tiles of given source"""
+
+    def clear(self) -> None:
+        """Remove all cached tiles (of MVT sources and server-side clusters)"""
+        for source in get_sources():
+            self.invalidate(source)
+
+
+class DjangoTileCache(TileCache):
+    """
+    Tile cache using one of the django cache backends
+
+    Eviction is left to the cache backend (i.e. `MAX_ENTRIES` of local memory cache or LRU policy of redis).
+    As django caches cannot delete keys by prefix, each source holds a generation counter which is part of the key;
+    invalidating a source increments the counter and thus orphans all tiles of the former generation.
+    """
+
+    def __init__(
+        self,
+        cache_alias: str = "default",
+        timeout: Optional[int] = None,
+        timeouts: Optional[dict[str, Optional[int]]] = None,
+    ) -> None:
+        super().__init__(timeout, timeouts)
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):  # noqa: ANN201
+        """Return django cache backend"""
+        return caches[self.cache_alias]
+
+    def _get_generation(self, source: str) -> int:
+        generation_key = f"mapengine:tiles:{source}:generation"
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            # Generation is only initialized on a miss, thus cache hits need a single round trip for generation
+            self.cache.add(generation_key, 0, timeout=None)
+            generation = self.cache.get(generation_key, 0)
+        return generation
+
+    # pylint: disable=R0913
+    def _get_key(self, source: str, z: int, x: int, y: int, filters: Optional[dict]) -> str:  # noqa: PLR0913
+        return f"mapengine:tiles:{source}:{self._get_generation(source)}:{z}/{x}/{y}:{get_filter_key(filters)}"
+
+    def get(self, source: str, z: int, x: int, y: int, filters: Optional[dict] = None) -> Optional[bytes]:
+        """Return cached tile from django cache"""
+        return self.cache.get(self._get_key(source, z, x, y, filters))
+
+    # pylint: disable=R0913
+    def set(self, source: str, z: int, x: int, y: int, filters: Optional[dict], tile: bytes) -> None:  # noqa: PLR0913
+        """Store tile in django cache"""
+        self.cache.set(self._get_key(source, z, x, y, filters), bytes(tile), timeout=self.get_timeout(source))
+
+    def invalidate(self, source: str) -> None:
+        """Increment generation of source in order to invalidate all cached tiles"""
+        generation_key = f"mapengine:tiles:{source}:generation"
+        try:
+            self.cache.incr(generation_key)
+        except ValueError:
+            self.cache.set(generation_key, 1, timeout=None)
+
+
+class MemoryTileCache(TileCache):
+    """
+    Process-local LRU tile cache
+
+    If cached tiles exceed `max_size` (in bytes), least recently used tiles are evicted.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 64 * 1024 * 1024,
+        timeout: Optional[int] = None,
+        timeouts: Optional[dict[str, Optional[int]]] = None,
+    ) -> None:
+        super().__init__(timeout, timeouts)
+        self.max_size = max_size
+        self.size = 0
+        self._tiles: OrderedDict[tuple, tuple[bytes, Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source: str, z: int, x: int, y: int, filters: Optional[dict] = None) -> Optional[bytes]:
+        """Return cached tile and mark it as recently used"""
+        key = (source, z, x, y, get_filter_key(filters))
+        with self._lock:
+            if key not in self._tiles:
+                return None
+            tile, expires = self._tiles[key]
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._tiles.move_to_end(key)
+            return tile
+
+    # pylint: disable=R0913
+    def set(self, source: str, z: int, x: int, y: int, filters: Optional[dict], tile: bytes) -> None:  # noqa: PLR0913
+        """Store tile and evict least recently used tiles if cache is full"""
+        tile = bytes(tile)
+        if len(tile) > self.max_size:
+            return
+        key = (source, z, x, y, get_filter_key(filters))
+        timeout = self.get_timeout(source)
+        expires = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            if key in self._tiles:
+                self._remove(key)
+            self._tiles[key] = (tile, expires)
+            self.size += len(tile)
+            while self.size > self.max_size:
+                self._remove(next(iter(self._tiles)))
+
+    def invalidate(self, source: str) -> None:
+        """Remove all tiles of given source"""
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] == source]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Remove all tiles"""
+        with self._lock:
+            self._tiles.clear()
+            self.size = 0
+
+    def _remove(self, key: tuple) -> None:
+        tile, _ = self._tiles.pop(key)
+        self.size -= len(tile)
+
+
+class FileSystemTileCache(TileCache):
+    """
+    Tile cache storing tiles in local filesystem
+
+    Tiles are stored at `<location>/<source>/<generation>/<z>/<x>/<y>/<filter key>.mvt`.
+    Generation of a source is held in file `<location>/<source>/generation` and incremented on invalidation.
+    A tile is only stored, if generation did not change since the tile has been missed (i.e. while rendering it),
+    thus tiles rendered from outdated data are never stored after invalidation.
+    File modification time is used to check timeouts, file access time is used for LRU eviction.
+    Eviction is checked after every `max_size / 10` bytes written by current process; it scans the cache folder
+    and removes least recently used tiles until cache size drops below 90 % of `max_size` (in bytes).
+    """
+
+    def __init__(
+        self,
+        location: str | pathlib.Path,
+        max_size: Optional[int] = None,
+        timeout: Optional[int] = None,
+        timeouts: Optional[dict[str, Optional[int]]] = None,
+    ) -> None:
+        super().__init__(timeout, timeouts)
+        self.location = pathlib.Path(location)
+        self.max_size = max_size
+        self._written_since_cull = 0
+        self._lock = threading.Lock()
+        # Generation of source at time of cache miss per tile and thread (tile is rendered and set afterwards)
+        self._missed = threading.local()
+
+    def _get_generation(self, source: str) -> int:
+        try:
+            return int((self.location / source / "generation").read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    # pylint: disable=R0913
+    def _get_path(  # noqa: PLR0913
+        self, source: str, generation: int, z: int, x: int, y: int, filters: Optional[dict]
+    ) -> pathlib.Path:
+        return self.location / source / str(generation) / str(z) / str(x) / str(y) / f"{get_filter_key(filters)}.mvt"
+
+    def _get_missed(self) -> dict:
+        if not hasattr(self._missed, "tiles"):
+            self._missed.tiles = {}
+        return self._missed.tiles
+
+    def get(self, source: str, z: int, x: int, y: int, filters: Optional[dict] = None) -> Optional[bytes]:
+        """Return tile from filesystem and update its access time"""
+        generation = self._get_generation(source)
+        path = self._get_path(source, generation, z, x, y, filters)
+        try:
+            stat = path.stat()
+            timeout = self.get_timeout(source)
+            if timeout is not None and stat.st_mtime + timeout < time.time():
+                path.unlink(missing_ok=True)
+                raise FileNotFoundError(path)
+            tile = path.read_bytes()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            self._get_missed()[(source, z, x, y, get_filter_key(filters))] = generation
+            return None
+        return tile
+
+    # pylint: disable=R0913
+    def set(self, source: str, z: int, x: int, y: int, filters: Optional[dict], tile: bytes) -> None:  # noqa: PLR0913
+        """Write tile atomically to filesystem, unless source has been invalidated since tile has been missed"""
+        generation = self._get_missed().pop((source, z, x, y, get_filter_key(filters)), None)
+        if generation is None:
+            generation = self._get_generation(source)
+        path = self._get_path(source, generation, z, x, y, filters)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp_file:
+            tmp_file.write(tile)
+        try:
+            if self._get_generation(source) != generation:
+                raise FileNotFoundError(path)
+            os.replace(tmp_file.name, path)
+        except FileNotFoundError:
+            # Source has been invalidated meanwhile (generation folder might already be deleted)
+            pathlib.Path(tmp_file.name).unlink(missing_ok=True)
+            return
+        if self.max_size is not None:
+            with self._lock:
+                self._written_since_cull += len(tile)
+                cull = self._written_since_cull > self.max_size / 10
+                if cull:
+                    self._written_since_cull = 0
+            if cull:
+                self.cull()
+
+    def invalidate(self, source: str) -> None:
+        """Increment generation of source and delete tiles of former generations"""
+        source_folder = self.location / source
+        source_folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            generation = self._get_generation(source) + 1
+            with tempfile.NamedTemporaryFile("w", dir=source_folder, delete=False, encoding="utf-8") as tmp_file:
+                tmp_file.write(str(generation))
+            os.replace(tmp_file.name, source_folder / "generation")
+        for generation_folder in source_folder.iterdir():
+            if (
+                generation_folder.is_dir()
+                and generation_folder.name.isdigit()
+                and int(generation_folder.name) < generation
+            ):
+                # Rename folder first, so that deleting tiles does not interfere with tiles of current generation
+                trash = source_folder.with_name(f".{source}.{generation_folder.name}.{time.time_ns()}")
+                os.replace(generation_folder, trash)
+                self._delete_tree(trash)
+
+    def clear(self) -> None:
+        """Delete all tiles"""
+        if not self.location.exists():
+            return
+        for source_folder in self.location.iterdir():
+            if source_folder.is_dir() and not source_folder.name.startswith("."):
+                # Generations are kept, so that tiles rendered before clearing are not stored afterwards
+                self.invalidate(source_folder.name)
+
+    def cull(self) -> None:
+        """Remove least recently used tiles until cache size is below 90 % of max size"""
+        tiles = []
+        size = 0
+        for path in self._iter_tiles():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            tiles.append((stat.st_atime, stat.st_size, path))
+            size += stat.st_size
+        if size <= self.max_size:
+            return
+        for _, tile_size, path in sorted(tiles, key=lambda tile: tile[0]):
+            path.unlink(missing_ok=True)
+            size -= tile_size
+            if size <= self.max_size * 0.9:
+                break
+
+    def _iter_tiles(self) -> Iterable[pathlib.Path]:
+        return self.location.glob("*/*/*/*/*/*.mvt")
+
+    @staticmethod
+    def _delete_tree(folder: pathlib.Path) -> None:
+        for path in sorted(folder.rglob("*"), reverse=True):
+            if path.is_dir():
+                path.rmdir()
+            else:
+                path.unlink(missing_ok=True)
+        folder.rmdir()
+
+
+def get_sources() -> list[str]:
+    """Return names of all tile sources, i.e. MVT sources and sources of server-side clusters"""
+    from . import clusters  # pylint: disable=C0415
+
+    return [
+        *settings.MAP_ENGINE_API_MVTS,
+        *(clusters.get_cluster_source(cluster) for cluster in settings.MAP_ENGINE_API_CLUSTERS if cluster.server_side),
+    ]
+
+
+def get_source_models(source: str) -> set:
+    """
+    Return models of given tile source
+
+    Parameters
+    ----------
+    source : str
+        Name of MVT source (key in `MAP_ENGINE_API_MVTS`) or of server-side cluster (see `get_cluster_source`)
+
+    Raises
+    ------
+    KeyError
+        if source is unknown
+    """
+    if source in settings.MAP_ENGINE_API_MVTS:
+        return {mvt_api.model for mvt_api in settings.MAP_ENGINE_API_MVTS[source]}
+    from . import clusters  # pylint: disable=C0415
+
+    for cluster in settings.MAP_ENGINE_API_CLUSTERS:
+        if cluster.server_side and clusters.get_cluster_source(cluster) == source:
+            return {cluster.model}
+    raise KeyError(f"Unknown MVT source {source=}.")
+
+
+def get_tile_cache() -> Optional[TileCache]:
+    """
+    Return tile cache set up in settings
+
+    Returns
+    -------
+    Optional[TileCache]
+        Tile cache from setting `MAP_ENGINE_TILE_CACHE` or None if caching is not activated
+    """
+    return settings.MAP_ENGINE_TILE_CACHE
+
+
+def invalidate_source(source: str) -> None:
+    """
+    Remove all cached tiles of given source
+
+    Use this function after loading new data into models of given source.
+
+    Parameters
+    ----------
+    source : str
+        Name of MVT source (key in `MAP_ENGINE_API_MVTS`) or of server-side cluster (see `get_cluster_source`)
+
+    Raises
+    ------
+    KeyError
+        if source is unknown
+    """
+    if source not in get_sources():
+        raise KeyError(f"Unknown MVT source {source=}.")
+    tile_cache = get_tile_cache()
+    if tile_cache is not None:
+        tile_cache.invalidate(source)
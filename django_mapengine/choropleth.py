@@ -1,9 +1,18 @@
-"""Module to handle choropleths."""
+"""
+Module to handle choropleths.
 
+Values can be given as list, NumPy array or queryset (i.e. `values_list("value", flat=True)`).
+If NumPy is installed, values are converted into an array once and summarized vectorized;
+otherwise, values are summarized in plain Python.
+"""
+
+import hashlib
 import json
 import math
 import pathlib
-from typing import Optional, Union
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Union
 
 from . import colorbrewer
 
@@ -11,11 +20,290 @@ MAX_COLORBREWER_STEPS = 9
 
 DEFAULT_CHOROPLETH_CONFIG = {"color_palette": "YlGnBu", "num_colors": 6}
 
+# Quantiles given in value summary
+SUMMARY_QUANTILES = (0.25, 0.5, 0.75)
+# Natural breaks are computed on at most this number of (unique) values
+JENKS_MAX_VALUES = 5000
+# Head/tail breaks stop, if head holds this share of values or more
+HEAD_TAIL_RATIO = 0.4
+# Number of classified value vectors kept in cache
+MAX_CACHED_BREAKS = 128
+
+_breaks_cache: OrderedDict = OrderedDict()
+_breaks_lock = threading.Lock()
+
 
 class ChoroplethError(Exception):
     """Raised if something is wrong with choropleth values or parameters."""
 
 
+def _get_numpy():  # noqa: ANN202
+    try:
+        import numpy  # pylint: disable=C0415
+    except ImportError:
+        return None
+    return numpy
+
+
+def get_value_array(values: Iterable) -> Any:
+    """
+    Return finite values as float array (or sorted list of floats, if NumPy is not installed)
+
+    Missing (None) and non-finite values are dropped.
+
+    Parameters
+    ----------
+    values : Iterable
+        Values as list, NumPy array or queryset
+
+    Returns
+    -------
+    Any
+        NumPy array or sorted list of floats
+    """
+    np = _get_numpy()
+    if np is None:
+        return sorted(float(value) for value in values if value is not None and math.isfinite(value))
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        values = list(values)
+    array = np.asarray(values, dtype=float)
+    return array[np.isfinite(array)]
+
+
+def summarize_values(values: Iterable) -> dict:
+    """
+    Summarize values in one pass (min, max and quantiles of `SUMMARY_QUANTILES`)
+
+    Parameters
+    ----------
+    values : Iterable
+        Values as list, NumPy array or queryset
+
+    Returns
+    -------
+    dict
+        holding count, min, max and quantiles of finite values
+
+    Raises
+    ------
+    ChoroplethError
+        if no finite values are given
+    """
+    array = get_value_array(values)
+    if len(array) == 0:
+        raise ChoroplethError("No valid choropleth values given.")
+    np = _get_numpy()
+    if np is None:
+        # Values are sorted, thus quantiles are interpolated linearly between neighbouring values
+        quantiles = []
+        for quantile in (0, *SUMMARY_QUANTILES, 1):
+            position = quantile * (len(array) - 1)
+            lower = int(position)
+            upper = min(lower + 1, len(array) - 1)
+            quantiles.append(array[lower] + (array[upper] - array[lower]) * (position - lower))
+    else:
+        quantiles = np.quantile(array, [0, *SUMMARY_QUANTILES, 1]).tolist()
+    return {
+        "count": len(array),
+        "min": quantiles[0],
+        "max": quantiles[-1],
+        "quantiles": dict(zip(SUMMARY_QUANTILES, quantiles[1:-1])),
+    }
+
+
+def to_json_list(values: Iterable) -> list:
+    """Return values as JSON-serializable list; non-finite values of NumPy arrays are replaced by None"""
+    np = _get_numpy()
+    if np is not None and isinstance(values, np.ndarray):
+        if values.dtype.kind == "f":
+            finite = np.isfinite(values)
+            if not finite.all():
+                values = values.astype(object)
+                values[~finite] = None
+        return values.tolist()
+    return list(values)
+
+
+def _get_breaks_key(array: Any, method: str, num_classes: int) -> tuple:
+    """Return cache key of breaks from hash of value vector, method and number of classes"""
+    digest = hashlib.sha1(array.tobytes()).hexdigest()  # noqa: S324
+    return digest, len(array), method, num_classes
+
+
+def _equal_interval_breaks(np: Any, array: Any, num_classes: int) -> Any:
+    return np.linspace(array[0], array[-1], num_classes + 1)
+
+
+def _quantile_breaks(np: Any, array: Any, num_classes: int) -> Any:
+    return np.quantile(array, np.linspace(0, 1, num_classes + 1))
+
+
+def _log_breaks(np: Any, array: Any, num_classes: int) -> Any:
+    positive = array[array > 0]
+    if len(positive) == 0:
+        raise ChoroplethError("Log classification requires positive values.")
+    breaks = np.geomspace(positive[0], array[-1], num_classes + 1)
+    # Zero values are colored like smallest positive values
+    breaks[0] = array[0]
+    return breaks
+
+
+def _head_tail_breaks(np: Any, array: Any, num_classes: int) -> Any:
+    """Split values at mean repeatedly, as long as head (values above mean) holds less than 40 % of values"""
+    breaks = [array[0]]
+    head = array
+    while len(breaks) < num_classes and len(head) > 1:
+        mean = head.mean()
+        new_head = head[head > mean]
+        if len(new_head) == 0 or len(new_head) / len(head) >= HEAD_TAIL_RATIO:
+            break
+        breaks.append(mean)
+        head = new_head
+    breaks.append(array[-1])
+    return np.asarray(breaks)
+
+
+def _jenks_breaks(np: Any, array: Any, num_classes: int) -> Any:
+    """
+    Return natural breaks minimizing sum of squared deviations within classes (Fisher-Jenks)
+
+    Dynamic programming runs on unique values weighted by their counts; more than `JENKS_MAX_VALUES` unique values
+    are reduced to evenly spaced quantiles. Optimal split points are monotone in position, thus each class is
+    computed via divide and conquer, evaluating candidate splits vectorized (O(k * n log n) instead of O(k * n^2)).
+    """
+    if len(np.unique(array)) > JENKS_MAX_VALUES:
+        array = np.quantile(array, np.linspace(0, 1, JENKS_MAX_VALUES))
+    values, counts = np.unique(array, return_counts=True)
+    num_values = len(values)
+    if num_values <= num_classes:
+        return np.concatenate([values[:1], values])
+    weights = np.concatenate([[0], np.cumsum(counts)])
+    sums = np.concatenate([[0], np.cumsum(counts * values)])
+    squares = np.concatenate([[0], np.cumsum(counts * values**2)])
+
+    def get_costs(starts: Any, end: int) -> Any:
+        """Return sums of squared deviations of values[start:end] for all starts"""
+        weight = weights[end] - weights[starts]
+        total = sums[end] - sums[starts]
+        return squares[end] - squares[starts] - total**2 / weight
+
+    ends = np.arange(1, num_values + 1)
+    previous = squares[ends] - squares[0] - (sums[ends] - sums[0]) ** 2 / (weights[ends] - weights[0])
+    previous = np.concatenate([[np.inf], previous])
+    splits = np.zeros((num_classes, num_values + 1), dtype=int)
+    for num_class in range(1, num_classes):
+        current = np.full(num_values + 1, np.inf)
+        # Stack of (first end, last end, lowest split, highest split) instead of recursion
+        stack = [(num_class + 1, num_values, num_class, num_values - 1)]
+        while stack:
+            low, high, split_low, split_high = stack.pop()
+            if low > high:
+                continue
+            end = (low + high) // 2
+            starts = np.arange(split_low, min(end - 1, split_high) + 1)
+            costs = previous[starts] + get_costs(starts, end)
+            best = int(np.argmin(costs))
+            current[end] = costs[best]
+            splits[num_class, end] = starts[best]
+            stack.append((low, end - 1, split_low, starts[best]))
+            stack.append((end + 1, high, starts[best], split_high))
+        previous = current
+
+    breaks = [values[-1]]
+    end = num_values
+    for num_class in range(num_classes - 1, 0, -1):
+        end = splits[num_class, end]
+        breaks.append(values[end])
+    breaks.append(values[0])
+    return np.asarray(breaks[::-1])
+
+
+CLASSIFICATIONS = {
+    "equal_interval": _equal_interval_breaks,
+    "quantile": _quantile_breaks,
+    "jenks": _jenks_breaks,
+    "head_tail": _head_tail_breaks,
+    "log": _log_breaks,
+}
+
+
+def classify(values: Iterable, method: str, num_classes: int) -> list[float]:
+    """
+    Return class breaks (lower limit of each class followed by max value) of values using given method
+
+    Breaks are cached by hash of values, method and number of classes; thus, repeated requests of same values
+    (i.e. same scenario) do not classify values again. Duplicate breaks (i.e. quantiles of skewed values)
+    are merged, as steps of maplibre expressions must be strictly ascending.
+
+    Parameters
+    ----------
+    values : Iterable
+        Values as list, NumPy array or queryset
+    method : str
+        Classification method, one of `CLASSIFICATIONS`
+    num_classes : int
+        Number of classes
+
+    Returns
+    -------
+    list[float]
+        Ascending class breaks
+
+    Raises
+    ------
+    ChoroplethError
+        if method is unknown or no valid values are given
+    """
+    if method not in CLASSIFICATIONS:
+        raise ChoroplethError(f"Unknown classification '{method}', use one of {list(CLASSIFICATIONS)}.")
+    np = _get_numpy()
+    if np is None:
+        raise ImportError(
+            "Choropleth classifications require package 'numpy', install it via 'pip install django-mapengine[numpy]'."
+        )
+    array = np.sort(get_value_array(values))
+    if len(array) == 0:
+        raise ChoroplethError("No valid choropleth values given.")
+    key = _get_breaks_key(array, method, num_classes)
+    with _breaks_lock:
+        if key in _breaks_cache:
+            _breaks_cache.move_to_end(key)
+            return list(_breaks_cache[key])
+    breaks = np.unique(CLASSIFICATIONS[method](np, array, num_classes)).tolist()
+    with _breaks_lock:
+        _breaks_cache[key] = breaks
+        if len(_breaks_cache) > MAX_CACHED_BREAKS:
+            _breaks_cache.popitem(last=False)
+    return list(breaks)
+
+
+def get_columns_from_queryset(queryset: Any, value_field: str, id_field: str = "id") -> tuple[list, Any]:
+    """
+    Return ids and values of queryset as separate columns, fetched in one query
+
+    Parameters
+    ----------
+    queryset : QuerySet
+        Queryset holding choropleth values per feature
+    value_field : str
+        Field (or annotation) holding values
+    id_field : str
+        Field holding feature IDs
+
+    Returns
+    -------
+    tuple[list, Any]
+        Feature IDs and values (as float array, if NumPy is installed)
+    """
+    rows = list(queryset.values_list(id_field, value_field))
+    ids = [row[0] for row in rows]
+    values = [row[1] for row in rows]
+    np = _get_numpy()
+    if np is not None:
+        values = np.asarray(values, dtype=float)
+    return ids, values
+
+
 class Choropleth:
     """Class to define load choropleth config and define colors for static and dynamic choropleths."""
 
@@ -78,7 +366,7 @@ class Choropleth:
         choropleth_config : dict
             holding choropleth config
         values : Optional[list]
-            List with dynamic values (i.e. from simulation)
+            Dynamic values (i.e. from simulation) as list, NumPy array or queryset
 
         Returns
         -------
@@ -91,16 +379,19 @@ class Choropleth:
             If values are out of range or invalid.
             If values are neither given nor set in config.
         """
-        if values:
-            if min(values) < 0 or max(values) <= 0:
+        if values is not None and len(values) > 0:
+            summary = summarize_values(values)
+            if summary["min"] < 0 or summary["max"] <= 0:
                 error_msg = "the given values are not valid or out of range"
                 raise ChoroplethError(error_msg)
-            min_value = self.__calculate_lower_limit(min(values))
-            max_value = self.__calculate_upper_limit(max(values))
             if choropleth_config["num_colors"]:
                 num = choropleth_config["num_colors"]
             else:
                 num = 6
+            if "classification" in choropleth_config:
+                return classify(values, choropleth_config["classification"], num)
+            min_value = self.__calculate_lower_limit(summary["min"])
+            max_value = self.__calculate_upper_limit(summary["max"])
             step_size = self.__calculate_step_size(min_value, max_value, num)
             return [min_value + i * step_size for i in range(num)] + [max_value]
 
@@ -139,7 +430,9 @@ class Choropleth:
         if len(steps) > MAX_COLORBREWER_STEPS:
             error_msg = f"Too many choropleth values given for {name=}."
             raise IndexError(error_msg)
-        colors = colorbrewer.sequential["multihue"][choropleth_config["color_palette"]][len(steps) - 1]
+        palette = colorbrewer.sequential["multihue"][choropleth_config["color_palette"]]
+        # Classifications may merge duplicate breaks, thus fewer steps than smallest palette are possible
+        colors = palette[max(len(steps) - 1, min(palette))]
         fill_color = [
             "interpolate-hcl",
             ["linear"],
@@ -151,12 +444,38 @@ class Choropleth:
             fill_color.append(rgb_color)
         return fill_color
 
+    def get_choropleth_data(self, name: str, ids: Iterable, values: Iterable) -> dict:
+        """Return columnar choropleth payload holding feature IDs, values and paint properties.
+
+        IDs and values are sent as two arrays instead of one dict per feature, which is smaller to send
+        and faster to apply via `updateChoroplethFeatureStates` in JS.
+
+        Parameters
+        ----------
+        name: str
+            Name of choropleth
+        ids: Iterable
+            Feature IDs (as list or NumPy array)
+        values: Iterable
+            Values of features in same order as IDs (as list or NumPy array)
+
+        Returns
+        -------
+        dict:
+            Payload with keys "ids", "values" and "paintProperties"
+        """
+        return {
+            "ids": to_json_list(ids),
+            "values": to_json_list(values),
+            "paintProperties": {"fill-color": self.get_fill_color(name, values)},
+        }
+
     @staticmethod
     def __calculate_step_size(min_value: float, max_value: float, num: int) -> float:
         """
         Calculate step size
 
-        Algorithm tries to find nice step sizes instead of simply dividing range by number of steps.
+        Range between rounded limits is divided equally; use a classification for skewed values.
         """
         return (max_value - min_value) / num
 
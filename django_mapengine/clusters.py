@@ -0,0 +1,311 @@
+"""
+Module to serve points of cluster APIs
+
+Points are either streamed as GeoJSON, FlatGeobuf or Arrow IPC (clustered by the browser)
+or clustered server-side into MVTs.
+Server-side, points are clustered per tile on a grid aligned to tile extent, thus clusters do not change between
+tiles. Clusters hold attributes `cluster`, `point_count` and `point_count_abbreviated` (like clusters of
+maplibre GeoJSON sources), whereas unclustered points keep their properties; thus, existing styles keep working.
+"""
+
+import math
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+from django.db.models import QuerySet, TextField
+from django.db.models.expressions import RawSQL
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views import View
+
+from . import formats, managers, metrics, mvt, setup, utils
+
+# Abbreviates number of points like maplibre does, i.e. 1234 -> "1.2k"
+POINT_COUNT_ABBREVIATED = (
+    "CASE WHEN cluster_count >= 10000 THEN round(cluster_count / 1000.0)::text || 'k' "
+    "WHEN cluster_count >= 1000 THEN round(cluster_count / 1000.0, 1)::text || 'k' "
+    "ELSE cluster_count::text END"
+)
+
+
+def get_cluster_manager(cluster: setup.ClusterAPI) -> managers.MVTManager:
+    """Return (parameterized) MVT manager of cluster model, selecting properties of cluster API"""
+    manager = managers.MVTManager(geo_col=cluster.geo_col, columns=cluster.properties or None, parameterized=True)
+    manager.model = cluster.model
+    return manager
+
+
+def build_cluster_template(mvt_geom_query: str, layer: mvt.MVTSourceLayer, z: int, grid_size: int) -> str:
+    """
+    Build query encoding points of geometry query into clustered MVT layer
+
+    Points are grouped by grid cells of given size (in MVT units); cells holding more than one point
+    result in one cluster at mean position of its points.
+    """
+    quote_name = connection.ops.quote_name
+    columns = [quote_name(column) for column in layer.get_columns(z)]
+    pk = quote_name(layer.get_pk_column())
+    cell = f"floor(ST_X(mvt_geom) / {int(grid_size)}), floor(ST_Y(mvt_geom) / {int(grid_size)})"
+    properties = "".join(f"CASE WHEN cluster_count = 1 THEN {column} END AS {column}, " for column in columns)
+    return (
+        f"WITH q AS ({mvt_geom_query}), "
+        "c AS ("
+        "SELECT *, count(*) OVER cell AS cluster_count, "
+        f"row_number() OVER (cell ORDER BY {pk}) AS cluster_rank, "
+        "avg(ST_X(mvt_geom)) OVER cell AS cluster_x, avg(ST_Y(mvt_geom)) OVER cell AS cluster_y "
+        f"FROM q WHERE mvt_geom IS NOT NULL WINDOW cell AS (PARTITION BY {cell})"
+        "), "
+        "s AS ("
+        f"SELECT {properties}"
+        "CASE WHEN cluster_count > 1 THEN true END AS cluster, "
+        "CASE WHEN cluster_count > 1 THEN cluster_count END AS point_count, "
+        f"CASE WHEN cluster_count > 1 THEN {POINT_COUNT_ABBREVIATED} END AS point_count_abbreviated, "
+        "CASE WHEN cluster_count > 1 THEN ST_MakePoint(cluster_x, cluster_y) ELSE mvt_geom::geometry END AS mvt_geom "
+        "FROM c WHERE cluster_rank = 1"
+        ") "
+        f"SELECT ST_AsMVT(s.*, '{layer.name}') FROM s"
+    )
+
+
+class ClusterMVTView(mvt.MVTView):
+    """
+    Serves points of a cluster API clustered per tile
+
+    Tile cache, compression, conditional requests, request coalescing and metrics work as for MVT sources.
+    Above `MAP_ENGINE_CLUSTER_ZOOM`, points are served unclustered.
+    """
+
+    cluster: setup.ClusterAPI = None
+
+    def _create_mvt(self, z, x, y, filters):
+        query, params = self._get_mvt_query(z, x, y, filters)
+        with connection.cursor() as cursor, metrics.timer("mapengine_tile_sql_seconds", source=self.source, z=z):
+            mvt.execute_prepared(cursor, query, params)
+            row = cursor.fetchone()
+        return bytes(row[0]) if row else b""
+
+    def _get_mvt_query(self, z, x, y, filters):
+        """Return clustered (or plain, above cluster zoom) MVT query and its parameters"""
+        layer = self.layers[0]
+        mvt_geom_query, params = layer.queryset.get_mvt_sql(x, y, z, filters)
+        if z > settings.MAP_ENGINE_CLUSTER_ZOOM:
+            return self._build_mvt_template([mvt_geom_query], z), params
+        grid_size = utils.get_zoom_value(self.cluster.grid_size, z)
+        return build_cluster_template(mvt_geom_query, layer, z, grid_size), params
+
+    def _get_profile_queries(self, z, x, y, filters):
+        return [self._get_mvt_query(z, x, y, filters)]
+
+
+def get_cluster_source(cluster: setup.ClusterAPI) -> str:
+    """Return name of tile source (used in tile cache and metrics) of server-side cluster"""
+    return f"{cluster.layer_id}_cluster"
+
+
+def cluster_mvt_view_factory(cluster: setup.ClusterAPI):  # noqa: ANN201
+    """Factory method for creating cluster MVT views from settings"""
+    layer = mvt.MVTSourceLayer(cluster.layer_id, queryset=get_cluster_manager(cluster))
+    return type(
+        f"{cluster.layer_id}ClusterMVTView",
+        (ClusterMVTView,),
+        {"source": get_cluster_source(cluster), "layers": [layer], "cluster": cluster},
+    ).as_view()
+
+
+def parse_bbox(value: str) -> tuple[float, float, float, float]:
+    """
+    Parse WGS84 bbox given as "xmin,ymin,xmax,ymax"
+
+    Raises
+    ------
+    ValueError
+        if bbox is invalid
+    """
+    bbox = tuple(float(coordinate) for coordinate in value.split(","))
+    if len(bbox) != 4 or not all(math.isfinite(coordinate) for coordinate in bbox):  # noqa: PLR2004
+        raise ValueError(f"Invalid bbox '{value}'.")
+    if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError(f"Invalid bbox '{value}', min coordinates must not exceed max coordinates.")
+    return bbox
+
+
+def get_precision(zoom: Optional[int]) -> int:
+    """Return number of decimal digits of WGS84 coordinates needed to place points exactly on pixels at given zoom"""
+    if zoom is None:
+        return settings.MAP_ENGINE_CLUSTER_PRECISION
+    degrees_per_pixel = 360 / (512 * 2 ** max(zoom, 0))
+    return min(max(math.ceil(-math.log10(degrees_per_pixel)), 0), settings.MAP_ENGINE_CLUSTER_PRECISION)
+
+
+def get_properties(cluster: setup.ClusterAPI) -> list[str]:
+    """Return properties of cluster API; defaults to all non-geometry columns of model"""
+    if cluster.properties:
+        return list(cluster.properties)
+    return [
+        field.column
+        for field in cluster.model._meta.concrete_fields  # noqa: SLF001  # pylint: disable=W0212
+        if field.column != cluster.geo_col
+    ]
+
+
+def get_feature_sql(cluster: setup.ClusterAPI, precision: int) -> RawSQL:
+    """Return expression building GeoJSON feature (as text) of each point in SQL"""
+    quote_name = connection.ops.quote_name
+    table = quote_name(cluster.model._meta.db_table)  # noqa: SLF001  # pylint: disable=W0212
+    properties = ", ".join(f"'{column}', {table}.{quote_name(column)}" for column in get_properties(cluster))
+    return RawSQL(
+        "json_build_object('type', 'Feature', "
+        f"'geometry', ST_AsGeoJSON(ST_Transform({table}.{quote_name(cluster.geo_col)}, 4326), %s)::json, "
+        f"'properties', json_build_object({properties}))::text",
+        (precision,),
+        output_field=TextField(),
+    )
+
+
+def get_points(cluster: setup.ClusterAPI, bbox: Optional[tuple[float, float, float, float]] = None) -> QuerySet:
+    """Return queryset of cluster points, optionally restricted to WGS84 bbox"""
+    points = cluster.model._default_manager.all()  # noqa: SLF001  # pylint: disable=W0212
+    if bbox is not None:
+        polygon = Polygon.from_bbox(bbox)
+        polygon.srid = 4326
+        points = points.filter(**{f"{cluster.geo_col}__bboverlaps": polygon})
+    return points
+
+
+def get_features(
+    cluster: setup.ClusterAPI,
+    bbox: Optional[tuple[float, float, float, float]] = None,
+    zoom: Optional[int] = None,
+) -> Iterator[str]:
+    """Return GeoJSON features (as text) of cluster points within bbox, fetched from server-side cursor in chunks"""
+    return (
+        get_points(cluster, bbox)
+        .annotate(mapengine_feature=get_feature_sql(cluster, get_precision(zoom)))
+        .values_list("mapengine_feature", flat=True)
+        .iterator(chunk_size=settings.MAP_ENGINE_CLUSTER_CHUNK_SIZE)
+    )
+
+
+def get_rows_query(
+    cluster: setup.ClusterAPI, bbox: Optional[tuple[float, float, float, float]], columns: dict[str, str]
+) -> tuple[str, tuple]:
+    """
+    Return single query selecting given SQL expressions (by column name) of cluster points within bbox
+
+    Expressions are selected as annotations of cluster queryset (thus, filters of default manager apply)
+    and renamed in an outer query, as annotations must not clash with model fields.
+    """
+    aliases = {f"mapengine_{i}": RawSQL(expression, ()) for i, expression in enumerate(columns.values())}
+    query, params = get_points(cluster, bbox).annotate(**aliases).values_list(*aliases).query.sql_with_params()
+    selection = ", ".join(f"{alias} AS {connection.ops.quote_name(name)}" for alias, name in zip(aliases, columns))
+    return f"SELECT {selection} FROM ({query}) AS cluster_points", params
+
+
+def get_binary_rows_query(
+    cluster: setup.ClusterAPI, bbox: Optional[tuple[float, float, float, float]], output_format: str
+) -> tuple[str, tuple, dict[str, str]]:
+    """
+    Return query selecting rows of cluster points for binary format and pyarrow types of property columns
+
+    FlatGeobuf rows hold properties and WGS84 geometry; Arrow rows hold properties (cast to Arrow compatible types)
+    followed by x and y coordinates.
+    """
+    quote_name = connection.ops.quote_name
+    meta = cluster.model._meta  # noqa: SLF001  # pylint: disable=W0212
+    table = quote_name(meta.db_table)
+    fields = {field.column: field for field in meta.concrete_fields}
+    geometry = f"ST_Transform({table}.{quote_name(cluster.geo_col)}, 4326)"
+    columns, arrow_types = {}, {}
+    for column in get_properties(cluster):
+        cast, arrow_types[column] = formats.get_arrow_type(fields.get(column))
+        columns[column] = f"{table}.{quote_name(column)}" + (f"::{cast}" if output_format == "arrow" else "")
+    if output_format == "arrow":
+        columns["mapengine_x"] = f"ST_X({geometry})"
+        columns["mapengine_y"] = f"ST_Y({geometry})"
+    else:
+        columns[formats.GEOMETRY_COLUMN] = geometry
+    query, params = get_rows_query(cluster, bbox, columns)
+    return query, params, arrow_types
+
+
+def stream_features(features: Iterator[str], chunk_size: int) -> Iterator[str]:
+    """Wrap features into GeoJSON feature collection, yielding chunks of features"""
+    yield '{"type": "FeatureCollection", "features": ['
+    chunk = []
+    separator = ""
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) >= chunk_size:
+            yield separator + ",".join(chunk)
+            separator = ","
+            chunk = []
+    if chunk:
+        yield separator + ",".join(chunk)
+    yield "]}"
+
+
+class ClusterFeatureView(View):
+    """
+    Streams points of a cluster API as GeoJSON feature collection, FlatGeobuf or Arrow IPC stream
+
+    GeoJSON features are built in SQL (via `ST_AsGeoJSON`) and fetched from a server-side cursor in chunks,
+    thus memory usage does not grow with number of points. Optional parameters `bbox` ("xmin,ymin,xmax,ymax"
+    in WGS84) and `zoom` restrict points to visible area and round coordinates to precision needed at given zoom.
+    Requests of GeoJSON without parameters are served from snapshot, if a current one exists.
+    Format is fixed by URL suffix or, if `output_format` is not set, negotiated via "Accept" header.
+    """
+
+    cluster: setup.ClusterAPI = None
+    output_format: Optional[str] = None
+
+    def get(self, request):  # noqa: ANN001,ANN201
+        """Return snapshot, streaming feature response or 400 response, if bbox or zoom is invalid"""
+        try:
+            zoom = int(request.GET["zoom"]) if "zoom" in request.GET else None
+            bbox = parse_bbox(request.GET["bbox"]) if "bbox" in request.GET else None
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        output_format = self.output_format or formats.negotiate_format(request.META.get("HTTP_ACCEPT", ""))
+        response = self._get_response(request, output_format, bbox, zoom)
+        if self.output_format is None:
+            patch_vary_headers(response, ["Accept"])
+        return response
+
+    def _get_response(self, request, output_format, bbox, zoom):  # noqa: ANN001,ANN202
+        content_type = formats.CONTENT_TYPES[output_format]
+        if output_format == "flatgeobuf":
+            query, params, _ = get_binary_rows_query(self.cluster, bbox, output_format)
+            flatgeobuf = formats.get_flatgeobuf(query, params)
+            if not flatgeobuf:
+                # ST_AsFlatGeobuf returns no header for empty results, which cannot be deserialized
+                return HttpResponse(status=204)
+            return HttpResponse(flatgeobuf, content_type=content_type)
+        if output_format == "arrow":
+            query, params, arrow_types = get_binary_rows_query(self.cluster, bbox, output_format)
+            return StreamingHttpResponse(
+                formats.stream_arrow(query, params, arrow_types, settings.MAP_ENGINE_CLUSTER_CHUNK_SIZE),
+                content_type=content_type,
+            )
+        if bbox is None and zoom is None:
+            # pylint: disable=C0415
+            from . import snapshots
+
+            snapshot = snapshots.get_current_snapshot(self.cluster)
+            response = snapshots.get_snapshot_response(request, self.cluster, snapshot) if snapshot else None
+            if response is not None:
+                return response
+        features = get_features(self.cluster, bbox, zoom)
+        return StreamingHttpResponse(
+            stream_features(features, settings.MAP_ENGINE_CLUSTER_CHUNK_SIZE), content_type=content_type
+        )
+
+
+def cluster_feature_view_factory(cluster: setup.ClusterAPI, output_format: Optional[str] = None):  # noqa: ANN201
+    """Factory method for creating streaming feature views of clusters (in given or negotiated format) from settings"""
+    return type(
+        f"{cluster.layer_id}ClusterFeatureView",
+        (ClusterFeatureView,),
+        {"cluster": cluster, "output_format": output_format},
+    ).as_view()
@@ -0,0 +1,254 @@
+"""
+Module to coalesce concurrent requests of identical tiles
+
+Within a process, concurrent requests of same tile wait for one in-flight rendering and share its result
+("single flight"). Across workers, a lock in a shared django cache (setting `MAP_ENGINE_TILE_LOCK_CACHE`) lets
+only one worker render a tile, whereas other workers wait until the tile shows up in the tile cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from . import cache
+
+# Seconds between checks of tile cache, while waiting for another worker to render tile
+POLL_INTERVAL = 0.05
+
+
+class _Call:  # pylint: disable=R0903
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs function only once for concurrent calls with same key (across threads); other callers share result"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:  # noqa: ANN401
+        """
+        Return result of function; if function is already running for given key, wait for its result instead
+
+        Parameters
+        ----------
+        key : Hashable
+            Identifies call, i.e. (source, z, x, y, filter key)
+        func : Callable[[], Any]
+            Function to run
+
+        Returns
+        -------
+        Any
+            Result of function (exceptions are raised in all waiting callers)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Runs coroutine only once for concurrent calls with same key (within event loop); other callers share result"""
+
+    def __init__(self) -> None:
+        self._calls = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:  # noqa: ANN401
+        """Return result of coroutine function; if it is already running for given key, wait for its result instead"""
+        future = self._calls.get(key)
+        if future is not None:
+            # Shielded, thus a cancelled follower does not cancel rendering for other callers
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(func())
+        self._calls[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                del self._calls[key]
+            else:
+                future.add_done_callback(lambda _: self._calls.pop(key, None))
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+
+
+def get_flight_key(source: str, z: int, x: int, y: int, filters: Optional[dict]) -> tuple:
+    """Return key identifying tile request"""
+    return source, z, x, y, cache.get_filter_key(filters)
+
+
+def _get_lock_key(source: str, z: int, x: int, y: int, filters: Optional[dict]) -> str:
+    return f"mapengine:tile_lock:{source}:{z}/{x}/{y}:{cache.get_filter_key(filters)}"
+
+
+def acquire_lock(source: str, z: int, x: int, y: int, filters: Optional[dict]) -> Optional[str]:
+    """
+    Acquire lock for rendering tile across workers
+
+    Returns
+    -------
+    Optional[str]
+        Lock token, if lock has been acquired or cross-worker locking is not activated; None if another worker holds it
+    """
+    token = uuid.uuid4().hex
+    if settings.MAP_ENGINE_TILE_LOCK_CACHE is None:
+        return token
+    lock_cache = caches[settings.MAP_ENGINE_TILE_LOCK_CACHE]
+    key = _get_lock_key(source, z, x, y, filters)
+    # Lock expires, thus a crashed worker cannot block tile
+    if lock_cache.add(key, token, timeout=settings.MAP_ENGINE_TILE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_lock(source: str, z: int, x: int, y: int, filters: Optional[dict], token: str) -> None:
+    """Release lock of tile, if it is still held by given token"""
+    if settings.MAP_ENGINE_TILE_LOCK_CACHE is None:
+        return
+    lock_cache = caches[settings.MAP_ENGINE_TILE_LOCK_CACHE]
+    key = _get_lock_key(source, z, x, y, filters)
+    if lock_cache.get(key) == token:
+        lock_cache.delete(key)
+
+
+def is_locked(source: str, z: int, x: int, y: int, filters: Optional[dict]) -> bool:
+    """Return if another worker is rendering tile"""
+    lock_cache = caches[settings.MAP_ENGINE_TILE_LOCK_CACHE]
+    return lock_cache.get(_get_lock_key(source, z, x, y, filters)) is not None
+
+
+def wait_for_tile(
+    tile_cache: cache.TileCache, source: str, z: int, x: int, y: int, filters: Optional[dict]
+) -> Optional[bytes]:  # pylint: disable=R0913
+    """
+    Wait until tile rendered by another worker shows up in tile cache
+
+    Returns
+    -------
+    Optional[bytes]
+        Cached tile or None, if lock has been released or has expired without tile being cached
+    """
+    deadline = time.monotonic() + settings.MAP_ENGINE_TILE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        mvt = tile_cache.get(source, z, x, y, filters)
+        if mvt is not None or not is_locked(source, z, x, y, filters):
+            return mvt
+    return None
+
+
+def get_or_render(  # noqa: PLR0913
+    tile_cache: cache.TileCache,
+    source: str,
+    z: int,
+    x: int,
+    y: int,
+    filters: Optional[dict],
+    render: Callable[[], bytes],
+) -> bytes:  # pylint: disable=R0913
+    """
+    Return tile from tile cache or render (and cache) it, unless another worker is rendering it already
+
+    Parameters
+    ----------
+    tile_cache : cache.TileCache
+        Tile cache to look up and store tile
+    source : str
+        Name of MVT source
+    z : int
+        Zoom level
+    x : int
+        x-coordinate of tile
+    y : int
+        y-coordinate of tile
+    filters : Optional[dict]
+        Filters applied to tile
+    render : Callable[[], bytes]
+        Renders tile
+
+    Returns
+    -------
+    bytes
+        Tile data
+    """
+    mvt = tile_cache.get(source, z, x, y, filters)
+    if mvt is not None:
+        return mvt
+    token = acquire_lock(source, z, x, y, filters)
+    if token is None:
+        mvt = wait_for_tile(tile_cache, source, z, x, y, filters)
+        if mvt is not None:
+            return mvt
+        # Other worker failed or is too slow; render tile on our own
+        token = acquire_lock(source, z, x, y, filters)
+    try:
+        mvt = render()
+        tile_cache.set(source, z, x, y, filters, mvt)
+    finally:
+        if token is not None:
+            release_lock(source, z, x, y, filters, token)
+    return mvt
+
+
+async def aget_or_render(  # noqa: PLR0913
+    tile_cache: cache.TileCache,
+    source: str,
+    z: int,
+    x: int,
+    y: int,
+    filters: Optional[dict],
+    render: Callable[[], Awaitable[bytes]],
+) -> bytes:  # pylint: disable=R0913
+    """Async variant of `get_or_render`; cache and lock access is run in threads, waiting does not block"""
+    mvt = await sync_to_async(tile_cache.get)(source, z, x, y, filters)
+    if mvt is not None:
+        return mvt
+    token = await sync_to_async(acquire_lock)(source, z, x, y, filters)
+    if token is None:
+        deadline = time.monotonic() + settings.MAP_ENGINE_TILE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            mvt = await sync_to_async(tile_cache.get)(source, z, x, y, filters)
+            if mvt is not None:
+                return mvt
+            if not await sync_to_async(is_locked)(source, z, x, y, filters):
+                break
+        token = await sync_to_async(acquire_lock)(source, z, x, y, filters)
+    try:
+        mvt = await render()
+        await sync_to_async(tile_cache.set)(source, z, x, y, filters, mvt)
+    finally:
+        if token is not None:
+            await sync_to_async(release_lock)(source, z, x, y, filters, token)
+    return mvt
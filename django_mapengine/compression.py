@@ -0,0 +1,133 @@
+"""Module to compress MVTs once (when rendered or distilled) and to negotiate content encoding with clients."""
+
+import gzip
+from typing import Optional
+
+from django.conf import settings
+
+ENCODINGS = ("br", "gzip")
+FILE_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Levels used for live tiles, if setting `MAP_ENGINE_TILE_COMPRESSION_LEVEL` is not set
+DEFAULT_LEVELS = {"br": 5, "gzip": 6}
+# Distilled tiles are compressed only once, thus highest levels are used
+MAX_LEVELS = {"br": 11, "gzip": 9}
+
+
+def get_encoding() -> Optional[str]:
+    """Return content encoding used for MVTs from setting `MAP_ENGINE_TILE_COMPRESSION` or None if not compressed"""
+    encoding = settings.MAP_ENGINE_TILE_COMPRESSION
+    if encoding is not None and encoding not in ENCODINGS:
+        raise ValueError(f"Unknown tile compression '{encoding}', use one of {ENCODINGS}.")
+    return encoding
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    Compress data using given encoding
+
+    Gzip output does not contain a timestamp, thus identical tiles result in identical bytes.
+
+    Parameters
+    ----------
+    data : bytes
+        Data to compress
+    encoding : str
+        Either "gzip" or "br" (requires package `brotli`)
+    level : Optional[int]
+        Compression level, defaults to setting `MAP_ENGINE_TILE_COMPRESSION_LEVEL` or level of `DEFAULT_LEVELS`
+
+    Returns
+    -------
+    bytes
+        Compressed data
+    """
+    if level is None:
+        level = settings.MAP_ENGINE_TILE_COMPRESSION_LEVEL or DEFAULT_LEVELS[encoding]
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return _get_brotli().compress(data, quality=level)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """Decompress data using given encoding (for clients not accepting encoding of stored tiles)"""
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    return _get_brotli().decompress(data)
+
+
+def _get_brotli():  # noqa: ANN202
+    try:
+        import brotli  # pylint: disable=C0415
+    except ImportError as error:
+        raise ImportError(
+            "Brotli compression requires package 'brotli', install it via 'pip install django-mapengine[brotli]'."
+        ) from error
+    return brotli
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """
+    Check if encoding is accepted by client
+
+    Parameters
+    ----------
+    accept_encoding : str
+        Value of "Accept-Encoding" request header, i.e. "gzip, deflate, br;q=0.5"
+    encoding : str
+        Content encoding to check
+
+    Returns
+    -------
+    bool
+        True, if encoding (or wildcard) is listed with a quality greater than zero
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.lower()] = quality
+    quality = accepted.get(encoding, accepted.get("*", 0.0))
+    return quality > 0
+
+
+def negotiate(request, tile: bytes, encoding: Optional[str]) -> tuple[bytes, Optional[str]]:  # noqa: ANN001
+    """
+    Return tile data and content encoding to send to client
+
+    Tile is sent as is, if client accepts its encoding, otherwise it is decompressed.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Request holding "Accept-Encoding" header
+    tile : bytes
+        Tile data, compressed with given encoding
+    encoding : Optional[str]
+        Encoding of tile data or None if tile is not compressed
+
+    Returns
+    -------
+    tuple[bytes, Optional[str]]
+        Tile data and value for "Content-Encoding" header (None, if tile is sent uncompressed)
+    """
+    if not tile or encoding is None:
+        return tile, None
+    if accepts_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""), encoding):
+        return tile, encoding
+    return decompress(tile, encoding), None
+
+
+def set_encoding_headers(response, content_encoding: Optional[str], *, compressed: bool):  # noqa: ANN001,ANN201
+    """Set "Content-Encoding" and "Vary" headers; "Vary" is set for all responses of compressed sources"""
+    if content_encoding:
+        response["Content-Encoding"] = content_encoding
+    if compressed:
+        response["Vary"] = "Accept-Encoding"
+    return response
@@ -1,12 +1,56 @@
 """Module holding helper functions for MVT destillation."""
 
+from __future__ import annotations
 
+import datetime
+import itertools
+import pathlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import django
+from django import urls
 from django.conf import settings
+from django.db import connections
+
+from . import archive, compression, utils
+
+MANIFEST_FILENAME = ".mapengine_distill_manifest"
+
+# Views are set up once per worker process
+_views: dict = {}
 
 
-def get_coordinates_for_distilling() -> tuple[int, int, int]:
+def get_coordinates_for_distilling(source: Optional[str] = None) -> Iterable[tuple[int, int, int]]:
     """Return x,y,z coordinates for each layer in order to distill it.
 
+    If setting `MAP_ENGINE_DISTILL_EXTENT` is "data" and source is given, tiles are derived from data of source,
+    otherwise fixed rectangle from settings `MAP_ENGINE_X_AT_MIN_Z`, `MAP_ENGINE_Y_AT_MIN_Z` etc. is used.
+
+    Parameters
+    ----------
+    source : Optional[str]
+        Name of MVT source
+
+    Yields
+    ------
+    tuple[int, int, int]
+        Holding x,y,z
+    """
+    if source is not None and settings.MAP_ENGINE_DISTILL_EXTENT == "data":
+        managers = get_source_managers(source)
+        extent = get_source_extent(managers)
+        if extent is not None:
+            yield from get_coordinates_from_data(managers, extent)
+            return
+    yield from get_coordinates_from_settings()
+
+
+def get_coordinates_from_settings() -> Iterable[tuple[int, int, int]]:
+    """Return x,y,z coordinates from fixed rectangle defined in settings, doubled at each zoom level.
+
     Yields
     ------
     tuple[int, int, int]
@@ -25,13 +69,546 @@ def get_coordinates_for_distilling() -> tuple[int, int, int]:
                 yield x, y, z
 
 
-def get_all_statics_for_state_lod() -> tuple[int, int, int]:
+def get_source_managers(source: str) -> list:
+    """Return distinct model managers of all layers of given source"""
+    managers = []
+    for mvt_api in settings.MAP_ENGINE_API_MVTS[source]:
+        if not any(mvt_api.manager is manager for manager in managers):
+            managers.append(mvt_api.manager)
+    return managers
+
+
+def get_source_extent(managers: list) -> Optional[tuple[float, float, float, float]]:
+    """
+    Return WGS84 extent of all given managers
+
+    Returns
+    -------
+    Optional[tuple[float, float, float, float]]
+        Holding xmin, ymin, xmax, ymax; None if extent cannot be determined (no data or unsupported manager)
+    """
+    extents = []
+    for manager in managers:
+        if not hasattr(manager, "get_extent"):
+            return None
+        extent = manager.get_extent()
+        if extent is not None:
+            extents.append(extent)
+    if not extents:
+        return None
+    return (
+        min(extent[0] for extent in extents),
+        min(extent[1] for extent in extents),
+        max(extent[2] for extent in extents),
+        max(extent[3] for extent in extents),
+    )
+
+
+def get_coordinates_from_data(
+    managers: list, extent: tuple[float, float, float, float]
+) -> Iterable[tuple[int, int, int]]:
+    """
+    Return x,y,z coordinates of tiles containing features
+
+    Starts with tiles covering data extent at minimal zoom and descends quadtree-like into child tiles
+    only if parent tile contains any feature. Thus, empty subtrees are skipped.
+
+    Parameters
+    ----------
+    managers : list
+        Model managers of source
+    extent : tuple[float, float, float, float]
+        WGS84 extent of all managers
+
+    Yields
+    ------
+    tuple[int, int, int]
+        Holding x,y,z
+    """
+
+    min_zoom = settings.MAP_ENGINE_MIN_ZOOM
+    tiles = [(x, y, min_zoom) for x, y in utils.get_tiles_for_bbox(extent, min_zoom)]
+    while tiles:
+        x, y, z = tiles.pop()
+        if not has_features(managers, x, y, z):
+            continue
+        yield x, y, z
+        if z < settings.MAP_ENGINE_MAX_DISTILLED_ZOOM:
+            tiles.extend((2 * x + dx, 2 * y + dy, z + 1) for dx, dy in itertools.product((0, 1), repeat=2))
+
+
+def has_features(managers: list, x: int, y: int, z: int) -> bool:
+    """Return whether any manager has features in given tile; managers without feature check are assumed to have"""
+    return any(not hasattr(manager, "has_features") or manager.has_features(x, y, z) for manager in managers)
+
+
+def get_all_statics_for_state_lod(source: Optional[str] = None) -> Iterable[tuple[int, int, int]]:
     """Return distill coordinates for given layer.
 
+    Parameters
+    ----------
+    source : Optional[str]
+        Name of MVT source
+
     Yields
     ------
     tuple[int, int, int]
         Holding x,y,z
     """
-    for x, y, z in get_coordinates_for_distilling():
+    for x, y, z in get_coordinates_for_distilling(source):
         yield z, x, y
+
+
+@dataclass
+class DistillStats:
+    """Progress and throughput of a distill run"""
+
+    total: int = 0
+    tiles: int = 0
+    empty: int = 0
+    bytes_written: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def tiles_per_second(self) -> float:
+        """Return number of distilled tiles per second"""
+        return self.tiles / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.tiles}/{self.total} tiles ({self.empty} empty), {self.tiles_per_second:.1f} tiles/s, "
+            f"{self.bytes_written / 1024**2:.1f} MB written"
+        )
+
+
+def get_distill_view(source: str):  # noqa: ANN201
+    """
+    Return MVT view for given source, which is used to render tiles without HTTP layer
+
+    Parameters
+    ----------
+    source : str
+        Name of MVT source
+
+    Returns
+    -------
+    MVTView
+        View holding all layers of source
+    """
+    # pylint: disable=C0415
+    from . import mvt
+
+    if source not in _views:
+        _views[source] = mvt.MVTView(
+            source=source,
+            layers=[mvt.MVTSourceLayer.from_api(mvt_api) for mvt_api in settings.MAP_ENGINE_API_MVTS[source]],
+        )
+    return _views[source]
+
+
+def get_tile_path(output_dir: pathlib.Path, source: str, z: int, x: int, y: int) -> pathlib.Path:
+    """Return path of distilled tile, matching URL of distilled sources"""
+    app_url = urls.reverse("django_mapengine:index").strip("/")
+    return output_dir / app_url / str(z) / str(x) / str(y) / f"{source}.mvt"
+
+
+def _init_worker() -> None:
+    """Set up django in worker process; each worker opens its own database connection on first query"""
+    django.setup()
+
+
+def distill_chunk(  # noqa: PLR0913
+    output_dir: pathlib.Path,
+    source: str,
+    z: int,
+    x: int,
+    ys: list[int],
+    *,
+    collect: bool = False,
+    check_data: bool = False,
+) -> tuple[int, int, Optional[list[tuple[int, bytes]]], Optional[list[int]]]:  # pylint: disable=R0913,R0914
+    """
+    Render tiles of one tile column and write them to output folder (or return them)
+
+    Empty tiles are not written (middleware returns 204 for missing tiles), stale files of empty tiles are removed.
+    If tile compression is activated, a pre-compressed variant (i.e. "static.mvt.gz") is written next to each file,
+    which can be served directly by static file servers; collected tiles are returned compressed only.
+    If `check_data` is set, tiles holding features are returned in order to descend into their child tiles.
+    Rendered tiles hold features anyway, thus only empty tiles are checked
+    (features might be dropped from a tile, i.e. by `min_area`, but show up in its child tiles).
+
+    Parameters
+    ----------
+    output_dir : pathlib.Path
+        Root folder of distilled MVTs
+    source : str
+        Name of MVT source
+    z : int
+        Zoom level
+    x : int
+        x-coordinate of tile column
+    ys : list[int]
+        y-coordinates of tiles to render
+    collect : bool
+        If set, tiles are returned instead of written to files (i.e. to write them to an archive in main process)
+    check_data : bool
+        If set, y-coordinates of tiles holding features are returned
+
+    Returns
+    -------
+    tuple[int, int, Optional[list[tuple[int, bytes]]], Optional[list[int]]]
+        Number of empty tiles, bytes rendered, (if collected) y-coordinates and data of rendered tiles
+        and (if data is checked) y-coordinates of tiles holding features
+    """
+    view = get_distill_view(source)
+    managers = get_source_managers(source) if check_data else []
+    encoding = compression.get_encoding()
+    empty = 0
+    bytes_written = 0
+    tiles = [] if collect else None
+    feature_ys = [] if check_data else None
+    for y in ys:
+        tile = view._create_mvt(z, x, y, {}) or b""  # pylint: disable=W0212
+        if check_data and (tile or has_features(managers, x, y, z)):
+            feature_ys.append(y)
+        compressed = b""
+        if tile and encoding is not None:
+            compressed = compression.compress(tile, encoding, compression.MAX_LEVELS[encoding])
+        if not tile:
+            empty += 1
+        if collect:
+            tile = compressed or tile
+            bytes_written += len(tile)
+            tiles.append((y, tile))
+            continue
+        path = get_tile_path(output_dir, source, z, x, y)
+        if not tile:
+            path.unlink(missing_ok=True)
+            for suffix in compression.FILE_SUFFIXES.values():
+                path.with_name(f"{path.name}{suffix}").unlink(missing_ok=True)
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(tile)
+        bytes_written += len(tile)
+        if compressed:
+            path.with_name(f"{path.name}{compression.FILE_SUFFIXES[encoding]}").write_bytes(compressed)
+            bytes_written += len(compressed)
+    return empty, bytes_written, tiles, feature_ys
+
+
+def get_data_chunks(source: str) -> Optional[list[tuple[str, int, int, list[int]]]]:
+    """
+    Return tile columns covering data extent of source at minimal zoom level
+
+    Tiles are checked for features by workers (see `distill_chunk`), which is used to descend into child tiles
+    (see `get_child_chunks`). Thus, main process only queries extent of source.
+
+    Parameters
+    ----------
+    source : str
+        Name of MVT source
+
+    Returns
+    -------
+    Optional[list[tuple[str, int, int, list[int]]]]
+        Holding source, z, x and y-coordinates of tile columns; None if tiles are not derived from data
+        (see setting `MAP_ENGINE_DISTILL_EXTENT`) or extent cannot be determined
+    """
+    if settings.MAP_ENGINE_DISTILL_EXTENT != "data":
+        return None
+    extent = get_source_extent(get_source_managers(source))
+    if extent is None:
+        return None
+    min_zoom = settings.MAP_ENGINE_MIN_ZOOM
+    columns = {}
+    for x, y in utils.get_tiles_for_bbox(extent, min_zoom):
+        columns.setdefault(x, []).append(y)
+    return [(source, min_zoom, x, sorted(ys)) for x, ys in sorted(columns.items())]
+
+
+def get_child_chunks(source: str, z: int, x: int, ys: list[int]) -> list[tuple[str, int, int, list[int]]]:
+    """
+    Return tile columns of child tiles of given tiles (up to `MAP_ENGINE_MAX_DISTILLED_ZOOM`)
+
+    Parameters
+    ----------
+    source : str
+        Name of MVT source
+    z : int
+        Zoom level of parent tiles
+    x : int
+        x-coordinate of parent tile column
+    ys : list[int]
+        y-coordinates of parent tiles
+
+    Returns
+    -------
+    list[tuple[str, int, int, list[int]]]
+        Holding source, z, x and y-coordinates of both child tile columns
+    """
+    if not ys or z >= settings.MAP_ENGINE_MAX_DISTILLED_ZOOM:
+        return []
+    child_ys = sorted(2 * y + dy for y in ys for dy in (0, 1))
+    return [(source, z + 1, 2 * x + dx, child_ys) for dx in (0, 1)]
+
+
+def get_chunks(
+    sources: Iterable[str], coordinates: Optional[dict[str, Iterable[tuple[int, int, int]]]] = None
+) -> Iterable[tuple[str, int, int, list[int]]]:
+    """
+    Return tiles to distill grouped by source and tile column
+
+    Parameters
+    ----------
+    sources : Iterable[str]
+        Sources to distill
+    coordinates : Optional[dict[str, Iterable[tuple[int, int, int]]]]
+        x,y,z coordinates per source; if not given, fixed rectangle from settings is used
+        (tiles derived from data are distilled via `get_data_chunks` instead)
+
+    Yields
+    ------
+    tuple[str, int, int, list[int]]
+        Holding source, z, x and y-coordinates of tile column
+    """
+    for source in sources:
+        if coordinates is None:
+            # Coordinates from settings are already ordered by z, x and y
+            source_coordinates = get_coordinates_from_settings()
+        else:
+            source_coordinates = sorted(coordinates[source], key=lambda tile: (tile[2], tile[0], tile[1]))
+        for (x, z), tiles in itertools.groupby(source_coordinates, key=lambda tile: (tile[0], tile[2])):
+            yield source, z, x, [tile[1] for tile in tiles]
+
+
+def get_coordinates_for_extents(extents: Iterable[tuple[float, float, float, float]]) -> set[tuple[int, int, int]]:
+    """
+    Return x,y,z coordinates of all distilled tiles touching given WGS84 extents
+
+    Parameters
+    ----------
+    extents : Iterable[tuple[float, float, float, float]]
+        Extents (xmin, ymin, xmax, ymax) of changed features
+
+    Returns
+    -------
+    set[tuple[int, int, int]]
+        Holding x,y,z of affected tiles
+    """
+    coordinates = set()
+    for extent in extents:
+        for z in range(settings.MAP_ENGINE_MIN_ZOOM, settings.MAP_ENGINE_MAX_DISTILLED_ZOOM + 1):
+            coordinates.update((x, y, z) for x, y in utils.get_tiles_for_bbox(extent, z))
+    return coordinates
+
+
+def get_changed_extents(
+    model: type, pks: Optional[list] = None, since: Optional[datetime.datetime] = None, updated_field: str = "updated"
+) -> dict[str, list[tuple[float, float, float, float]]]:
+    """
+    Return WGS84 extents of changed features of given model for each source using the model
+
+    Parameters
+    ----------
+    model : type
+        Model holding changed features
+    pks : Optional[list]
+        Primary keys of changed features
+    since : Optional[datetime.datetime]
+        Only features changed since given time (according to `updated_field`) are returned
+    updated_field : str
+        Name of model field holding time of last update
+
+    Returns
+    -------
+    dict[str, list[tuple[float, float, float, float]]]
+        Extents of changed features per source
+    """
+    # pylint: disable=C0415
+    from django.contrib.gis.db.models.functions import Envelope, Transform
+
+    extents = {}
+    for source in settings.MAP_ENGINE_API_MVTS:
+        for manager in get_source_managers(source):
+            if manager.model is not model:
+                continue
+            query = manager.get_queryset()
+            if pks is not None:
+                query = query.filter(pk__in=pks)
+            if since is not None:
+                query = query.filter(**{f"{updated_field}__gte": since})
+            envelopes = query.annotate(
+                mapengine_envelope=Envelope(Transform(manager.geo_col, 4326)),
+            ).values_list("mapengine_envelope", flat=True)
+            extents.setdefault(source, []).extend(envelope.extent for envelope in envelopes if envelope)
+    return extents
+
+
+def get_recorded_extents() -> tuple[dict[str, list[tuple[float, float, float, float]]], Optional[int]]:
+    """
+    Return WGS84 extents of changed features recorded via signals (see setting `MAP_ENGINE_TRACK_CHANGES`)
+
+    Returns
+    -------
+    tuple[dict[str, list[tuple[float, float, float, float]]], Optional[int]]
+        Extents of changed features per source and ID of latest recorded change
+        (changes up to this ID shall be deleted after re-distilling)
+    """
+    # pylint: disable=C0415
+    from .models import TileChange
+
+    extents = {}
+    last_id = None
+    for change in TileChange.objects.order_by("id"):
+        if change.source in settings.MAP_ENGINE_API_MVTS:
+            extents.setdefault(change.source, []).append(change.extent)
+        last_id = change.id
+    return extents, last_id
+
+
+def read_manifest(manifest_path: pathlib.Path) -> dict[str, Optional[list[int]]]:
+    """
+    Return finished tile columns recorded in manifest
+
+    Each line holds "source/z/x"; tile columns derived from data additionally hold y-coordinates of tiles
+    holding features (separated by space), which are needed to resume descending into their child tiles.
+
+    Returns
+    -------
+    dict[str, Optional[list[int]]]
+        y-coordinates of tiles holding features (None, if data was not checked) per tile column
+    """
+    done = {}
+    for line in manifest_path.read_text(encoding="utf-8").splitlines():
+        column, data_checked, ys = line.partition(" ")
+        if column:
+            done[column] = [int(y) for y in ys.split(",") if y] if data_checked else None
+    return done
+
+
+def distill(  # noqa: PLR0913
+    output_dir: pathlib.Path,
+    sources: Optional[list[str]] = None,
+    workers: Optional[int] = None,
+    *,
+    resume: bool = False,
+    report: Optional[Callable[[DistillStats], None]] = None,
+    report_interval: float = 10.0,
+    coordinates: Optional[dict[str, Iterable[tuple[int, int, int]]]] = None,
+) -> DistillStats:  # pylint: disable=R0913,R0914
+    """
+    Distill MVTs of given sources in parallel and write them to output folder
+
+    Tiles are rendered in a process pool, each worker using its own database connection.
+    If tiles are derived from data (see `get_data_chunks`), workers check tiles for features and child tile columns
+    are submitted as soon as their parent column is finished; thus, total number of tiles grows during run.
+    Depending on setting `MAP_ENGINE_DISTILL_FORMAT`, tiles are written as single files ("files")
+    or into one MBTiles archive per source ("mbtiles"), which is written by main process.
+    Finished tile columns are recorded in a manifest file in output folder; if `resume` is set,
+    tile columns already recorded are skipped, otherwise manifest is reset.
+
+    Parameters
+    ----------
+    output_dir : pathlib.Path
+        Root folder of distilled MVTs
+    sources : Optional[list[str]]
+        Sources to distill, defaults to all sources in `MAP_ENGINE_API_MVTS`
+    workers : Optional[int]
+        Number of worker processes, defaults to number of CPUs
+    resume : bool
+        Resume interrupted run by skipping already distilled tile columns
+    report : Optional[Callable[[DistillStats], None]]
+        Called with current stats every `report_interval` seconds and at the end
+    report_interval : float
+        Seconds between progress reports
+    coordinates : Optional[dict[str, Iterable[tuple[int, int, int]]]]
+        Only distill given x,y,z coordinates per source (i.e. tiles affected by changed features);
+        such incremental runs use a separate manifest
+
+    Returns
+    -------
+    DistillStats
+        Final stats of distill run
+    """
+    if coordinates is not None:
+        sources = list(coordinates)
+    sources = sources or list(settings.MAP_ENGINE_API_MVTS)
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / (MANIFEST_FILENAME if coordinates is None else f"{MANIFEST_FILENAME}_incremental")
+    done = read_manifest(manifest_path) if resume and manifest_path.exists() else {}
+
+    # Chunks are tuples of tile column (source, z, x, ys) and whether tiles shall be checked for features
+    chunks = []
+    for source in sources:
+        data_chunks = get_data_chunks(source) if coordinates is None else None
+        if data_chunks is None:
+            chunks.extend((chunk, False) for chunk in get_chunks([source], coordinates))
+        else:
+            chunks.extend((chunk, True) for chunk in data_chunks)
+    stats = DistillStats()
+    last_report = time.monotonic()
+
+    use_archive = settings.MAP_ENGINE_DISTILL_FORMAT == "mbtiles"
+    archives = {}
+    if use_archive:
+        archives = {
+            source: archive.MBTilesWriter(
+                archive.get_archive_path(source, output_dir),
+                source,
+                replace=coordinates is None,
+                resume=resume,
+                encoding=compression.get_encoding(),
+            )
+            for source in sources
+        }
+
+    # Close connections before forking, otherwise workers would share (and close) connection of parent process
+    connections.close_all()
+    with manifest_path.open("a" if resume else "w", encoding="utf-8") as manifest, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker
+    ) as executor:
+        futures = {}
+
+        def submit(chunks: list[tuple[tuple[str, int, int, list[int]], bool]]) -> None:
+            while chunks:
+                chunk, check_data = chunks.pop()
+                column = f"{chunk[0]}/{chunk[1]}/{chunk[2]}"
+                if column in done and not (check_data and done[column] is None):
+                    if check_data:
+                        chunks.extend((child, True) for child in get_child_chunks(*chunk[:3], done[column]))
+                    continue
+                stats.total += len(chunk[3])
+                future = executor.submit(distill_chunk, output_dir, *chunk, collect=use_archive, check_data=check_data)
+                futures[future] = chunk
+
+        try:
+            submit(chunks)
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    source, z, x, ys = futures.pop(future)
+                    empty, bytes_written, tiles, feature_ys = future.result()
+                    if use_archive:
+                        archives[source].write_tiles(z, x, tiles)
+                    stats.tiles += len(ys)
+                    stats.empty += empty
+                    stats.bytes_written += bytes_written
+                    if feature_ys is None:
+                        manifest.write(f"{source}/{z}/{x}\n")
+                    else:
+                        manifest.write(f"{source}/{z}/{x} {','.join(map(str, feature_ys))}\n")
+                        submit([(child, True) for child in get_child_chunks(source, z, x, feature_ys)])
+                    manifest.flush()
+                if report and time.monotonic() - last_report > report_interval:
+                    report(stats)
+                    last_report = time.monotonic()
+        except BaseException:
+            # Stop pending tile columns; finished ones are kept in manifest and can be resumed
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    for source_archive in archives.values():
+        source_archive.close()
+    if report:
+        report(stats)
+    return stats
@@ -0,0 +1,184 @@
+"""
+Module to encode cluster points in binary feature formats
+
+Besides GeoJSON, cluster points can be served as
+- FlatGeobuf (incl. packed Hilbert R-tree spatial index), encoded by PostGIS via `ST_AsFlatGeobuf` (PostGIS >= 3.2),
+- Arrow IPC stream using GeoArrow point encoding (requires package `pyarrow`); rows are fetched in chunks from a
+  server-side cursor and transposed into columns, thus each chunk is encoded as one record batch.
+Both formats are built from a single SQL query selecting properties and WGS84 geometry of all points.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence
+
+from django.db import connection
+
+if TYPE_CHECKING:
+    from django.db.models import Field
+
+CONTENT_TYPES = {
+    "geojson": "application/geo+json",
+    "flatgeobuf": "application/flatgeobuf",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# URL suffixes of formats
+SUFFIXES = {"geojson": "geojson", "flatgeobuf": "fgb", "arrow": "arrow"}
+# Name of geometry column in binary formats
+GEOMETRY_COLUMN = "geometry"
+# Marks end of Arrow IPC stream (continuation token followed by zero length)
+ARROW_END_OF_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+_INTEGER_TYPES = {
+    "AutoField",
+    "BigAutoField",
+    "SmallAutoField",
+    "IntegerField",
+    "BigIntegerField",
+    "SmallIntegerField",
+    "PositiveIntegerField",
+    "PositiveBigIntegerField",
+    "PositiveSmallIntegerField",
+}
+
+
+def negotiate_format(accept: str, default: str = "geojson") -> str:
+    """
+    Return format best matching "Accept" request header
+
+    Parameters
+    ----------
+    accept : str
+        Value of "Accept" request header, i.e. "application/flatgeobuf, application/geo+json;q=0.5"
+    default : str
+        Format used if no supported format is accepted explicitly
+
+    Returns
+    -------
+    str
+        Format with highest quality (earlier formats of `CONTENT_TYPES` win ties)
+    """
+    qualities = {}
+    for item in accept.split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.lower()] = quality
+    best_format, best_quality = default, 0.0
+    for output_format, content_type in CONTENT_TYPES.items():
+        quality = qualities.get(content_type, 0.0)
+        if quality > best_quality:
+            best_format, best_quality = output_format, quality
+    return best_format
+
+
+def get_url_name(layer_id: str, output_format: Optional[str]) -> str:
+    """Return URL name of cluster feature view in given format (None for view negotiating format)"""
+    if output_format == "geojson":
+        return f"{layer_id}_cluster"
+    return f"{layer_id}_cluster_{SUFFIXES.get(output_format, 'features')}"
+
+
+def get_flatgeobuf_query(rows_query: str) -> str:
+    """Return query encoding rows (holding WGS84 geometry in column `GEOMETRY_COLUMN`) into indexed FlatGeobuf"""
+    return f"SELECT ST_AsFlatGeobuf(points.*, true, '{GEOMETRY_COLUMN}') FROM ({rows_query}) AS points"
+
+
+def get_flatgeobuf(rows_query: str, params: Sequence) -> bytes:
+    """Return FlatGeobuf of rows; empty bytes, if there are no rows"""
+    with connection.cursor() as cursor:
+        cursor.execute(get_flatgeobuf_query(rows_query), params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+def get_arrow_type(field: Optional[Field]) -> tuple[str, str]:
+    """Return SQL cast and pyarrow type (name) of column, unknown types are encoded as strings"""
+    if field is None:
+        return "text", "string"
+    if field.is_relation:
+        field = field.target_field
+    internal_type = field.get_internal_type()
+    if internal_type in _INTEGER_TYPES:
+        return "bigint", "int64"
+    if internal_type in ("FloatField", "DecimalField"):
+        return "double precision", "float64"
+    if internal_type == "BooleanField":
+        return "boolean", "bool_"
+    return "text", "string"
+
+
+def _get_pyarrow():  # noqa: ANN202
+    try:
+        import pyarrow  # pylint: disable=C0415
+    except ImportError as error:
+        raise ImportError(
+            "Arrow output requires package 'pyarrow', install it via 'pip install django-mapengine[arrow]'."
+        ) from error
+    return pyarrow
+
+
+def get_arrow_schema(columns: dict[str, str]):  # noqa: ANN201
+    """Return Arrow schema of given columns (and pyarrow type names) and GeoArrow point column (separated x/y)"""
+    pa = _get_pyarrow()
+    coordinates = pa.struct([pa.field("x", pa.float64()), pa.field("y", pa.float64())])
+    geometry = pa.field(
+        GEOMETRY_COLUMN,
+        coordinates,
+        metadata={
+            "ARROW:extension:name": "geoarrow.point",
+            "ARROW:extension:metadata": json.dumps({"crs": "OGC:CRS84"}),
+        },
+    )
+    return pa.schema([*(pa.field(name, getattr(pa, type_name)()) for name, type_name in columns.items()), geometry])
+
+
+def get_record_batch(schema, rows: list[tuple]):  # noqa: ANN001,ANN201
+    """Transpose rows (properties followed by x and y) into columns and return them as record batch"""
+    pa = _get_pyarrow()
+    columns = list(zip(*rows))
+    arrays = [pa.array(column, type=field.type) for column, field in zip(columns[:-2], schema)]
+    geometry_field = schema.field(GEOMETRY_COLUMN)
+    arrays.append(
+        pa.StructArray.from_arrays(
+            [pa.array(columns[-2], type=pa.float64()), pa.array(columns[-1], type=pa.float64())],
+            fields=list(geometry_field.type),
+        )
+    )
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def stream_arrow(rows_query: str, params: Sequence, columns: dict[str, str], chunk_size: int) -> Iterator[bytes]:
+    """
+    Stream rows as Arrow IPC stream, encoding each chunk of rows fetched from server-side cursor as record batch
+
+    Parameters
+    ----------
+    rows_query : str
+        Query selecting given columns followed by x and y coordinates (WGS84)
+    params : Sequence
+        Parameters of query
+    columns : dict[str, str]
+        Names and pyarrow type names of columns
+    chunk_size : int
+        Number of rows per record batch
+
+    Yields
+    ------
+    bytes
+        Schema message, record batch messages and end-of-stream marker
+    """
+    schema = get_arrow_schema(columns)
+    yield schema.serialize().to_pybytes()
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(rows_query, params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield get_record_batch(schema, rows).serialize().to_pybytes()
+    yield ARROW_END_OF_STREAM
@@ -149,16 +149,19 @@ class ClusterModelLayer(ModelLayer):
             id=self.id,
             source=self.source,
             style=get_layer_style(self.id),
+            source_layer=self.source_layer,
         )
         yield MapLayer(
             id=f"{self.id}_cluster",
             source=self.source,
             style=get_layer_style(f"{self.id}_cluster"),
+            source_layer=self.source_layer,
         )
         yield MapLayer(
             id=f"{self.id}_cluster_count",
             source=self.source,
             style=get_layer_style(f"{self.id}_cluster_count"),
+            source_layer=self.source_layer,
         )
 
 
@@ -211,7 +214,9 @@ def get_cluster_layers() -> Iterable[ClusterModelLayer]:
         Clustered model layers to show on map.
     """
     for cluster in settings.MAP_ENGINE_API_CLUSTERS:
-        yield ClusterModelLayer(id=cluster.layer_id, source=cluster.layer_id)
+        # Server-side clusters are served as MVTs, thus map layers need a source layer
+        source_layer = cluster.layer_id if cluster.server_side else None
+        yield ClusterModelLayer(id=cluster.layer_id, source=cluster.layer_id, source_layer=source_layer)
 
 
 def get_layer_by_id(layer_id: str) -> setup.ModelAPI:
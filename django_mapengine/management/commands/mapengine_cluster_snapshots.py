@@ -0,0 +1,33 @@
+"""Management command to write snapshots of cluster GeoJSONs into `MAP_ENGINE_CLUSTER_SNAPSHOT_DIR`."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_mapengine import snapshots
+
+
+class Command(BaseCommand):
+    """Write compressed snapshots of given cluster layers"""
+
+    help = (  # noqa: A003
+        "Write GeoJSON snapshots (uncompressed, gzip and brotli) of given cluster layers (or all cluster layers), "
+        "served by cluster views instead of generating GeoJSON live"
+    )
+
+    def add_arguments(self, parser):
+        """Add cluster layers to write snapshots of"""
+        parser.add_argument("layers", nargs="*", help="Cluster layers to write snapshots of (defaults to all layers)")
+
+    def handle(self, *args, **options):
+        """Write snapshot for each cluster layer"""
+        if snapshots.get_snapshot_dir() is None:
+            raise CommandError("Snapshots are deactivated. Set 'MAP_ENGINE_CLUSTER_SNAPSHOT_DIR' in your settings.")
+        cluster_apis = {cluster.layer_id: cluster for cluster in settings.MAP_ENGINE_API_CLUSTERS}
+        for layer_id in options["layers"]:
+            if layer_id not in cluster_apis:
+                raise CommandError(f"Unknown cluster layer '{layer_id}'.")
+        for layer_id in options["layers"] or list(cluster_apis):
+            metadata = snapshots.write_snapshot(cluster_apis[layer_id])
+            self.stdout.write(
+                f"Wrote snapshot of cluster layer '{layer_id}' ({metadata['size']} bytes, ETag {metadata['etag']})."
+            )
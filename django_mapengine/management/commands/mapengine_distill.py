@@ -0,0 +1,104 @@
+"""Management command to distill MVTs in parallel without HTTP view layer."""
+
+import pathlib
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from django_mapengine import archive, distill
+
+
+class Command(BaseCommand):
+    """Distill MVTs of all (or given) sources using a process pool"""
+
+    help = "Distill MVTs in parallel and write them to distill folder; interrupted runs can be resumed"  # noqa: A003
+
+    def add_arguments(self, parser):
+        """Add options for sources, output folder, number of workers, resuming and incremental runs"""
+        parser.add_argument("sources", nargs="*", help="MVT sources to distill (defaults to all sources)")
+        parser.add_argument(
+            "--output",
+            help=(
+                "Root folder of distilled MVTs (defaults to setting 'DISTILL_DIR' "
+                "or 'MAP_ENGINE_DISTILL_ARCHIVE_DIR' if MBTiles archives are used)"
+            ),
+        )
+        parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+        parser.add_argument("--resume", action="store_true", help="Resume interrupted distill run")
+        parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress reports")
+        incremental = parser.add_argument_group("incremental", "Only re-distill tiles touched by changed features")
+        incremental.add_argument(
+            "--changes", action="store_true", help="Re-distill tiles of changes recorded via MAP_ENGINE_TRACK_CHANGES"
+        )
+        incremental.add_argument("--model", help="Model holding changed features (i.e. 'map.WindTurbine')")
+        incremental.add_argument("--pks", nargs="+", help="Primary keys of changed features of given model")
+        incremental.add_argument("--since", help="Re-distill features of given model changed since given datetime")
+        incremental.add_argument(
+            "--updated-field", default="updated", help="Field holding time of last update (used with '--since')"
+        )
+
+    def handle(self, *args, **options):
+        """Distill tiles and report progress"""
+        if options["output"] is None:
+            if settings.MAP_ENGINE_DISTILL_FORMAT == "mbtiles":
+                options["output"] = archive.get_archive_dir()
+            else:
+                options["output"] = getattr(settings, "DISTILL_DIR", None)
+        if options["output"] is None:
+            raise CommandError("Output folder must be given, either via '--output' or setting 'DISTILL_DIR'.")
+        for source in options["sources"]:
+            if source not in settings.MAP_ENGINE_API_MVTS:
+                raise CommandError(f"Unknown MVT source {source=}.")
+
+        last_change_id = None
+        coordinates = None
+        if options["changes"]:
+            extents, last_change_id = distill.get_recorded_extents()
+            coordinates = self.get_coordinates(extents, options["sources"])
+        elif options["model"]:
+            coordinates = self.get_coordinates(self.get_model_extents(options), options["sources"])
+        elif options["pks"] or options["since"]:
+            raise CommandError("Option '--model' must be given together with '--pks' or '--since'.")
+
+        if coordinates is not None and not coordinates:
+            self.stdout.write("No changed features found.")
+        else:
+            distill.distill(
+                pathlib.Path(options["output"]),
+                sources=options["sources"] or None,
+                workers=options["workers"],
+                resume=options["resume"],
+                report=lambda stats: self.stdout.write(str(stats)),
+                report_interval=options["report_interval"],
+                coordinates=coordinates,
+            )
+        if last_change_id is not None:
+            # pylint: disable=C0415
+            from django_mapengine.models import TileChange
+
+            TileChange.objects.filter(id__lte=last_change_id).delete()
+
+    @staticmethod
+    def get_model_extents(options: dict) -> dict:
+        """Return extents of changed features for given model, primary keys and time window"""
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError) as error:
+            raise CommandError(f"Unknown model '{options['model']}'.") from error
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid datetime '{options['since']}'.")
+        return distill.get_changed_extents(model, options["pks"], since, options["updated_field"])
+
+    @staticmethod
+    def get_coordinates(extents: dict, sources: list[str]) -> dict:
+        """Return coordinates of affected tiles per source, optionally restricted to given sources"""
+        return {
+            source: distill.get_coordinates_for_extents(source_extents)
+            for source, source_extents in extents.items()
+            if source_extents and (not sources or source in sources)
+        }
@@ -0,0 +1,72 @@
+"""Management command to build tables of precomputed, generalized geometries for MVT managers."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from django_mapengine.managers import MVTManager
+
+
+class Command(BaseCommand):
+    """Build or refresh generalized geometry tables for each zoom band using method "table" in MVT managers"""
+
+    help = "Build (or refresh) generalized geometry tables for MVT managers using method 'table'"  # noqa: A003
+
+    def add_arguments(self, parser):
+        """Add option to drop tables"""
+        parser.add_argument("--drop", action="store_true", help="Drop generalized geometry tables")
+
+    def handle(self, *args, **options):
+        """Build tables for each manager and zoom band"""
+        managers = self.get_managers()
+        if not managers:
+            raise CommandError("No MVT manager using generalization method 'table' found in 'MAP_ENGINE_API_MVTS'.")
+        qn = connection.ops.quote_name
+        for manager in managers:
+            meta = manager.model._meta  # noqa: SLF001  # pylint: disable=W0212
+            geo_col = meta.get_field(manager.geo_col).column
+            for generalization in manager.generalizations:
+                if generalization.method != "table":
+                    continue
+                table = generalization.get_table_name(meta.db_table)
+                if options["drop"]:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"DROP TABLE IF EXISTS {qn(table)}")
+                    self.stdout.write(f"Dropped table '{table}'.")
+                    continue
+                tolerance = generalization.get_tolerance(generalization.maxzoom)
+                new_table = f"{table}__new"
+                with connection.cursor() as cursor:
+                    # Build new table aside, so that tiles can be served from old table meanwhile
+                    cursor.execute(f"DROP TABLE IF EXISTS {qn(new_table)}")
+                    cursor.execute(
+                        f"CREATE TABLE {qn(new_table)} AS "
+                        f"SELECT {qn(meta.pk.column)} AS id, "
+                        f"ST_SimplifyPreserveTopology(ST_Transform({qn(geo_col)}, 3857), %s) AS geom "
+                        f"FROM {qn(meta.db_table)}",
+                        [tolerance],
+                    )
+                    cursor.execute(f"ALTER TABLE {qn(new_table)} ADD PRIMARY KEY (id)")
+                    cursor.execute(f"CREATE INDEX ON {qn(new_table)} USING GIST (geom)")
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE IF EXISTS {qn(table)}")
+                    cursor.execute(f"ALTER TABLE {qn(new_table)} RENAME TO {qn(table)}")
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {qn(table)}")
+                self.stdout.write(
+                    f"Built table '{table}' for zoom levels {generalization.minzoom}-{generalization.maxzoom} "
+                    f"(tolerance {tolerance:.2f} m)."
+                )
+
+    @staticmethod
+    def get_managers() -> list[MVTManager]:
+        """Return distinct MVT managers holding at least one generalization using precomputed tables"""
+        managers = []
+        for mvt_apis in settings.MAP_ENGINE_API_MVTS.values():
+            for mvt_api in mvt_apis:
+                manager = mvt_api.manager
+                if not isinstance(manager, MVTManager) or any(manager is other for other in managers):
+                    continue
+                if any(generalization.method == "table" for generalization in manager.generalizations):
+                    managers.append(manager)
+        return managers
@@ -0,0 +1,130 @@
+"""Management command to add and maintain EPSG:3857 geometry columns used by MVTManager."""
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from django_mapengine.managers import MVTManager
+
+
+class Command(BaseCommand):
+    """Add, refresh or drop EPSG:3857 geometry columns (including GiST index) for MVT managers using `geo_col_3857`"""
+
+    help = (  # noqa: A003
+        "Add EPSG:3857 geometry column and GiST index to tables of MVT managers using 'geo_col_3857'. "
+        "By default, a generated column is used; use '--stored' to add a plain column kept in sync via trigger."
+    )
+
+    def add_arguments(self, parser):
+        """Add options for column type, refreshing and dropping"""
+        parser.add_argument(
+            "--stored",
+            action="store_true",
+            help="Add plain column kept in sync by trigger instead of generated column (PostgreSQL < 12)",
+        )
+        parser.add_argument(
+            "--refresh", action="store_true", help="Recalculate values of stored columns and rebuild index"
+        )
+        parser.add_argument("--drop", action="store_true", help="Drop columns, triggers and indexes")
+
+    def handle(self, *args, **options):
+        """Run SQL statements for each table"""
+        tables = self.get_tables()
+        if not tables:
+            raise CommandError("No MVT manager using 'geo_col_3857' found in 'MAP_ENGINE_API_MVTS'.")
+        for table, geo_col, geo_col_3857 in tables:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if options["drop"]:
+                    statements = self.get_drop_statements(table, geo_col_3857)
+                elif options["refresh"]:
+                    statements = self.get_refresh_statements(table, geo_col, geo_col_3857)
+                else:
+                    statements = self.get_create_statements(table, geo_col, geo_col_3857, stored=options["stored"])
+                for statement in statements:
+                    cursor.execute(statement)
+            self.stdout.write(f"Processed column '{geo_col_3857}' of table '{table}'.")
+        with connection.cursor() as cursor:
+            for table, _, _ in tables:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+    @staticmethod
+    def get_tables() -> list[tuple[str, str, str]]:
+        """
+        Return tables, geometry columns and EPSG:3857 columns from MVT managers
+
+        Columns which are defined as model fields are skipped, as they are handled by migrations.
+
+        Returns
+        -------
+        list[tuple[str, str, str]]
+            Table name, geometry column and EPSG:3857 geometry column for each table
+        """
+        tables = []
+        for mvt_apis in settings.MAP_ENGINE_API_MVTS.values():
+            for mvt_api in mvt_apis:
+                manager = mvt_api.manager
+                if not isinstance(manager, MVTManager) or not manager.geo_col_3857:
+                    continue
+                meta = manager.model._meta  # noqa: SLF001  # pylint: disable=W0212
+                try:
+                    meta.get_field(manager.geo_col_3857)
+                    continue
+                except FieldDoesNotExist:
+                    pass
+                table = (meta.db_table, meta.get_field(manager.geo_col).column, manager.geo_col_3857)
+                if table not in tables:
+                    tables.append(table)
+        return tables
+
+    @staticmethod
+    def get_create_statements(table: str, geo_col: str, geo_col_3857: str, *, stored: bool) -> list[str]:
+        """Return SQL statements to add column and index"""
+        qn = connection.ops.quote_name
+        if stored:
+            trigger = qn(f"{table}_{geo_col_3857}_sync")
+            statements = [
+                f"ALTER TABLE {qn(table)} ADD COLUMN IF NOT EXISTS {qn(geo_col_3857)} geometry(Geometry, 3857)",
+                f"CREATE OR REPLACE FUNCTION {trigger}() RETURNS trigger AS $$ "
+                f"BEGIN NEW.{qn(geo_col_3857)} := ST_Transform(NEW.{qn(geo_col)}, 3857); RETURN NEW; END; "
+                "$$ LANGUAGE plpgsql",
+                f"DROP TRIGGER IF EXISTS {trigger} ON {qn(table)}",
+                f"CREATE TRIGGER {trigger} BEFORE INSERT OR UPDATE OF {qn(geo_col)} ON {qn(table)} "
+                f"FOR EACH ROW EXECUTE PROCEDURE {trigger}()",
+                f"UPDATE {qn(table)} SET {qn(geo_col_3857)} = ST_Transform({qn(geo_col)}, 3857) "
+                f"WHERE {qn(geo_col_3857)} IS NULL",
+            ]
+        else:
+            statements = [
+                f"ALTER TABLE {qn(table)} ADD COLUMN IF NOT EXISTS {qn(geo_col_3857)} geometry(Geometry, 3857) "
+                f"GENERATED ALWAYS AS (ST_Transform({qn(geo_col)}, 3857)) STORED",
+            ]
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_{geo_col_3857}_gist')} "
+            f"ON {qn(table)} USING GIST ({qn(geo_col_3857)})"
+        )
+        return statements
+
+    @staticmethod
+    def get_refresh_statements(table: str, geo_col: str, geo_col_3857: str) -> list[str]:
+        """Return SQL statements to recalculate stored column and rebuild its index"""
+        qn = connection.ops.quote_name
+        return [
+            # Generated columns cannot be updated, thus only stored columns are updated
+            f"DO $$ BEGIN IF (SELECT is_generated = 'NEVER' FROM information_schema.columns "
+            f"WHERE table_name = '{table}' AND column_name = '{geo_col_3857}') THEN "
+            f"UPDATE {qn(table)} SET {qn(geo_col_3857)} = ST_Transform({qn(geo_col)}, 3857); END IF; END $$",
+            f"REINDEX INDEX {qn(f'{table}_{geo_col_3857}_gist')}",
+        ]
+
+    @staticmethod
+    def get_drop_statements(table: str, geo_col_3857: str) -> list[str]:
+        """Return SQL statements to drop column, trigger and index"""
+        qn = connection.ops.quote_name
+        trigger = qn(f"{table}_{geo_col_3857}_sync")
+        return [
+            f"DROP TRIGGER IF EXISTS {trigger} ON {qn(table)}",
+            f"DROP FUNCTION IF EXISTS {trigger}()",
+            f"DROP INDEX IF EXISTS {qn(f'{table}_{geo_col_3857}_gist')}",
+            f"ALTER TABLE {qn(table)} DROP COLUMN IF EXISTS {qn(geo_col_3857)}",
+        ]
@@ -0,0 +1,42 @@
+"""Management command to purge cached MVTs and start new data revisions after loading new data."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from django_mapengine import cache, revisions
+
+
+class Command(BaseCommand):
+    """Invalidate cached tiles of given MVT sources"""
+
+    help = (  # noqa: A003
+        "Remove cached MVTs of given sources (or all sources) from tile cache "
+        "and start new data revisions of related models (if 'MAP_ENGINE_TILE_REVISIONS' is set)"
+    )
+
+    def add_arguments(self, parser):
+        """Add sources to invalidate"""
+        parser.add_argument(
+            "sources",
+            nargs="*",
+            help="MVT sources (or server-side cluster sources) to invalidate (defaults to all sources)",
+        )
+
+    def handle(self, *args, **options):
+        """Invalidate tile cache for each source"""
+        if cache.get_tile_cache() is None and not settings.MAP_ENGINE_TILE_REVISIONS:
+            raise CommandError(
+                "Neither tile cache nor data revisions are activated. "
+                "Set 'MAP_ENGINE_TILE_CACHE' or 'MAP_ENGINE_TILE_REVISIONS' in your settings."
+            )
+        sources = options["sources"] or cache.get_sources()
+        for source in sources:
+            try:
+                cache.invalidate_source(source)
+            except KeyError as error:
+                raise CommandError(str(error)) from error
+            if settings.MAP_ENGINE_TILE_REVISIONS:
+                # Bulk loads do not send signals, thus revisions are bumped here
+                for model in cache.get_source_models(source):
+                    revisions.bump_revision(model)
+            self.stdout.write(f"Invalidated cached tiles of source '{source}'.")
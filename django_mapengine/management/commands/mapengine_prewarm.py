@@ -0,0 +1,42 @@
+"""Management command to render most requested tiles into tile cache, i.e. after deploys or cache purges."""
+
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from django_mapengine import cache, prewarm
+
+
+class Command(BaseCommand):
+    """Pre-warm tile cache with most requested tiles recorded via `MAP_ENGINE_RECORD_TILE_HITS`"""
+
+    help = "Render most requested tiles per source and zoom level into tile cache"  # noqa: A003
+
+    def add_arguments(self, parser):
+        """Add options for sources, number of tiles, parallelism and time budget"""
+        parser.add_argument("sources", nargs="*", help="MVT sources to pre-warm (defaults to all sources)")
+        parser.add_argument("--top", type=int, default=100, help="Number of tiles per source and zoom level")
+        parser.add_argument("--days", type=int, default=None, help="Only consider tiles requested in last days")
+        parser.add_argument("--workers", type=int, default=4, help="Number of threads rendering tiles")
+        parser.add_argument("--time-budget", type=float, default=None, help="Stop rendering after given seconds")
+
+    def handle(self, *args, **options):
+        """Render tiles and report number of rendered tiles"""
+        if cache.get_tile_cache() is None:
+            raise CommandError("Tile cache is not activated. Set 'MAP_ENGINE_TILE_CACHE' in your settings.")
+        for source in options["sources"]:
+            if source not in settings.MAP_ENGINE_API_MVTS:
+                raise CommandError(f"Unknown MVT source {source=}.")
+        since = None
+        if options["days"] is not None:
+            since = timezone.now() - datetime.timedelta(days=options["days"])
+        tiles = prewarm.get_most_requested_tiles(
+            options["sources"] or list(settings.MAP_ENGINE_API_MVTS), top=options["top"], since=since
+        )
+        if not tiles:
+            self.stdout.write("No recorded tile requests found.")
+            return
+        stats = prewarm.prewarm(tiles, workers=options["workers"], time_budget=options["time_budget"])
+        self.stdout.write(str(stats))
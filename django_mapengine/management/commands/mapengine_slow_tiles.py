@@ -0,0 +1,57 @@
+"""Management command to list slowest tiles recorded via `MAP_ENGINE_SLOW_TILE_THRESHOLD` incl. their query plans."""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+
+from django_mapengine.models import SlowTile
+
+
+class Command(BaseCommand):
+    """List worst offending tiles and summary per source and zoom level"""
+
+    help = "List slowest recorded tiles (optionally incl. EXPLAIN ANALYZE plans)"  # noqa: A003
+
+    def add_arguments(self, parser):
+        """Add options for sources, number of tiles, time range, plans and clearing"""
+        parser.add_argument("sources", nargs="*", help="Only list tiles of given MVT sources")
+        parser.add_argument("--top", type=int, default=20, help="Number of tiles to list")
+        parser.add_argument("--days", type=int, default=None, help="Only consider tiles recorded in last days")
+        parser.add_argument("--plans", action="store_true", help="Print SQL and query plans of listed tiles")
+        parser.add_argument("--clear", action="store_true", help="Delete recorded slow tiles (of given sources)")
+
+    def handle(self, *args, **options):
+        """Print summary per source and zoom level and slowest tiles"""
+        slow_tiles = SlowTile.objects.all()
+        if options["sources"]:
+            slow_tiles = slow_tiles.filter(source__in=options["sources"])
+        if options["days"] is not None:
+            slow_tiles = slow_tiles.filter(created__gte=timezone.now() - datetime.timedelta(days=options["days"]))
+        if options["clear"]:
+            deleted, _ = slow_tiles.delete()
+            self.stdout.write(f"Deleted {deleted} slow tiles.")
+            return
+        if not slow_tiles.exists():
+            self.stdout.write("No slow tiles recorded.")
+            return
+
+        summary = (
+            slow_tiles.values("source", "z")
+            .annotate(tiles=Count("id"), avg_seconds=Avg("seconds"), max_seconds=Max("seconds"))
+            .order_by("-max_seconds")
+        )
+        self.stdout.write("Slow tiles per source and zoom level:")
+        for row in summary:
+            self.stdout.write(
+                f"  {row['source']:<30} z={row['z']:<3} {row['tiles']:>6} tiles "
+                f"avg={row['avg_seconds']:.3f} s max={row['max_seconds']:.3f} s"
+            )
+
+        self.stdout.write(f"\nSlowest {options['top']} tiles:")
+        for slow_tile in slow_tiles.order_by("-seconds")[: options["top"]]:
+            filters = f" filters={slow_tile.filters}" if slow_tile.filters else ""
+            self.stdout.write(f"  {slow_tile.created:%Y-%m-%d %H:%M} {slow_tile}{filters}")
+            if options["plans"]:
+                self.stdout.write(f"\n{slow_tile.query}\n\nParameters: {slow_tile.params}\n\n{slow_tile.plan}\n")
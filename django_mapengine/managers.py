@@ -2,16 +2,28 @@
 
 from __future__ import annotations
 
+from dataclasses import dataclass
 
 import django.db.models
 from django.contrib.gis.db import models
-from django.contrib.gis.db.models.functions import Transform
+from django.contrib.gis.db.models.aggregates import Extent
+from django.contrib.gis.db.models.functions import SnapToGrid, Transform
 from django.contrib.gis.geos import Polygon
-from django.core.exceptions import FieldError
+from django.core.exceptions import FieldDoesNotExist, FieldError
 from django.db import connection
+from django.db.models.functions import Coalesce
 from rest_framework.serializers import ValidationError
 from rest_framework_gis.tilenames import tile_edges
 
+from .setup import TileBudget
+from .utils import get_zoom_value
+
+MVT_EXTENT = 4096
+WEB_MERCATOR_MAX = 20037508.342789244
+WEB_MERCATOR_BOUNDS = (
+    f"ST_MakeEnvelope({-WEB_MERCATOR_MAX}, {-WEB_MERCATOR_MAX}, {WEB_MERCATOR_MAX}, {WEB_MERCATOR_MAX}, 3857)"
+)
+
 
 # pylint: disable=W0223, R0901
 class AsMVTGeom(models.functions.GeomOutputGeoFunc):  # noqa: D101
@@ -21,6 +33,95 @@ class AsMVTGeom(models.functions.GeomOutputGeoFunc):  # noqa: D101
     geom_param_pos = (0, 1)
 
 
+class SimplifyPreserveTopology(models.functions.GeomOutputGeoFunc):  # noqa: D101
+    """Add postgis class for function ST_SimplifyPreserveTopology."""
+
+    function = "ST_SimplifyPreserveTopology"
+
+
+class GeometryArea(django.db.models.Func):
+    """Add postgis class for function ST_Area returning plain float (in units of geometry SRID)."""
+
+    function = "ST_Area"
+    output_field = django.db.models.FloatField()
+
+
+class GeometryLength(django.db.models.Func):
+    """Add postgis class for function ST_Length returning plain float (in units of geometry SRID)."""
+
+    function = "ST_Length"
+    output_field = django.db.models.FloatField()
+
+
+class TileEnvelope(django.db.models.Func):
+    """
+    Add postgis class for function ST_TileEnvelope (requires PostGIS >= 3.0).
+
+    If margin is given, envelope is enlarged by given fraction of tile size (requires PostGIS >= 3.1).
+    """
+
+    function = "ST_TileEnvelope"
+    output_field = models.GeometryField(srid=3857)
+
+    def __init__(self, z, x, y, margin: float = 0.0, **extra) -> None:  # noqa: ANN001
+        """Init."""
+        expressions = [z, x, y]
+        if margin:
+            bounds = django.db.models.expressions.RawSQL(
+                WEB_MERCATOR_BOUNDS, (), output_field=models.GeometryField(srid=3857)
+            )
+            expressions += [bounds, float(margin)]
+        super().__init__(*expressions, **extra)
+
+
+def get_pixel_size(z: int) -> float:
+    """
+    Return size of a single MVT unit at given zoom level in EPSG:3857 units
+
+    Parameters
+    ----------
+    z : int
+        Zoom level
+
+    Returns
+    -------
+    float
+        Tile width divided by MVT extent
+    """
+    return 2 * WEB_MERCATOR_MAX / 2**z / MVT_EXTENT
+
+
+@dataclass
+class Generalization:
+    """
+    Zoom band in which geometries are generalized before they are encoded into MVTs
+
+    Zoom band ranges from `minzoom` to `maxzoom` (both inclusive).
+    Method is one of:
+    - "simplify": ST_SimplifyPreserveTopology at request time,
+    - "snap": ST_SnapToGrid at request time,
+    - "table": lookup of geometries precomputed via management command `mapengine_generalize`.
+    Tolerance is `factor` times size of a MVT unit at requested zoom (at `maxzoom` for precomputed tables).
+    """
+
+    minzoom: int
+    maxzoom: int
+    method: str = "simplify"
+    factor: float = 1.0
+
+    def __post_init__(self):
+        if self.method not in ("simplify", "snap", "table"):
+            raise ValueError(f"Unknown generalization method '{self.method}'.")
+
+    def get_tolerance(self, z: int) -> float:
+        """Return tolerance in EPSG:3857 units for given zoom"""
+        return self.factor * get_pixel_size(self.maxzoom if self.method == "table" else z)
+
+    def get_table_name(self, table: str) -> str:
+        """Return name of table holding precomputed geometries for given table"""
+        return f"{table}_gen_{self.minzoom}_{self.maxzoom}"
+
+
 class MVTManager(models.Manager):
     """Manager to get MVTs from model geometry using postgres MVT abilities."""
 
@@ -28,22 +129,84 @@ class MVTManager(models.Manager):
         self,
         *args,  # noqa: ANN002
         geo_col: str = "geom",
-        columns: list[str] | None = None,
+        columns: list[str] | dict[tuple[int, int], list[str]] | None = None,
+        parameterized: bool = False,
+        geo_col_3857: str | None = None,
+        margin: float = 0.0,
+        generalizations: list[Generalization] | None = None,
+        min_area: float | dict[tuple[int, int], float] | None = None,
+        min_length: float | dict[tuple[int, int], float] | None = None,
+        budget: TileBudget | dict[tuple[int, int], TileBudget] | None = None,
         **kwargs,
     ) -> None:
-        """Init."""
+        """
+        Init.
+
+        If `parameterized` is set, tile coordinates are passed as bind parameters to ST_TileEnvelope
+        (instead of an inlined bbox geometry). This way, SQL text of a tile query stays the same for all tiles and
+        MVTView can run it as server-side prepared statement.
+
+        If `geo_col_3857` is set, given column (holding geometries already transformed to EPSG:3857) is used
+        to build MVTs. Thus, no geometry has to be transformed per tile request and tile envelope can be
+        intersected via index-friendly bbox operator "&&". Column can either be a model field or a column added
+        via management command `mapengine_geom_3857`. `margin` enlarges tile envelope by given fraction of tile size
+        in order to include features near tile edges (i.e. for labels or point symbols).
+
+        `generalizations` define zoom bands in which geometries are simplified before being encoded,
+        as clipping and quantization to MVT extent would discard most vertices at low zooms anyway.
+
+        `columns`, `min_area` and `min_length` can be set per zoom range via dicts holding (minzoom, maxzoom) as keys
+        (both inclusive). Features having smaller area (in square MVT units) or length (in MVT units) than given
+        thresholds are dropped, as they would collapse to (nearly) a single pixel anyway.
+        Note that area of points and lines is zero, so `min_area` should only be used for polygon layers.
+
+        `budget` (optionally per zoom range) limits number of features and encoded bytes per tile,
+        thus dense layers are thinned instead of producing huge tiles (see `TileBudget`).
+        """
         super().__init__(*args, **kwargs)
         self.geo_col = geo_col
         self.columns = columns
+        self.parameterized = parameterized
+        self.geo_col_3857 = geo_col_3857
+        self.margin = margin
+        self.generalizations = generalizations or []
+        self.min_area = min_area
+        self.min_length = min_length
+        self.budget = budget
 
     def get_mvt_query(self, x: int, y: int, z: int, filters: dict | None = None) -> tuple:
         """Build MVT query; might be overwritten in child class."""
         filters = filters or {}
         return self._build_mvt_query(x, y, z, filters)
 
-    def get_columns(self) -> list[str]:
-        """Return columns to use as features in MVT."""
-        return self.columns or self._get_non_geom_columns()
+    def get_mvt_sql(self, x: int, y: int, z: int, filters: dict | None = None) -> tuple[str, tuple]:
+        """Build MVT query template and related parameters; might be overwritten in child class."""
+        filters = filters or {}
+        return self._build_mvt_sql(x, y, z, filters)
+
+    def get_columns(self, z: int | None = None) -> list[str]:
+        """Return columns to use as features in MVT at given zoom level."""
+        columns = get_zoom_value(self.columns, z)
+        return self._get_non_geom_columns() if columns is None else columns
+
+    def get_extent(self) -> tuple[float, float, float, float] | None:
+        """
+        Return extent of all geometries in WGS84.
+
+        Returns
+        -------
+        tuple[float, float, float, float] | None
+            Holding xmin, ymin, xmax, ymax or None if there are no geometries
+        """
+        return self.annotate(mvt_geom_4326=Transform(self.geo_col, 4326)).aggregate(
+            extent=Extent("mvt_geom_4326"),
+        )["extent"]
+
+    def has_features(self, x: int, y: int, z: int) -> bool:
+        """Return whether any geometry intersects tile with given coordinates."""
+        bbox = Polygon.from_bbox(tile_edges(x, y, z))
+        bbox.srid = 4326
+        return self.filter(**{f"{self.geo_col}__intersects": bbox}).exists()
 
     # pylint: disable=W0613,R0913
     def _filter_query(  # noqa: PLR0913
@@ -63,17 +226,127 @@ class MVTManager(models.Manager):
 
     def _get_mvt_geom_query(self, x: int, y: int, z: int) -> django.db.models.QuerySet:
         """Intersect bbox from given coordinates and return related MVT."""
-        bbox = Polygon.from_bbox(tile_edges(x, y, z))
-        bbox.srid = 4326
+        if self.geo_col_3857:
+            return self._get_mvt_geom_query_3857(x, y, z)
+        if self.parameterized:
+            bounds = TileEnvelope(z, x, y)
+            bbox = Transform(bounds, 4326)
+        else:
+            bbox = Polygon.from_bbox(tile_edges(x, y, z))
+            bbox.srid = 4326
+            bounds = Transform(bbox, 3857)
         query = self.annotate(
-            mvt_geom=AsMVTGeom(Transform(self.geo_col, 3857), Transform(bbox, 3857), 4096, 0, False),  # noqa: FBT003
+            mvt_geom=AsMVTGeom(
+                self._generalize(Transform(self.geo_col, 3857), z), bounds, MVT_EXTENT, 0, False  # noqa: FBT003
+            ),
         )
         intersect = {f"{self.geo_col}__intersects": bbox}
         return query.filter(**intersect)
 
+    def _get_mvt_geom_query_3857(self, x: int, y: int, z: int) -> django.db.models.QuerySet:
+        """Use precomputed EPSG:3857 geometry column and filter by bbox operator against tile envelope."""
+        # Alias is prefixed, as it must not clash with a model field named like `geo_col_3857`
+        query = self.alias(mapengine_geom_3857=self._get_geom_3857()).annotate(
+            mvt_geom=AsMVTGeom(
+                self._generalize(self._get_geom_3857(), z),
+                TileEnvelope(z, x, y),
+                MVT_EXTENT,
+                round(self.margin * MVT_EXTENT),
+                False,  # noqa: FBT003
+            ),
+        )
+        return query.filter(mapengine_geom_3857__bboverlaps=TileEnvelope(z, x, y, margin=self.margin))
+
+    def _get_geom_3857(self) -> django.db.models.expressions.Expression:
+        """Return expression for EPSG:3857 geometry column, which is either a model field or a raw table column."""
+        try:
+            self.model._meta.get_field(self.geo_col_3857)  # noqa: SLF001
+        except FieldDoesNotExist:
+            quote_name = connection.ops.quote_name
+            return django.db.models.expressions.RawSQL(
+                f"{quote_name(self.model._meta.db_table)}.{quote_name(self.geo_col_3857)}",  # noqa: SLF001
+                (),
+                output_field=models.GeometryField(srid=3857),
+            )
+        return django.db.models.F(self.geo_col_3857)
+
+    def get_generalization(self, z: int) -> Generalization | None:
+        """Return generalization for given zoom level, if any."""
+        for generalization in self.generalizations:
+            if generalization.minzoom <= z <= generalization.maxzoom:
+                return generalization
+        return None
+
+    def _generalize(
+        self, geom: django.db.models.expressions.Expression, z: int
+    ) -> django.db.models.expressions.Expression:
+        """
+        Return generalized EPSG:3857 geometry for given zoom level.
+
+        For method "table", features missing in generalized table (i.e. added after last run of
+        `mapengine_generalize`) fall back to their original geometry.
+        """
+        generalization = self.get_generalization(z)
+        if generalization is None:
+            return geom
+        if generalization.method == "simplify":
+            return SimplifyPreserveTopology(geom, generalization.get_tolerance(z))
+        if generalization.method == "snap":
+            return SnapToGrid(geom, generalization.get_tolerance(z))
+        quote_name = connection.ops.quote_name
+        table = self.model._meta.db_table  # noqa: SLF001
+        generalized = django.db.models.expressions.RawSQL(
+            f"(SELECT generalized.geom FROM {quote_name(generalization.get_table_name(table))} AS generalized "
+            f"WHERE generalized.id = {quote_name(table)}.{quote_name(self.model._meta.pk.column)})",  # noqa: SLF001
+            (),
+            output_field=models.GeometryField(srid=3857),
+        )
+        return Coalesce(generalized, geom, output_field=models.GeometryField(srid=3857))
+
+    def _filter_size(self, query: django.db.models.QuerySet, z: int) -> django.db.models.QuerySet:
+        """Drop features which are smaller than minimal area or length at given zoom level."""
+        pixel_size = get_pixel_size(z)
+        geom = self._get_geom_3857() if self.geo_col_3857 else Transform(self.geo_col, 3857)
+        min_area = get_zoom_value(self.min_area, z)
+        if min_area:
+            query = query.alias(mvt_area=GeometryArea(geom)).filter(mvt_area__gte=min_area * pixel_size**2)
+        min_length = get_zoom_value(self.min_length, z)
+        if min_length:
+            query = query.alias(mvt_length=GeometryLength(geom)).filter(mvt_length__gte=min_length * pixel_size)
+        return query
+
     def _build_mvt_query(self, x: int, y: int, z: int, filters: dict) -> str:
         """
-        Create MVT query.
+        Create MVT query with inlined parameters.
+
+        Parameters
+        ----------
+        x : int
+            x-coordinate of tile
+        y : int
+            y-coordinate of tile
+        z : int
+            z-coordinate of tile
+        filters : dict
+            keys represent column names and values represent column values to filter on.
+
+        Returns
+        -------
+        str
+            SQL query with inlined parameters
+
+        Raises
+        ------
+        ValidationError
+            if sql query cannot be build with given parameters
+        """
+        sql, params = self._build_mvt_sql(x, y, z, filters)
+        with connection.cursor() as cursor:
+            return cursor.mogrify(sql, params)
+
+    def _build_mvt_sql(self, x: int, y: int, z: int, filters: dict) -> tuple[str, tuple]:
+        """
+        Create parameterized MVT query.
 
         Parameters
         ----------
@@ -101,13 +374,12 @@ class MVTManager(models.Manager):
         """
         query = self._get_mvt_geom_query(x, y, z)
         query = self._filter_query(query, x, y, z, filters)
+        query = self._filter_size(query, z)
 
         try:
-            sql, params = query.query.sql_with_params()
+            return query.query.sql_with_params()
         except FieldError as error:
             raise ValidationError(str(error)) from error
-        with connection.cursor() as cursor:
-            return cursor.mogrify(sql, params)
 
     def _get_non_geom_columns(self) -> list[str]:
         """
@@ -123,6 +395,6 @@ class MVTManager(models.Manager):
         for field in self.model._meta.get_fields():  # noqa: SLF001
             if hasattr(field, "get_attname_column"):
                 column_name = field.get_attname_column()[1]
-                if column_name != self.geo_col:
+                if column_name not in (self.geo_col, self.geo_col_3857):
                     columns.append(column_name)
         return columns
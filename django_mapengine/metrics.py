@@ -0,0 +1,233 @@
+"""
+Module to record tile-serving metrics and to send them to pluggable sinks
+
+Metrics are only recorded, if sinks are set via setting `MAP_ENGINE_METRICS`, i.e.:
+`MAP_ENGINE_METRICS = [MemorySink(), StatsdSink("localhost", 8125)]`
+"""
+
+from __future__ import annotations
+
+import abc
+import bisect
+import contextlib
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+
+# Histogram buckets (upper bounds) depending on unit of metric
+BUCKETS = {
+    "seconds": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    "bytes": (1024, 4096, 16384, 65536, 262144, 524288, 1048576, 4194304),
+    "features": (1, 10, 100, 1000, 10000, 100000),
+}
+
+
+class MetricsSink(abc.ABC):
+    """Base class of metrics sinks; counters are incremented, histogram values are observed"""
+
+    @abc.abstractmethod
+    def increment(self, name: str, labels: dict[str, str], value: float = 1) -> None:
+        """Increment counter"""
+
+    @abc.abstractmethod
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        """Add value to histogram"""
+
+
+class MemorySink(MetricsSink):
+    """
+    Aggregates metrics in memory of current process
+
+    Metrics are exposed in Prometheus text format or as JSON via `metrics_view`.
+    Note that each worker process holds its own metrics.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def increment(self, name: str, labels: dict[str, str], value: float = 1) -> None:
+        """Increment counter"""
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        """Add value to histogram; buckets depend on unit (suffix) of metric name"""
+        buckets = get_buckets(name)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            histogram["buckets"][bisect.bisect_left(buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def clear(self) -> None:
+        """Remove all metrics"""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self) -> dict:
+        """Return metrics as dict (i.e. for JSON output); histograms hold non-cumulative bucket counts"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self.counters.items()
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": dict(zip([*map(str, get_buckets(name)), "+Inf"], histogram["buckets"])),
+                    "sum": histogram["sum"],
+                    "count": histogram["count"],
+                }
+                for (name, labels), histogram in self.histograms.items()
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Return metrics in Prometheus text exposition format"""
+        lines = []
+        metrics = self.to_dict()
+        for name in sorted({counter["name"] for counter in metrics["counters"]}):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(
+                f"{name}{_format_labels(counter['labels'])} {counter['value']}"
+                for counter in metrics["counters"]
+                if counter["name"] == name
+            )
+        for name in sorted({histogram["name"] for histogram in metrics["histograms"]}):
+            lines.append(f"# TYPE {name} histogram")
+            for histogram in metrics["histograms"]:
+                if histogram["name"] != name:
+                    continue
+                cumulative = 0
+                for bound, count in histogram["buckets"].items():
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels({**histogram['labels'], 'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(histogram['labels'])} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(histogram['labels'])} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class StatsdSink(MetricsSink):
+    """
+    Sends metrics to statsd via UDP
+
+    Labels are appended to metric name, i.e. "mapengine.tile_seconds.static.z8" (no tags, thus plain statsd works).
+    Histogram values of unit seconds are sent as timers in milliseconds.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8125, prefix: str = "mapengine") -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _get_name(self, name: str, labels: dict[str, str]) -> str:
+        parts = [self.prefix, name.removeprefix("mapengine_")]
+        parts.extend(f"z{value}" if key == "z" else str(value).replace(".", "_") for key, value in labels.items())
+        return ".".join(parts)
+
+    def _send(self, data: str) -> None:
+        with contextlib.suppress(OSError):
+            self.socket.sendto(data.encode("utf-8"), self.address)
+
+    def increment(self, name: str, labels: dict[str, str], value: float = 1) -> None:
+        """Send counter"""
+        self._send(f"{self._get_name(name, labels)}:{value}|c")
+
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        """Send timer (unit seconds) or histogram value"""
+        if name.endswith("_seconds"):
+            self._send(f"{self._get_name(name, labels)}:{value * 1000:.3f}|ms")
+        else:
+            self._send(f"{self._get_name(name, labels)}:{value}|h")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+def get_buckets(name: str) -> tuple:
+    """Return histogram buckets depending on unit (suffix) of metric name"""
+    return BUCKETS.get(name.rsplit("_", 1)[-1], BUCKETS["seconds"])
+
+
+def get_sinks() -> list[MetricsSink]:
+    """Return sinks from setting `MAP_ENGINE_METRICS` (single sink or list of sinks)"""
+    sinks = settings.MAP_ENGINE_METRICS
+    if sinks is None:
+        return []
+    return sinks if isinstance(sinks, (list, tuple)) else [sinks]
+
+
+def is_active() -> bool:
+    """Return if metrics are recorded"""
+    return settings.MAP_ENGINE_METRICS is not None
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """Increment counter in all sinks"""
+    for sink in get_sinks():
+        sink.increment(name, labels, value)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Add value to histogram in all sinks"""
+    for sink in get_sinks():
+        sink.observe(name, value, labels)
+
+
+@contextlib.contextmanager
+def timer(name: str, **labels) -> Iterator[None]:
+    """Observe duration of block in seconds"""
+    if not is_active():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def record_tile(source: Optional[str], z: int, status: int, seconds: float) -> None:
+    """Count tile response by status (i.e. to get rates of empty (204) and invalid (400) tiles) and observe latency"""
+    if not is_active():
+        return
+    increment("mapengine_tiles_total", source=source, status=status)
+    observe("mapengine_tile_seconds", seconds, source=source, z=z)
+
+
+def get_memory_sink() -> Optional[MemorySink]:
+    """Return first in-memory sink or None if not used"""
+    return next((sink for sink in get_sinks() if isinstance(sink, MemorySink)), None)
+
+
+def metrics_view(request):  # noqa: ANN001,ANN201
+    """
+    Expose metrics of in-memory sink in Prometheus text format (or as JSON via "?format=json")
+
+    Clients not listed in setting `MAP_ENGINE_METRICS_ALLOWED_IPS` (if set) are denied.
+    """
+    allowed_ips = settings.MAP_ENGINE_METRICS_ALLOWED_IPS
+    if allowed_ips is not None and request.META.get("REMOTE_ADDR") not in allowed_ips:
+        return HttpResponseForbidden("Access to metrics denied.", content_type="text/plain")
+    sink = get_memory_sink()
+    if sink is None:
+        return HttpResponse("No in-memory metrics sink configured.", status=404, content_type="text/plain")
+    if request.GET.get("format") == "json":
+        return JsonResponse(sink.to_dict())
+    return HttpResponse(sink.to_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="TileChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source", models.CharField(db_index=True, max_length=255)),
+                ("xmin", models.FloatField()),
+                ("ymin", models.FloatField()),
+                ("xmax", models.FloatField()),
+                ("ymax", models.FloatField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_mapengine", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TileHit",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source", models.CharField(max_length=255)),
+                ("z", models.PositiveSmallIntegerField()),
+                ("x", models.PositiveIntegerField()),
+                ("y", models.PositiveIntegerField()),
+                ("hits", models.PositiveBigIntegerField(default=0)),
+                ("last_hit", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["source", "z", "-hits"], name="tile_hit_ranking")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="tilehit",
+            constraint=models.UniqueConstraint(fields=("source", "z", "x", "y"), name="unique_tile_hit"),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_mapengine", "0002_tilehit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowTile",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source", models.CharField(max_length=255)),
+                ("z", models.PositiveSmallIntegerField()),
+                ("x", models.PositiveIntegerField()),
+                ("y", models.PositiveIntegerField()),
+                ("filters", models.JSONField(default=dict)),
+                ("seconds", models.FloatField()),
+                ("query", models.TextField()),
+                ("params", models.JSONField(default=list)),
+                ("plan", models.TextField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["source", "-seconds"], name="slow_tile_ranking")],
+            },
+        ),
+    ]
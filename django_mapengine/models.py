@@ -0,0 +1,76 @@
+"""Models used by mapengine to track data changes, tile requests and slow tiles."""
+
+from django.db import models
+
+
+class TileChange(models.Model):
+    """
+    Holds WGS84 extent of changed features of a MVT source
+
+    Recorded by signals (see setting `MAP_ENGINE_TRACK_CHANGES`) and consumed by `mapengine_distill --changes`
+    in order to re-distill affected tiles only.
+    """
+
+    source = models.CharField(max_length=255, db_index=True)
+    xmin = models.FloatField()
+    ymin = models.FloatField()
+    xmax = models.FloatField()
+    ymax = models.FloatField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.source}: ({self.xmin}, {self.ymin}, {self.xmax}, {self.ymax})"
+
+    @property
+    def extent(self) -> tuple[float, float, float, float]:
+        """Return extent as tuple"""
+        return self.xmin, self.ymin, self.xmax, self.ymax
+
+
+class TileHit(models.Model):
+    """
+    Holds number of requests of a tile
+
+    Recorded by MVT views (see setting `MAP_ENGINE_RECORD_TILE_HITS`) and consumed by `mapengine_prewarm`
+    in order to render most requested tiles into tile cache.
+    """
+
+    source = models.CharField(max_length=255)
+    z = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    hits = models.PositiveBigIntegerField(default=0)
+    last_hit = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["source", "z", "x", "y"], name="unique_tile_hit")]
+        indexes = [models.Index(fields=["source", "z", "-hits"], name="tile_hit_ranking")]
+
+    def __str__(self) -> str:
+        return f"{self.source}/{self.z}/{self.x}/{self.y}: {self.hits}"
+
+
+class SlowTile(models.Model):
+    """
+    Holds query plans of a tile rendering slower than threshold
+
+    Recorded by MVT views (see setting `MAP_ENGINE_SLOW_TILE_THRESHOLD`) and listed by `mapengine_slow_tiles`
+    in order to find layers needing indexes or generalization.
+    """
+
+    source = models.CharField(max_length=255)
+    z = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    filters = models.JSONField(default=dict)
+    seconds = models.FloatField()
+    query = models.TextField()
+    params = models.JSONField(default=list)
+    plan = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["source", "-seconds"], name="slow_tile_ranking")]
+
+    def __str__(self) -> str:
+        return f"{self.source}/{self.z}/{self.x}/{self.y}: {self.seconds:.3f} s"
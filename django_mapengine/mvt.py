@@ -1,21 +1,70 @@
 """Module containing functions for preparing MVT responses from model managers"""
 
+import functools
+import hashlib
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Sequence, Union
 
-from django.db import connection
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
 from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework_mvt.views import BaseMVTView
 
+from . import archive, cache, coalesce, compression, metrics, prewarm, profiling, revisions, setup, utils
+
+PLACEHOLDER_PATTERN = re.compile("%%|%s")
+# Number of prepared statements kept per database connection
+MAX_PREPARED_STATEMENTS = 100
+
+# Number of times a layer exceeding its byte budget is re-encoded with fewer features
+BYTE_BUDGET_ATTEMPTS = 3
+# Fraction of proportional feature limit used when re-encoding, as bytes per feature vary
+BYTE_BUDGET_MARGIN = 0.9
+
 
 @dataclass
 class MVTSourceLayer:
-    """Source layer and related queryset used in MVTView"""
+    """
+    Source layer and related queryset used in MVTView
+
+    Columns and tile budget can be given (per zoom range) in order to override columns and budget defined in queryset.
+    """
 
     name: str
     queryset: QuerySet
+    columns: Optional[Union[List[str], dict[tuple[int, int], List[str]]]] = None
+    budget: Optional[Union[setup.TileBudget, dict[tuple[int, int], setup.TileBudget]]] = None
+
+    @classmethod
+    def from_api(cls, mvt_api: setup.MVTAPI) -> "MVTSourceLayer":
+        """Return source layer for MVT API set up in settings"""
+        return cls(mvt_api.layer_id, queryset=mvt_api.manager, columns=mvt_api.columns, budget=mvt_api.budget)
+
+    def get_columns(self, z: int) -> List[str]:
+        """Return columns to use as features in MVT at given zoom level; empty list results in geometries only"""
+        columns = utils.get_zoom_value(self.columns, z)
+        return self.queryset.get_columns(z) if columns is None else columns
+
+    def get_budget(self, z: int) -> Optional[setup.TileBudget]:
+        """Return tile budget of layer at given zoom level"""
+        budget = utils.get_zoom_value(self.budget, z)
+        return utils.get_zoom_value(getattr(self.queryset, "budget", None), z) if budget is None else budget
+
+    def get_pk_column(self) -> str:
+        """Return primary key column of layer model, which is used to rank features when thinning layer"""
+        return self.queryset.model._meta.pk.column  # noqa: SLF001  # pylint: disable=W0212
 
 
 class MVTResponse(Response):
@@ -30,45 +79,473 @@ class MVTResponse(Response):
 class MVTView(BaseMVTView):
     """Use MVTView in urls.py to create MVTs from models"""
 
+    source: Optional[str] = None
     layers: List[MVTSourceLayer] = []
 
     def get(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        response = self._get_response(request, *args, **kwargs)
+        metrics.record_tile(self.source, kwargs["z"], response.status_code, time.perf_counter() - start)
+        return response
+
+    def _get_response(self, request, *args, **kwargs):
+        """Return response holding MVT (or 304 response, if client holds current tile already)"""
         params = request.GET.dict()
         mvt = b""
         status = 400
+        encoding = compression.get_encoding()
+
+        prewarm.record_hit(self.source, kwargs["z"], kwargs["x"], kwargs["y"], params)
+
+        version, last_modified, not_modified = self._check_revision(request, encoding)
+        if not_modified is not None:
+            return not_modified
 
         try:
-            mvt = self._create_mvt(filters=params, *args, **kwargs)
+            mvt = self._get_mvt(filters=params, version=version, *args, **kwargs)
             status = 200 if mvt else 204
         except ValidationError:
             pass
 
+        if mvt:
+            metrics.observe("mapengine_tile_bytes", len(mvt), source=self.source, z=kwargs["z"])
+        mvt, content_encoding = compression.negotiate(request, mvt, encoding)
         response = MVTResponse(mvt, content_type="application/vnd.mapbox-vector-tile", status=status)
         response["Content-Type"] = "application/vnd.mapbox-vector-tile"
+        compression.set_encoding_headers(response, content_encoding, compressed=encoding is not None)
+        return self._set_validators(request, response, mvt, version, last_modified, encoding)
+
+    def _check_revision(self, request, encoding):
+        """
+        Answer revalidation before rendering tile, if data revision of source has not changed
+
+        Returns version and time of last change of source (None, if data revisions are not activated)
+        and 304 response, if client holds current tile already.
+        """
+        if not settings.MAP_ENGINE_TILE_REVISIONS or not self.layers:
+            return None, None, None
+        version, last_modified = revisions.get_version({layer.queryset.model for layer in self.layers})
+        etag = self._get_etag(request, version, encoding)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if not_modified is not None:
+            not_modified = self._set_conditional_headers(not_modified, etag, last_modified, encoding)
+        return version, last_modified, not_modified
+
+    @classmethod
+    def _set_validators(cls, request, response, mvt, version, last_modified, encoding):  # pylint: disable=R0913
+        """Set ETag and caching headers of tile response; returns 304 response, if tile content matches ETag"""
+        if response.status_code == 400:
+            return response
+        if version is None:
+            # Without data revisions, ETag is derived from tile content; saves bandwidth but not rendering
+            etag = cls._get_etag(request, hashlib.sha1(mvt).hexdigest()[:16], encoding)  # noqa: S324
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                response = not_modified
+        else:
+            etag = cls._get_etag(request, version, encoding)
+        return cls._set_conditional_headers(response, etag, last_modified, encoding)
+
+    @staticmethod
+    def _get_etag(request, version, encoding):
+        """Return strong ETag of tile representation; compressed and uncompressed tiles use different ETags"""
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if encoding is not None and compression.accepts_encoding(accept_encoding, encoding):
+            return f'"{version}-{encoding}"'
+        return f'"{version}"'
+
+    @staticmethod
+    def _set_conditional_headers(response, etag, last_modified, encoding):
+        """Set validators and caching headers of tile response (also used for 304 responses)"""
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        if settings.MAP_ENGINE_TILE_CACHE_CONTROL:
+            response["Cache-Control"] = settings.MAP_ENGINE_TILE_CACHE_CONTROL
+        if encoding is not None:
+            response["Vary"] = "Accept-Encoding"
         return response
 
+    def _get_cache_filters(self, filters, version=None):
+        """
+        Return filters used to key cached tiles
+
+        Key holds content encoding of stored tiles, thus tiles compressed before changing tile compression are not
+        served with wrong (or without) "Content-Encoding".
+        Key holds data version, if data revisions are activated; thus, tiles rendered before latest data revision
+        are not served under new ETag (they expire or get evicted).
+        """
+        cache_filters = dict(filters)
+        encoding = compression.get_encoding()
+        if encoding is not None:
+            cache_filters["_encoding"] = encoding
+        if settings.MAP_ENGINE_TILE_REVISIONS and self.layers:
+            if version is None:
+                version, _ = revisions.get_version({layer.queryset.model for layer in self.layers})
+            cache_filters["_revision"] = version
+        return cache_filters
+
+    def _get_mvt(self, z, x, y, filters, version=None):
+        """
+        Return MVT from tile cache if activated, otherwise MVT is rendered (and cached)
+
+        Concurrent requests of same tile are coalesced, thus tile is rendered only once.
+        """
+        if self.source is None:
+            return self._render_mvt(z, x, y, filters)
+        tile_cache = cache.get_tile_cache()
+        cache_filters = self._get_cache_filters(filters, version)
+        rendered = []
+
+        def render_mvt():
+            rendered.append(True)
+            return self._render_mvt(z, x, y, filters)
+
+        if tile_cache is None:
+            render = render_mvt
+        else:
+            render = functools.partial(
+                coalesce.get_or_render, tile_cache, self.source, z, x, y, cache_filters, render_mvt
+            )
+        if settings.MAP_ENGINE_TILE_COALESCING:
+            mvt = coalesce.single_flight.do(coalesce.get_flight_key(self.source, z, x, y, cache_filters), render)
+        else:
+            mvt = render()
+        if tile_cache is not None:
+            # Coalesced requests count as hits, as they did not render tile
+            metrics.increment("mapengine_tile_cache_total", source=self.source, result="miss" if rendered else "hit")
+        return mvt
+
+    def _render_mvt(self, z, x, y, filters):
+        """Create MVT and compress it, if tile compression is activated; thus, cached tiles are stored compressed"""
+        start = time.perf_counter()
+        mvt = self._create_mvt(z, x, y, filters) or b""
+        self._profile(z, x, y, filters, time.perf_counter() - start)
+        encoding = compression.get_encoding()
+        if mvt and encoding is not None:
+            with metrics.timer("mapengine_tile_compress_seconds", source=self.source, z=z):
+                mvt = compression.compress(mvt, encoding)
+        return mvt
+
     def _create_mvt(self, z, x, y, filters):
         if not self.layers:
             return None
+        if settings.MAP_ENGINE_MVT_QUERY_MODE == "layers":
+            return self._create_layer_mvts(z, x, y, filters)
 
-        mvt_geom_queries = ", ".join(
-            f"q{i} AS ({layer.queryset.get_mvt_query(x, y, z, filters)})" for i, layer in enumerate(self.layers)
-        )
+        query, params = self._get_mvt_query(z, x, y, filters)
+        with connection.cursor() as cursor, metrics.timer("mapengine_tile_sql_seconds", source=self.source, z=z):
+            if self.parameterized:
+                execute_prepared(cursor, query, params)
+            else:
+                cursor.execute(f"{query};")
+            mvt_rows = cursor.fetchall()
+        layer_mvts = [bytes(row[0]) for row in mvt_rows]
+        features = [row[1] if len(row) > 1 else 0 for row in mvt_rows]
+        self._apply_byte_budgets(layer_mvts, features, range(len(self.layers)), z, x, y, filters)
+        self._record_all_layer_metrics(layer_mvts, features)
+        return b"".join(layer_mvts)
 
-        mvt_select_queries = ", ".join(
-            f"s{i} AS (SELECT {','.join(layer.queryset.get_columns())}, mvt_geom::geometry FROM q{i})"
-            for i, layer in enumerate(self.layers)
+    def _apply_byte_budgets(self, layer_mvts, features, indices, z, x, y, filters):  # pylint: disable=R0913
+        """Re-encode given layers exceeding their byte budget with fewer features"""
+        for i in indices:
+            for _ in range(BYTE_BUDGET_ATTEMPTS):
+                query = self._get_byte_budget_query(i, layer_mvts[i], features[i], z, x, y, filters)
+                if query is None:
+                    break
+                rows = _run_layer_query(*query[1:])
+                layer_mvts[i], features[i] = bytes(rows[0][0]), rows[0][1]
+
+    def _get_byte_budget_query(self, i, layer_mvt, features, z, x, y, filters):  # pylint: disable=R0913
+        """
+        Return query re-encoding layer with proportionally fewer features, if layer MVT exceeds byte budget
+
+        Returns None, if layer meets its budget or cannot be thinned any further.
+        """
+        budget = self.layers[i].get_budget(z)
+        if budget is None or budget.max_bytes is None or len(layer_mvt) <= budget.max_bytes or features <= 1:
+            return None
+        max_features = max(1, int(features * budget.max_bytes / len(layer_mvt) * BYTE_BUDGET_MARGIN))
+        return self._get_layer_queries([i], z, x, y, filters, max_features=max_features)[0]
+
+    def _has_byte_budgets(self, z):
+        """Return if any layer has a byte budget at given zoom level (thus, number of features must be queried)"""
+        return any(
+            budget is not None and budget.max_bytes is not None
+            for budget in (layer.get_budget(z) for layer in self.layers)
         )
 
+    def _profile(self, z, x, y, filters, seconds):
+        """Explain queries of slow tile in background, if slow tile profiling is activated"""
+        if self.layers and profiling.is_slow(seconds):
+            queries = self._get_profile_queries(z, x, y, filters)
+            profiling.record_slow_tile(self.source, z, x, y, filters, seconds, queries)
+
+    def _get_profile_queries(self, z, x, y, filters):
+        """Return queries (and their parameters) rendering tile in current query mode"""
+        if settings.MAP_ENGINE_MVT_QUERY_MODE == "layers":
+            indices = range(len(self.layers))
+            return [query[1:3] for query in self._get_layer_queries(indices, z, x, y, filters)]
+        return [self._get_mvt_query(z, x, y, filters)]
+
+    def _record_layer_metrics(self, layer, mvt, features):
+        """Record size and number of features of layer MVT"""
+        metrics.observe("mapengine_layer_bytes", len(mvt), source=self.source, layer=layer.name)
+        metrics.observe("mapengine_layer_features", features, source=self.source, layer=layer.name)
+
+    @property
+    def parameterized(self):
+        """Return if all layers use parameterized queries (which are run as prepared statements)"""
+        return all(getattr(layer.queryset, "parameterized", False) for layer in self.layers)
+
+    def _create_layer_mvts(self, z, x, y, filters):
+        """
+        Create MVT by encoding layers independently
+
+        Queries of layers are run concurrently in threads, each using its own database connection.
+        MVTs of layers are concatenated, as allowed by MVT spec.
+        """
+        indices = range(len(self.layers))
+        queries = self._get_layer_queries(indices, z, x, y, filters)
+        with metrics.timer("mapengine_tile_sql_seconds", source=self.source, z=z):
+            if len(queries) <= 1:
+                results = [_run_layer_query(*query[1:]) for query in queries]
+            else:
+                results = list(get_layer_executor().map(lambda query: _run_layer_query(*query[1:]), queries))
+        layer_mvts, features = self._collect_layer_mvts(results)
+        self._apply_byte_budgets(layer_mvts, features, indices, z, x, y, filters)
+        self._record_all_layer_metrics(layer_mvts, features)
+        return b"".join(layer_mvts)
+
+    @staticmethod
+    def _collect_layer_mvts(results):
+        """Return MVT and number of features per layer from results of layer queries"""
+        layer_mvts = [bytes(rows[0][0]) for rows in results]
+        features = [rows[0][1] for rows in results]
+        return layer_mvts, features
+
+    def _record_all_layer_metrics(self, layer_mvts, features):
+        """Record metrics of all layers"""
+        if metrics.is_active():
+            for layer, layer_mvt, layer_features in zip(self.layers, layer_mvts, features):
+                self._record_layer_metrics(layer, layer_mvt, layer_features)
+
+    def _get_layer_queries(self, indices, z, x, y, filters, max_features=None):  # pylint: disable=R0913
+        """
+        Return one query per given layer, encoding layer MVT and number of its features
+
+        If `max_features` is given, it overrides feature budgets of layers (used to meet byte budgets).
+
+        Returns
+        -------
+        list[tuple[int, str, list, bool]]
+            Index of encoded layer, query, parameters and whether query is run as prepared statement
+        """
+        queries = []
+        for i in indices:
+            queryset = self.layers[i].queryset
+            parameterized = getattr(queryset, "parameterized", False)
+            if parameterized:
+                mvt_geom_query, params = queryset.get_mvt_sql(x, y, z, filters)
+            else:
+                mvt_geom_query, params = queryset.get_mvt_query(x, y, z, filters), []
+            template = (
+                f"WITH q AS ({mvt_geom_query}), {self._build_layer_select(i, 'q', z, max_features)} "
+                f"SELECT ST_AsMVT(s{i}.*, '{self.layers[i].name}'), count(*) FROM s{i}"
+            )
+            queries.append((i, template, params, parameterized))
+        return queries
+
+    def _get_mvt_query(self, z, x, y, filters):
+        """Return MVT query and its parameters (parameters are only given, if all layers are parameterized)"""
+        if self.parameterized:
+            return self._build_mvt_sql(z, x, y, filters)
+        mvt_geom_queries = [layer.queryset.get_mvt_query(x, y, z, filters) for layer in self.layers]
+        return self._build_mvt_template(mvt_geom_queries, z), []
+
+    def _build_mvt_sql(self, z, x, y, filters):
+        """Return parameterized MVT query; SQL text only depends on source and filter keys, not on tile coordinates"""
+        mvt_geom_queries = []
+        params = []
+        for layer in self.layers:
+            sql, layer_params = layer.queryset.get_mvt_sql(x, y, z, filters)
+            mvt_geom_queries.append(sql)
+            params.extend(layer_params)
+        return self._build_mvt_template(mvt_geom_queries, z), params
+
+    def _build_mvt_template(self, mvt_geom_queries, z):
+        """Combine geometry queries of all layers into one query returning one MVT per layer"""
+        mvt_geom_query = ", ".join(f"q{i} AS ({query})" for i, query in enumerate(mvt_geom_queries))
+
+        mvt_select_queries = ", ".join(self._build_layer_select(i, f"q{i}", z) for i in range(len(self.layers)))
+
+        # Number of features is only queried if metrics are recorded or needed to meet byte budgets
+        count = ", count(*)" if metrics.is_active() or self._has_byte_budgets(z) else ""
         mvt_query = " UNION ALL ".join(
-            f"SELECT ST_AsMVT(s{i}.*, '{layer.name}') FROM s{i}" for i, layer in enumerate(self.layers)
+            f"SELECT ST_AsMVT(s{i}.*, '{layer.name}'){count} FROM s{i}" for i, layer in enumerate(self.layers)
         )
 
-        query = f"WITH {mvt_geom_queries}, {mvt_select_queries} {mvt_query};".strip()
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            mvt_rows = cursor.fetchall()
-        return b"".join(map(lambda row: bytes(row[0]), mvt_rows))  # noqa: C417
+        return f"WITH {mvt_geom_query}, {mvt_select_queries} {mvt_query}".strip()
+
+    def _build_layer_select(self, i, relation, z, max_features=None):
+        """Build CTE selecting features of layer from geometry query; layer is thinned, if it has a feature budget"""
+        layer = self.layers[i]
+        budget = layer.get_budget(z)
+        if max_features is None and budget is not None:
+            max_features = budget.max_features
+        if max_features is not None:
+            relation = (budget or setup.TileBudget()).get_thinned_relation(
+                relation, layer.get_pk_column(), max_features
+            )
+        select = ",".join([*layer.get_columns(z), "mvt_geom::geometry"])
+        return f"s{i} AS (SELECT {select} FROM {relation})"
+
+
+_layer_executor = None
+
+
+def get_layer_executor() -> ThreadPoolExecutor:
+    """Return thread pool running layer queries; threads keep their database connections between tiles"""
+    global _layer_executor  # noqa: PLW0603  # pylint: disable=W0603
+    if _layer_executor is None:
+        _layer_executor = ThreadPoolExecutor(
+            max_workers=settings.MAP_ENGINE_LAYER_WORKERS, thread_name_prefix="mapengine_layers"
+        )
+    return _layer_executor
+
+
+def _run_layer_query(query: str, params: Sequence, parameterized: bool) -> list[tuple[bytes, int]]:
+    if threading.current_thread().name.startswith("mapengine_layers"):
+        # Connections of pool threads are not handled by request signals
+        connection.close_if_unusable_or_obsolete()
+    with connection.cursor() as cursor:
+        if parameterized:
+            execute_prepared(cursor, query, params)
+        else:
+            cursor.execute(f"{query};")
+        return cursor.fetchall()
+
+
+def _execute_isolated(cursor, query: str, params: Optional[Sequence] = None) -> None:  # noqa: ANN001
+    """Execute query; within transactions, a savepoint keeps transaction usable if query fails"""
+    if cursor.db.in_atomic_block:
+        with transaction.atomic(using=cursor.db.alias):
+            cursor.execute(query, params)
+    else:
+        cursor.execute(query, params)
+
+
+def _has_sqlstate(error: DatabaseError, sqlstate: str) -> bool:
+    """Return if error has been raised by database with given SQLSTATE"""
+    cause = error.__cause__ or error
+    return sqlstate in (getattr(cause, "pgcode", None), getattr(cause, "sqlstate", None))
+
+
+def _is_missing_statement(error: DatabaseError) -> bool:
+    """Return if error has been raised as prepared statement does not exist (SQLSTATE 26000)"""
+    return _has_sqlstate(error, "26000")
+
+
+def _is_duplicate_statement(error: DatabaseError) -> bool:
+    """Return if error has been raised as prepared statement already exists (SQLSTATE 42P05)"""
+    return _has_sqlstate(error, "42P05")
+
+
+def _get_prepared_statements(cursor) -> OrderedDict:  # noqa: ANN001
+    """Return names of statements prepared on current database connection (least recently used first)"""
+    raw_connection = cursor.db.connection
+    prepared = getattr(cursor.db, "_mapengine_prepared_statements", None)
+    if prepared is None or prepared[0] is not raw_connection:
+        # New database connection, former prepared statements are gone
+        prepared = (raw_connection, OrderedDict())
+        cursor.db._mapengine_prepared_statements = prepared  # noqa: SLF001  # pylint: disable=W0212
+    return prepared[1]
+
+
+def get_statement_name(query: str) -> str:
+    """Return name of prepared statement derived from hash of its SQL text"""
+    return f"mapengine_{hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]}"  # noqa: S324
+
+
+def execute_prepared(cursor, query: str, params: Sequence) -> None:
+    """
+    Execute query as server-side prepared statement
+
+    Statement is prepared once per database connection and named after hash of its SQL text.
+    Subsequent calls with same SQL text only bind new parameters, so PostgreSQL can reuse the query plan.
+    At most `MAX_PREPARED_STATEMENTS` statements are kept per connection; least recently used ones are deallocated.
+    If a statement has been lost meanwhile (i.e. connection has been reset by a pooler), it is prepared again.
+    Other errors on execution (i.e. invalid parameters) keep the statement prepared; a statement already existing
+    on the connection when preparing it is used as is.
+
+    Parameters
+    ----------
+    cursor
+        Django database cursor
+    query : str
+        SQL query using "%s" placeholders (as returned by `Query.sql_with_params()`)
+    params : Sequence
+        Parameters to bind
+    """
+    statement = get_statement_name(query)
+    prepared = _get_prepared_statements(cursor)
+    if params:
+        execute = (f"EXECUTE {statement}({', '.join(['%s'] * len(params))})", params)
+    else:
+        execute = (f"EXECUTE {statement}", None)
+    if statement in prepared:
+        prepared.move_to_end(statement)
+        try:
+            _execute_isolated(cursor, *execute)
+        except DatabaseError as error:
+            if not _is_missing_statement(error):
+                raise
+            del prepared[statement]
+        else:
+            return
+
+    counter = itertools.count(1)
+    positional_query = PLACEHOLDER_PATTERN.sub(
+        lambda match: "%" if match.group() == "%%" else f"${next(counter)}", query
+    )
+    try:
+        _execute_isolated(cursor, f"PREPARE {statement} AS {positional_query}")
+    except DatabaseError as error:
+        if not _is_duplicate_statement(error):
+            raise
+    prepared[statement] = None
+    while len(prepared) > MAX_PREPARED_STATEMENTS:
+        oldest, _ = prepared.popitem(last=False)
+        try:
+            _execute_isolated(cursor, f"DEALLOCATE {oldest}")
+        except DatabaseError:
+            # Statement is gone already
+            pass
+    cursor.execute(*execute)
+
+
+class MBTilesMVTView(View):
+    """Serves distilled MVTs of a source from its MBTiles archive"""
+
+    reader: Optional[archive.MBTilesReader] = None
+
+    def get(self, request, z, x, y):
+        """Return tile from archive or empty response if tile does not exist"""
+        mvt = self.reader.get_tile(z, x, y) or b""
+        encoding = self.reader.get_encoding()
+        status = 200 if mvt else 204
+        mvt, content_encoding = compression.negotiate(request, mvt, encoding)
+        response = HttpResponse(mvt, content_type="application/vnd.mapbox-vector-tile", status=status)
+        return compression.set_encoding_headers(response, content_encoding, compressed=encoding is not None)
+
+
+def mbtiles_view_factory(source):
+    """Factory method for creating views serving distilled MVTs from MBTiles archive"""
+    return type(
+        f"{source}MBTilesMVTView",
+        (MBTilesMVTView,),
+        {"reader": archive.MBTilesReader(archive.get_archive_path(source))},
+    ).as_view()
 
 
 def mvt_view_factory(classname, layers):
@@ -76,5 +553,5 @@ def mvt_view_factory(classname, layers):
     return type(
         f"{classname}MVTView",
         (MVTView,),
-        {"layers": layers},
+        {"source": classname, "layers": layers},
     ).as_view()
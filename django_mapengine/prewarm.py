@@ -0,0 +1,260 @@
+"""Module to record tile requests and to render most requested tiles into tile cache in advance."""
+
+from __future__ import annotations
+
+import atexit
+import datetime
+import heapq
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from . import cache, distill
+
+
+# Maximum number of tiles written per upsert statement
+FLUSH_BATCH_SIZE = 1000
+
+
+def get_upsert_queries(table: str, hits: Counter, now: datetime.datetime) -> Iterable[tuple[str, list]]:
+    """
+    Return multi-row upsert statements (and their parameters) adding given tile hits to recorded hits
+
+    Parameters
+    ----------
+    table : str
+        Quoted name of tile hit table
+    hits : Counter
+        Number of requests per tile (source, z, x, y)
+    now : datetime.datetime
+        Time of last hit
+
+    Yields
+    ------
+    tuple[str, list]
+        Upsert statement holding up to `FLUSH_BATCH_SIZE` tiles and its parameters
+    """
+    rows = [(*tile, count, now) for tile, count in hits.items()]
+    for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+        end = start + FLUSH_BATCH_SIZE
+        batch = rows[start:end]
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch))
+        query = (
+            f"INSERT INTO {table} (source, z, x, y, hits, last_hit) VALUES {values} "
+            "ON CONFLICT (source, z, x, y) DO UPDATE "
+            f"SET hits = {table}.hits + EXCLUDED.hits, last_hit = EXCLUDED.last_hit"
+        )
+        yield query, [value for row in batch for value in row]
+
+
+class HitCounter:
+    """
+    Counts tile requests in memory and flushes counts to database periodically
+
+    Counting is cheap (no database access per request); counts are written in a background thread
+    every `MAP_ENGINE_TILE_HIT_FLUSH_INTERVAL` seconds and on exit of process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._last_flush = time.monotonic()
+        self._executor = None
+
+    def record(self, source: str, z: int, x: int, y: int) -> None:
+        """Count request of tile; counts are flushed in background thread, once flush interval has passed"""
+        with self._lock:
+            self._hits[(source, z, x, y)] += 1
+            if time.monotonic() - self._last_flush <= settings.MAP_ENGINE_TILE_HIT_FLUSH_INTERVAL:
+                return
+            # Reset timer already, thus following requests do not submit further flushes
+            self._last_flush = time.monotonic()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mapengine_tile_hits")
+        self._executor.submit(self._flush_in_background)
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        except DatabaseError:
+            pass
+        finally:
+            # Connection of background thread is not handled by request signals
+            connection.close()
+
+    def flush(self) -> None:
+        """Add counted requests to recorded tile hits"""
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            self._last_flush = time.monotonic()
+        if not hits:
+            return
+        # pylint: disable=C0415
+        from .models import TileHit
+
+        table = connection.ops.quote_name(TileHit._meta.db_table)  # noqa: SLF001  # pylint: disable=W0212
+        with connection.cursor() as cursor:
+            for query, params in get_upsert_queries(table, hits, timezone.now()):
+                cursor.execute(query, params)
+
+
+hit_counter = HitCounter()
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    try:
+        hit_counter.flush()
+    except DatabaseError:
+        pass
+
+
+def record_hit(source: Optional[str], z: int, x: int, y: int, filters: Optional[dict]) -> None:
+    """Record request of unfiltered tile, if setting `MAP_ENGINE_RECORD_TILE_HITS` is set"""
+    if not settings.MAP_ENGINE_RECORD_TILE_HITS or source is None or filters:
+        return
+    hit_counter.record(source, z, x, y)
+
+
+def select_tiles(hits: Iterable[tuple[int, str, int, int, int]], top: int) -> list[tuple[str, int, int, int]]:
+    """
+    Return most requested tiles per source and zoom level, ordered by number of requests
+
+    Parameters
+    ----------
+    hits : Iterable[tuple[int, str, int, int, int]]
+        Number of requests, source, z, x and y of tiles
+    top : int
+        Number of tiles per source and zoom level
+
+    Returns
+    -------
+    list[tuple[str, int, int, int]]
+        Source, z, x and y of selected tiles, most requested first
+    """
+    rankings = defaultdict(list)
+    for hit in hits:
+        rankings[hit[1:3]].append(hit)
+    tiles = [hit for ranking in rankings.values() for hit in heapq.nlargest(top, ranking)]
+    return [tile[1:] for tile in sorted(tiles, reverse=True)]
+
+
+def get_most_requested_tiles(
+    sources: list[str], top: int, since: Optional[datetime.datetime] = None
+) -> list[tuple[str, int, int, int]]:
+    """
+    Return most requested tiles per source and zoom level, ordered by number of requests
+
+    Parameters
+    ----------
+    sources : list[str]
+        Sources to get tiles for
+    top : int
+        Number of tiles per source and zoom level
+    since : Optional[datetime.datetime]
+        Only consider tiles requested since given time
+
+    Returns
+    -------
+    list[tuple[str, int, int, int]]
+        Source, z, x and y of most requested tiles, most requested first
+    """
+    # pylint: disable=C0415
+    from .models import TileHit
+
+    hits = TileHit.objects.filter(source__in=sources)
+    if since is not None:
+        hits = hits.filter(last_hit__gte=since)
+    tiles = []
+    for source, z in hits.values_list("source", "z").distinct():
+        ranking = hits.filter(source=source, z=z).order_by("-hits")
+        tiles.extend(ranking.values_list("hits", "source", "z", "x", "y")[:top])
+    return select_tiles(tiles, top)
+
+
+@dataclass
+class PrewarmStats:
+    """Counts pre-warmed tiles"""
+
+    total: int
+    rendered: int = 0
+    cached: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def __str__(self) -> str:
+        return (
+            f"Pre-warmed {self.rendered}/{self.total} tiles ({self.cached} already cached, {self.failed} failed) "
+            f"in {time.monotonic() - self.started:.1f} s"
+        )
+
+
+def prewarm(
+    tiles: list[tuple[str, int, int, int]], workers: int = 4, time_budget: Optional[float] = None
+) -> PrewarmStats:
+    """
+    Render given tiles through MVT pipeline of their sources into tile cache
+
+    Tiles are rendered in given order by a bounded number of threads (each using its own database connection)
+    until all tiles are rendered or time budget is exceeded. Tiles already cached are not rendered again.
+
+    Parameters
+    ----------
+    tiles : list[tuple[str, int, int, int]]
+        Source, z, x and y of tiles to render
+    workers : int
+        Number of threads rendering tiles
+    time_budget : Optional[float]
+        Seconds after which no further tiles are rendered
+
+    Returns
+    -------
+    PrewarmStats
+        Number of rendered, already cached and failed tiles
+    """
+    stats = PrewarmStats(total=len(tiles))
+    deadline = None if time_budget is None else stats.started + time_budget
+    pending = queue.Queue()
+    for tile in tiles:
+        pending.put(tile)
+    lock = threading.Lock()
+    tile_cache = cache.get_tile_cache()
+
+    def work() -> None:
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    source, z, x, y = pending.get_nowait()
+                except queue.Empty:
+                    return
+                # pylint: disable=W0212
+                try:
+                    view = distill.get_distill_view(source)
+                    if tile_cache is not None and (
+                        tile_cache.get(source, z, x, y, view._get_cache_filters({})) is not None  # noqa: SLF001
+                    ):
+                        with lock:
+                            stats.cached += 1
+                        continue
+                    view._get_mvt(z, x, y, {})  # noqa: SLF001
+                except Exception:  # noqa: BLE001  # pylint: disable=W0718
+                    with lock:
+                        stats.failed += 1
+                    continue
+                with lock:
+                    stats.rendered += 1
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(workers):
+            executor.submit(work)
+    return stats
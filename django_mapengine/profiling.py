@@ -0,0 +1,137 @@
+"""
+Module to profile slow tiles
+
+If setting `MAP_ENGINE_SLOW_TILE_THRESHOLD` is set, queries of (sampled) tiles rendering slower than threshold are
+re-run using `EXPLAIN (ANALYZE, BUFFERS)` in a background thread, thus tile responses are not delayed.
+Plans are stored as `SlowTile` together with source, tile coordinates, filters, SQL and parameters;
+management command `mapengine_slow_tiles` lists worst offenders.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+# Maximum number of slow tiles waiting to be explained; further slow tiles are dropped meanwhile
+MAX_PENDING = 10
+
+_executor = None
+_lock = threading.Lock()
+_pending = 0
+
+
+def is_slow(seconds: float) -> bool:
+    """Return if tile rendered in given seconds is slow and sampled for profiling"""
+    threshold = settings.MAP_ENGINE_SLOW_TILE_THRESHOLD
+    if threshold is None or seconds < threshold:
+        return False
+    return random.random() < settings.MAP_ENGINE_SLOW_TILE_SAMPLE_RATE  # noqa: S311
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return single background thread explaining slow tile queries"""
+    global _executor  # noqa: PLW0603  # pylint: disable=W0603
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mapengine_profiling")
+    return _executor
+
+
+def explain(query: str, params: Optional[Sequence]) -> str:
+    """Run query using `EXPLAIN (ANALYZE, BUFFERS)` and return plan as text"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params or None)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def _serialize_params(params: Optional[Sequence]) -> list:
+    """Return parameters as JSON-serializable list (unknown types are stored as strings)"""
+    return json.loads(json.dumps(list(params or []), default=str))
+
+
+def record_slow_tile(  # noqa: PLR0913
+    source: Optional[str],
+    z: int,
+    x: int,
+    y: int,
+    filters: Optional[dict],
+    seconds: float,
+    queries: list[tuple[str, Sequence]],
+) -> bool:  # pylint: disable=R0913
+    """
+    Explain queries of slow tile in background thread and store plans
+
+    Parameters
+    ----------
+    source : Optional[str]
+        Name of MVT source
+    z : int
+        Zoom level
+    x : int
+        x-coordinate of tile
+    y : int
+        y-coordinate of tile
+    filters : Optional[dict]
+        Filters applied to tile
+    seconds : float
+        Time needed to render tile
+    queries : list[tuple[str, Sequence]]
+        Queries (and their parameters) rendering tile
+
+    Returns
+    -------
+    bool
+        False, if tile has been dropped, as too many slow tiles are waiting to be explained
+    """
+    global _pending  # noqa: PLW0603  # pylint: disable=W0603
+    with _lock:
+        if _pending >= MAX_PENDING:
+            return False
+        _pending += 1
+    get_executor().submit(_profile, source, z, x, y, filters, seconds, queries)
+    return True
+
+
+def _profile(  # noqa: PLR0913
+    source: Optional[str],
+    z: int,
+    x: int,
+    y: int,
+    filters: Optional[dict],
+    seconds: float,
+    queries: list[tuple[str, Sequence]],
+) -> None:  # pylint: disable=R0913
+    global _pending  # noqa: PLW0603  # pylint: disable=W0603
+    # pylint: disable=C0415
+    from .models import SlowTile
+
+    try:
+        plans = []
+        for query, params in queries:
+            try:
+                plans.append(explain(query, params))
+            except DatabaseError as error:
+                plans.append(f"EXPLAIN failed: {error}")
+        SlowTile.objects.create(
+            source=source or "",
+            z=z,
+            x=x,
+            y=y,
+            filters=filters or {},
+            seconds=seconds,
+            query=";\n\n".join(query for query, _ in queries),
+            params=[_serialize_params(params) for _, params in queries],
+            plan="\n\n".join(plans),
+        )
+    except DatabaseError:
+        pass
+    finally:
+        # Connection of background thread is not handled by request signals
+        connection.close()
+        with _lock:
+            _pending -= 1
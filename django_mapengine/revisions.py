@@ -0,0 +1,79 @@
+"""Module holding data revisions per model, used to answer conditional tile requests without rendering tiles."""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import TYPE_CHECKING, Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    from django.db.models import Model
+
+
+def get_revision_key(model: type[Model]) -> str:
+    """Return cache key holding revision of given model"""
+    return f"mapengine:revision:{model._meta.label_lower}"  # noqa: SLF001  # pylint: disable=W0212
+
+
+def _now() -> int:
+    return int(time.time() * 1000)
+
+
+def get_revision(model: type[Model]) -> int:
+    """
+    Return current data revision of given model
+
+    Revisions are timestamps (in milliseconds) of last change; thus, if revision is missing in cache
+    (i.e. after cache has been cleared), a new revision is started instead of reusing a former one.
+
+    Parameters
+    ----------
+    model : type[Model]
+        Model holding features of MVT source
+
+    Returns
+    -------
+    int
+        Revision of model
+    """
+    revision_cache = caches[settings.MAP_ENGINE_REVISION_CACHE]
+    key = get_revision_key(model)
+    revision = revision_cache.get(key)
+    if revision is None:
+        revision_cache.add(key, _now(), timeout=None)
+        revision = revision_cache.get(key)
+    return revision
+
+
+def bump_revision(model: type[Model]) -> int:
+    """Start new data revision of given model (i.e. after features have been changed or bulk loaded)"""
+    revision_cache = caches[settings.MAP_ENGINE_REVISION_CACHE]
+    key = get_revision_key(model)
+    revision = max(_now(), (revision_cache.get(key) or 0) + 1)
+    revision_cache.set(key, revision, timeout=None)
+    return revision
+
+
+def get_version(models: Iterable[type[Model]]) -> tuple[str, float]:
+    """
+    Return version of data held by given models
+
+    Parameters
+    ----------
+    models : Iterable[type[Model]]
+        Models holding features of MVT source
+
+    Returns
+    -------
+    tuple[str, float]
+        Version (changes with revision of any model) and time of last change as unix timestamp
+    """
+    revisions = sorted(
+        (model._meta.label_lower, get_revision(model)) for model in models  # noqa: SLF001  # pylint: disable=W0212
+    )
+    version = hashlib.sha1(repr(revisions).encode("utf-8")).hexdigest()[:16]  # noqa: S324
+    last_modified = max((revision for _, revision in revisions), default=0) / 1000
+    return version, last_modified
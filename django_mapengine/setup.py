@@ -1,11 +1,13 @@
 """Setup module is used in settings of django projects to set up mapengine"""
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, List, Optional, Any
+from typing import TYPE_CHECKING, List, Optional, Any, Union
 
 from django.apps import apps
 from django.conf import settings
+from django.db import connection
 from django.http import HttpRequest
 
 if TYPE_CHECKING:
@@ -72,14 +74,82 @@ class ModelAPI:
 # pylint:disable=R0903
 @dataclass
 class ClusterAPI(ModelAPI):
-    """Exists only to distinguish between "normal" and clustered API"""
+    """
+    API for clustered point models
+
+    By default, all points are served as one GeoJSON, which is clustered by the browser.
+    If `server_side` is set, points are clustered per tile into MVTs instead; points within same grid cell
+    (`grid_size` in MVT units, optionally per zoom range) are merged into one cluster up to `MAP_ENGINE_CLUSTER_ZOOM`.
+    If `visible_only` is set (and points are clustered by the browser), map only fetches points within visible area.
+    `format` sets format fetched by the map (if points are clustered by the browser), one of "geojson",
+    "flatgeobuf" or "arrow" (Arrow IPC using GeoArrow encoding).
+    """
 
     properties: list = field(default_factory=lambda: [])
+    server_side: bool = False
+    visible_only: bool = False
+    grid_size: Union[int, dict[tuple[int, int], int]] = 256
+    geo_col: str = "geom"
+    format: str = "geojson"
+
+    def __post_init__(self):
+        if self.format not in ("geojson", "flatgeobuf", "arrow"):
+            raise ValueError(f"Unknown cluster format '{self.format}'.")
+
+
+@dataclass
+class TileBudget:
+    """
+    Maximum number of features and encoded bytes of a layer per tile
+
+    If a budget is exceeded, layer is thinned deterministically. Features are ranked by `priority` (column name,
+    descending if prefixed by "-"; ties and missing priority are ranked by primary key). Method is one of:
+    - "priority": highest ranked features are kept,
+    - "grid": highest ranked feature of each grid cell (of `grid_size` MVT units) is kept first, then second
+      highest ranked feature of each cell and so on; thus, thinned features stay evenly spread.
+    Byte budgets are met by re-encoding layer with proportionally fewer features.
+    """
+
+    max_features: Optional[int] = None
+    max_bytes: Optional[int] = None
+    method: str = "priority"
+    priority: Optional[str] = None
+    grid_size: int = 256
+
+    def __post_init__(self):
+        if self.method not in ("priority", "grid"):
+            raise ValueError(f"Unknown thinning method '{self.method}'.")
+        if self.priority is not None and not re.fullmatch(r"-?[A-Za-z_][A-Za-z0-9_]*", self.priority):
+            raise ValueError(f"Priority must be a column name (optionally prefixed by '-'), got '{self.priority}'.")
+
+    def get_order(self, pk: str) -> str:
+        """Return SQL ordering features by rank (priority column, if set, and primary key)"""
+        order = []
+        if self.priority:
+            direction = "DESC" if self.priority.startswith("-") else "ASC"
+            order.append(f"{connection.ops.quote_name(self.priority.lstrip('-'))} {direction} NULLS LAST")
+        order.append(connection.ops.quote_name(pk))
+        return ", ".join(order)
+
+    def get_thinned_relation(self, relation: str, pk: str, max_features: int) -> str:
+        """Return SQL (to be used in FROM clause) selecting at most given number of features from relation"""
+        order = self.get_order(pk)
+        if self.method == "grid":
+            cell = ", ".join(f"floor(ST_{axis}(ST_Centroid(mvt_geom)) / {int(self.grid_size)})" for axis in ("X", "Y"))
+            return (
+                f"(SELECT *, row_number() OVER (PARTITION BY {cell} ORDER BY {order}) AS mvt_rank FROM {relation}) "
+                f"AS thinned ORDER BY mvt_rank, {order} LIMIT {int(max_features)}"
+            )
+        return f"{relation} ORDER BY {order} LIMIT {int(max_features)}"
 
 
 @dataclass
 class MVTAPI(ModelAPI):
-    """API for MVT-based models, which are accessed via model manager"""
+    """
+    API for MVT-based models, which are accessed via model manager
+
+    Columns and tile budget (optionally per zoom range) override columns and budget of model manager.
+    """
 
     layer_id: str
     app_name: str
@@ -88,6 +158,8 @@ class MVTAPI(ModelAPI):
     minzoom: Optional[int] = None
     maxzoom: Optional[int] = None
     style: Optional[str] = None
+    columns: Optional[Union[List[str], dict[tuple[int, int], List[str]]]] = None
+    budget: Optional[Union[TileBudget, dict[tuple[int, int], TileBudget]]] = None
 
     @property
     def manager(self) -> "Manager":
@@ -0,0 +1,105 @@
+"""Signal handlers recording changed features and data revisions of MVT sources."""
+
+from __future__ import annotations
+
+import functools
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
+
+from django.conf import settings
+from django.db.models import signals
+
+if TYPE_CHECKING:
+    from django.db.models import Model
+
+
+@functools.lru_cache(maxsize=None)
+def get_tracked_models() -> dict[type[Model], list[tuple[str, str]]]:
+    """
+    Return models of all MVT sources together with related sources and geometry fields
+
+    Returns
+    -------
+    dict[type[Model], list[tuple[str, str]]]
+        Holding source names and geometry field names for each model
+    """
+    tracked_models = defaultdict(list)
+    for source, mvt_apis in settings.MAP_ENGINE_API_MVTS.items():
+        for mvt_api in mvt_apis:
+            geo_col = getattr(mvt_api.manager, "geo_col", None)
+            if geo_col is None:
+                continue
+            if (source, geo_col) not in tracked_models[mvt_api.model]:
+                tracked_models[mvt_api.model].append((source, geo_col))
+    return tracked_models
+
+
+def get_geometry_extent(geometry) -> Optional[tuple[float, float, float, float]]:  # noqa: ANN001
+    """Return WGS84 extent of given geometry"""
+    if geometry is None or geometry.empty:
+        return None
+    if geometry.srid and geometry.srid != 4326:
+        geometry = geometry.transform(4326, clone=True)
+    return geometry.extent
+
+
+def record_changes(instance: Model, geometries: dict[str, Optional[object]]) -> None:
+    """Record extents of given geometries for all sources using model of instance"""
+    # pylint: disable=C0415
+    from .models import TileChange
+
+    changes = []
+    for source, geo_col in get_tracked_models()[type(instance)]:
+        extent = get_geometry_extent(geometries.get(geo_col))
+        if extent is not None:
+            changes.append(TileChange(source=source, xmin=extent[0], ymin=extent[1], xmax=extent[2], ymax=extent[3]))
+    TileChange.objects.bulk_create(changes)
+
+
+def store_old_geometries(sender: type[Model], instance: Model, **kwargs) -> None:  # noqa: ARG001
+    """Store geometries as currently saved in database, as they are needed to update tiles of former location"""
+    if instance.pk is None or kwargs.get("raw"):
+        return
+    geo_cols = [geo_col for _, geo_col in get_tracked_models()[sender]]
+    # pylint: disable=W0212
+    old_geometries = sender._base_manager.filter(pk=instance.pk).values(*geo_cols).first()  # noqa: SLF001
+    instance._mapengine_old_geometries = old_geometries or {}  # noqa: SLF001
+
+
+def record_saved_feature(sender: type[Model], instance: Model, **kwargs) -> None:  # noqa: ARG001
+    """Record old and new extents of saved feature"""
+    if kwargs.get("raw"):
+        return
+    record_changes(instance, getattr(instance, "_mapengine_old_geometries", {}))
+    record_changes(instance, {geo_col: getattr(instance, geo_col) for _, geo_col in get_tracked_models()[sender]})
+
+
+def record_deleted_feature(sender: type[Model], instance: Model, **kwargs) -> None:  # noqa: ARG001
+    """Record extent of deleted feature"""
+    record_changes(instance, {geo_col: getattr(instance, geo_col) for _, geo_col in get_tracked_models()[sender]})
+
+
+def connect_change_tracking() -> None:
+    """Connect signal handlers to all models used in MVT sources"""
+    for model in get_tracked_models():
+        signals.pre_save.connect(store_old_geometries, sender=model, dispatch_uid=f"mapengine_pre_save_{model}")
+        signals.post_save.connect(record_saved_feature, sender=model, dispatch_uid=f"mapengine_post_save_{model}")
+        signals.pre_delete.connect(record_deleted_feature, sender=model, dispatch_uid=f"mapengine_delete_{model}")
+
+
+def bump_model_revision(sender: type[Model], **kwargs) -> None:
+    """Start new data revision of model holding saved or deleted feature"""
+    if kwargs.get("raw"):
+        return
+    # pylint: disable=C0415
+    from . import revisions
+
+    revisions.bump_revision(sender)
+
+
+def connect_revision_tracking() -> None:
+    """Connect signal handlers bumping data revisions to all models used in MVT sources and clusters"""
+    cluster_models = {cluster.model for cluster in settings.MAP_ENGINE_API_CLUSTERS}
+    for model in set(get_tracked_models()) | cluster_models:
+        for signal in (signals.post_save, signals.post_delete):
+            signal.connect(bump_model_revision, sender=model, dispatch_uid=f"mapengine_revision_{signal}_{model}")
@@ -0,0 +1,214 @@
+"""
+Module to write and serve snapshots of cluster GeoJSONs
+
+If setting `MAP_ENGINE_CLUSTER_SNAPSHOT_DIR` is set, management command `mapengine_cluster_snapshots` writes
+GeoJSON of each cluster API into that folder once - uncompressed and precompressed (gzip and brotli, if installed)
+using highest compression levels - together with a metadata file holding content hash and data version.
+Cluster GeoJSON views serve snapshots as files with strong ETags (thus, unchanged layers are answered by 304)
+and fall back to live generation only if snapshot is missing or stale.
+If `MAP_ENGINE_TILE_REVISIONS` is activated, snapshots become stale as soon as cluster model is changed;
+otherwise, snapshots are served until they are rewritten.
+"""
+
+from __future__ import annotations
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+from typing import Optional
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+
+from . import clusters, compression, revisions, setup
+
+SUFFIX = ".geojson"
+METADATA_SUFFIX = ".json"
+# Number of features encoded and written at once
+WRITE_CHUNK_SIZE = 2000
+
+
+def get_snapshot_dir() -> Optional[pathlib.Path]:
+    """Return folder holding snapshots or None if snapshots are deactivated"""
+    if settings.MAP_ENGINE_CLUSTER_SNAPSHOT_DIR is None:
+        return None
+    return pathlib.Path(settings.MAP_ENGINE_CLUSTER_SNAPSHOT_DIR)
+
+
+def get_snapshot_path(cluster: setup.ClusterAPI, encoding: Optional[str] = None) -> pathlib.Path:
+    """Return path to snapshot of cluster, compressed with given encoding"""
+    suffix = compression.FILE_SUFFIXES[encoding] if encoding else ""
+    return get_snapshot_dir() / f"{cluster.layer_id}{SUFFIX}{suffix}"
+
+
+def get_metadata_path(cluster: setup.ClusterAPI) -> pathlib.Path:
+    """Return path to metadata of snapshot of cluster"""
+    return get_snapshot_dir() / f"{cluster.layer_id}{METADATA_SUFFIX}"
+
+
+def get_available_encodings() -> list[str]:
+    """Return encodings snapshots are precompressed with; brotli is skipped if package is not installed"""
+    try:
+        compression._get_brotli()  # noqa: SLF001  # pylint: disable=W0212
+    except ImportError:
+        return ["gzip"]
+    return list(compression.ENCODINGS)
+
+
+class _SnapshotWriter:
+    """Write chunks into uncompressed and compressed temporary files at once, hashing uncompressed content"""
+
+    def __init__(self, cluster: setup.ClusterAPI, encodings: list[str]):
+        self.paths = {encoding: get_snapshot_path(cluster, encoding) for encoding in [None, *encodings]}
+        self.files = {encoding: open(f"{path}.tmp", "wb") for encoding, path in self.paths.items()}  # noqa: SIM115
+        self.compressors = {}
+        for encoding in encodings:
+            if encoding == "gzip":
+                # No timestamp in header, thus identical content results in identical files
+                self.compressors[encoding] = gzip.GzipFile(
+                    fileobj=self.files[encoding], mode="wb", compresslevel=compression.MAX_LEVELS["gzip"], mtime=0
+                )
+            else:
+                # pylint: disable=W0212
+                self.compressors[encoding] = compression._get_brotli().Compressor(  # noqa: SLF001
+                    quality=compression.MAX_LEVELS["br"]
+                )
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: str) -> None:
+        data = chunk.encode("utf-8")
+        self.hash.update(data)
+        self.size += len(data)
+        self.files[None].write(data)
+        for encoding, compressor in self.compressors.items():
+            if encoding == "gzip":
+                compressor.write(data)
+            else:
+                self.files[encoding].write(compressor.process(data))
+
+    def close(self, *, commit: bool) -> None:
+        """Close files and move them in place (if committed) or remove them"""
+        for encoding, compressor in self.compressors.items():
+            if encoding == "gzip":
+                compressor.close()
+            else:
+                self.files[encoding].write(compressor.finish())
+        for encoding, file in self.files.items():
+            file.close()
+            if commit:
+                os.replace(file.name, self.paths[encoding])
+            else:
+                os.remove(file.name)
+
+
+def write_snapshot(cluster: setup.ClusterAPI) -> dict:
+    """
+    Write snapshot of cluster GeoJSON (uncompressed and precompressed) and its metadata
+
+    Files are written to temporary files first and replaced atomically, thus views never serve partial snapshots.
+    Data version is read before features are queried; thus, changes during writing outdate the snapshot.
+
+    Parameters
+    ----------
+    cluster : setup.ClusterAPI
+        Cluster API to write snapshot of
+
+    Returns
+    -------
+    dict
+        Metadata of snapshot holding ETag (content hash), data version, size, encodings and creation time
+    """
+    snapshot_dir = get_snapshot_dir()
+    if snapshot_dir is None:
+        raise ValueError("Snapshots are deactivated, set 'MAP_ENGINE_CLUSTER_SNAPSHOT_DIR' to write snapshots.")
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    version, _ = revisions.get_version([cluster.model])
+    encodings = get_available_encodings()
+    writer = _SnapshotWriter(cluster, encodings)
+    try:
+        for chunk in clusters.stream_features(clusters.get_features(cluster), WRITE_CHUNK_SIZE):
+            writer.write(chunk)
+    except BaseException:
+        writer.close(commit=False)
+        raise
+    writer.close(commit=True)
+    metadata = {
+        "etag": writer.hash.hexdigest()[:32],
+        "version": version,
+        "size": writer.size,
+        "encodings": encodings,
+        "created": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+    }
+    metadata_path = get_metadata_path(cluster)
+    with open(f"{metadata_path}.tmp", "w", encoding="utf-8") as metadata_file:
+        json.dump(metadata, metadata_file)
+    os.replace(f"{metadata_path}.tmp", metadata_path)
+    return metadata
+
+
+def get_snapshot(cluster: setup.ClusterAPI) -> Optional[dict]:
+    """Return metadata of snapshot of cluster or None if snapshots are deactivated or snapshot is missing"""
+    if get_snapshot_dir() is None:
+        return None
+    try:
+        with open(get_metadata_path(cluster), encoding="utf-8") as metadata_file:
+            return json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(cluster: setup.ClusterAPI, metadata: dict) -> bool:
+    """Return if snapshot matches current data version of cluster model (always true if revisions are deactivated)"""
+    if not settings.MAP_ENGINE_TILE_REVISIONS:
+        return True
+    version, _ = revisions.get_version([cluster.model])
+    return metadata.get("version") == version
+
+
+def get_current_snapshot(cluster: setup.ClusterAPI) -> Optional[dict]:
+    """Return metadata of snapshot of cluster, if snapshot exists and is not stale"""
+    metadata = get_snapshot(cluster)
+    if metadata is None or not is_current(cluster, metadata):
+        return None
+    return metadata
+
+
+def get_etag(metadata: dict, encoding: Optional[str]) -> str:
+    """Return strong ETag of snapshot; each encoding is a different representation, thus gets its own ETag"""
+    return f'"{metadata["etag"]}-{encoding}"' if encoding else f'"{metadata["etag"]}"'
+
+
+def negotiate_encoding(request, metadata: dict) -> Optional[str]:  # noqa: ANN001
+    """Return best encoding of snapshot accepted by client or None if uncompressed snapshot shall be sent"""
+    accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    for encoding in compression.ENCODINGS:
+        if encoding in metadata.get("encodings", []) and compression.accepts_encoding(accept_encoding, encoding):
+            return encoding
+    return None
+
+
+def get_snapshot_response(request, cluster: setup.ClusterAPI, metadata: dict):  # noqa: ANN001,ANN201
+    """
+    Return snapshot as file response or 304 response, if client already holds snapshot
+
+    Returns None, if snapshot files have been removed meanwhile; thus, callers fall back to live generation.
+    """
+    encoding = negotiate_encoding(request, metadata)
+    etag = get_etag(metadata, encoding)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            snapshot_file = open(get_snapshot_path(cluster, encoding), "rb")  # noqa: SIM115
+        except OSError:
+            return None
+        response = FileResponse(snapshot_file, content_type="application/geo+json")
+    response["ETag"] = etag
+    content_encoding = encoding if isinstance(response, FileResponse) else None
+    compression.set_encoding_headers(response, content_encoding, compressed=True)
+    response["Cache-Control"] = settings.MAP_ENGINE_TILE_CACHE_CONTROL
+    return response
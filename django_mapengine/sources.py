@@ -8,6 +8,7 @@ from typing import TYPE_CHECKING, List
 from django import urls
 from django.conf import settings
 
+from django_mapengine import formats
 from django_mapengine.setup import MapSource
 
 if TYPE_CHECKING:
@@ -40,8 +41,10 @@ class ClusterMapSource(MapSource):
             Containing cluster source data for map
         """
         source = super().get_source(request)
-        source["cluster"] = True
-        source["clusterMaxZoom"] = self.cluster_max_zoom
+        if self.type == "geojson":
+            # Vector sources are clustered server-side
+            source["cluster"] = True
+            source["clusterMaxZoom"] = self.cluster_max_zoom
         return source
 
 
@@ -60,24 +63,33 @@ def get_static_sources() -> Iterable[MapSource]:
     for source in settings.MAP_ENGINE_API_MVTS:
         yield MapSource(source, type="vector", tiles=[f"{app_url}{source}_mvt/{{z}}/{{x}}/{{y}}/"])
         if settings.MAP_ENGINE_USE_DISTILLED_MVTS:
-            yield MapSource(
-                f"{source}_distilled", type="vector", tiles=[f"/static/mvts{app_url}{{z}}/{{x}}/{{y}}/{source}.mvt"]
-            )
+            if settings.MAP_ENGINE_DISTILL_FORMAT == "mbtiles":
+                tiles = f"{app_url}{source}_distilled/{{z}}/{{x}}/{{y}}/"
+            else:
+                tiles = f"/static/mvts{app_url}{{z}}/{{x}}/{{y}}/{source}.mvt"
+            yield MapSource(f"{source}_distilled", type="vector", tiles=[tiles])
 
 
 def get_cluster_sources() -> Iterable[MapSource]:
     """
-    Return geojson sources for all clusters
+    Return geojson sources (or vector sources, if clustered server-side) for all clusters
 
     Yields
     ------
     MapSource
         for each cluster
     """
+    app_url = urls.reverse_lazy("django_mapengine:index")
     for cluster in settings.MAP_ENGINE_API_CLUSTERS:
-        yield ClusterMapSource(
-            cluster.layer_id, type="geojson", url=urls.reverse_lazy(f"django_mapengine:{cluster.layer_id}_cluster")
-        )
+        if cluster.server_side:
+            yield ClusterMapSource(
+                cluster.layer_id, type="vector", tiles=[f"{app_url}clusters/{cluster.layer_id}/{{z}}/{{x}}/{{y}}/"]
+            )
+        else:
+            url_name = formats.get_url_name(cluster.layer_id, cluster.format)
+            yield ClusterMapSource(
+                cluster.layer_id, type="geojson", url=urls.reverse_lazy(f"django_mapengine:{url_name}")
+            )
 
 
 def get_satellite_sources() -> Iterable[MapSource]:
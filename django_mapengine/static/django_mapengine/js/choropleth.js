@@ -20,7 +20,14 @@ function activateChoropleth(msg, choroplethName) {
         dataType: 'json',
         success: function (choroplethData) {
           if (map_store.cold.choropleths[choroplethName].useFeatureState) {
-            updateChoroplethFeatureStates(choroplethName, layerID, choroplethData.values);
+            if (Array.isArray(choroplethData.ids)) {
+              // Columnar payload holding IDs and values as separate arrays
+              updateChoroplethFeatureStates(choroplethName, layerID, choroplethData.ids, choroplethData.values);
+            } else {
+              updateChoroplethFeatureStates(
+                choroplethName, layerID, Object.keys(choroplethData.values), Object.values(choroplethData.values)
+              );
+            }
           }
           map_store.cold.storedChoroplethPaintProperties[choroplethName][layerID] = choroplethData.paintProperties;
           setPaintProperties(layerID, choroplethData.paintProperties);
@@ -36,25 +43,15 @@ function activateChoropleth(msg, choroplethName) {
   return logMessage(msg);
 }
 
-function updateChoroplethFeatureStates(choroplethName, layerID, featureStateValues) {
+function updateChoroplethFeatureStates(choroplethName, layerID, featureIDs, featureValues) {
   const layerIDCleaned = layerID.endsWith("_distilled") ? layerID.slice(0, -10) : layerID;
-  for (var featureID in featureStateValues) {
-    let choroplethFeatureState = map.getFeatureState(
-      {
-        source: layerID,
-        sourceLayer: layerIDCleaned,
-        id: featureID,
-      }
-    );
-    choroplethFeatureState[choroplethName] = featureStateValues[featureID];
-    map.setFeatureState(
-      {
-        source: layerID,
-        sourceLayer: layerIDCleaned,
-        id: featureID,
-      },
-      choroplethFeatureState
-    );
+  // setFeatureState merges given state into existing state, thus other feature states are kept
+  const feature = {source: layerID, sourceLayer: layerIDCleaned, id: null};
+  const state = {};
+  for (let i = 0; i < featureIDs.length; i++) {
+    feature.id = featureIDs[i];
+    state[choroplethName] = featureValues[i];
+    map.setFeatureState(feature, state);
   }
 }
 
@@ -5,17 +5,87 @@ map.on("load", async function() {
 
 PubSub.subscribe(mapEvent.MAP_LOADED, add_sources);
 PubSub.subscribe(mapEvent.MAP_LOADED, add_images);
+PubSub.subscribe(mapEvent.MAP_SOURCES_LOADED, load_visible_clusters);
+map.on("moveend", () => load_visible_clusters("moveend"));
+
+// URLs of clusters, which are only fetched for visible area
+const visible_cluster_urls = {};
 
 
 function add_sources(msg) {
     const sources = JSON.parse(document.getElementById("mapengine_sources").textContent);
+    const binary_cluster_urls = {};
     for (const source in sources) {
+        if (map_store.cold.visible_cluster_layers.includes(source)) {
+            // Points are fetched once visible area is known
+            visible_cluster_urls[source] = sources[source].data;
+            sources[source].data = {type: "FeatureCollection", features: []};
+        } else if (source in map_store.cold.cluster_formats) {
+            // Binary formats are fetched and decoded into GeoJSON after source has been added
+            binary_cluster_urls[source] = sources[source].data;
+            sources[source].data = {type: "FeatureCollection", features: []};
+        }
         map.addSource(source, sources[source]);
     }
+    for (const source in binary_cluster_urls) {
+        set_cluster_data(source, binary_cluster_urls[source]);
+    }
     PubSub.publish(mapEvent.MAP_SOURCES_LOADED);
     return logMessage(msg);
 }
 
+function set_cluster_data(source, url) {
+    const format = map_store.cold.cluster_formats[source];
+    if (format === undefined) {
+        map.getSource(source).setData(url);
+        return;
+    }
+    fetch(url)
+        .then(response => response.status === 204 ? null : response.arrayBuffer())
+        .then(buffer => map.getSource(source).setData(
+            // Empty results are answered with 204
+            buffer === null ? {type: "FeatureCollection", features: []} : decode_features(format, new Uint8Array(buffer))
+        ));
+}
+
+function decode_features(format, data) {
+    if (format === "flatgeobuf") {
+        // Requires flatgeobuf (https://unpkg.com/flatgeobuf/dist/flatgeobuf-geojson.min.js)
+        return flatgeobuf.deserialize(data);
+    }
+    // Arrow IPC holding GeoArrow point column "geometry", requires apache-arrow (https://unpkg.com/apache-arrow)
+    const table = Arrow.tableFromIPC(data);
+    const geometry = table.getChild("geometry");
+    const x = geometry.getChild("x").toArray();
+    const y = geometry.getChild("y").toArray();
+    const columns = table.schema.fields
+        .filter(field => field.name !== "geometry")
+        .map(field => [field.name, table.getChild(field.name)]);
+    const features = new Array(table.numRows);
+    for (let i = 0; i < table.numRows; i++) {
+        const properties = {};
+        for (const [name, column] of columns) {
+            const value = column.get(i);
+            // Int64 columns are returned as BigInt, which cannot be used in style expressions
+            properties[name] = typeof value === "bigint" ? Number(value) : value;
+        }
+        features[i] = {type: "Feature", geometry: {type: "Point", coordinates: [x[i], y[i]]}, properties: properties};
+    }
+    return {type: "FeatureCollection", features: features};
+}
+
+function load_visible_clusters(msg) {
+    const bounds = map.getBounds();
+    const bbox = [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()];
+    for (const source in visible_cluster_urls) {
+        const url = new URL(visible_cluster_urls[source]);
+        url.searchParams.set("bbox", bbox.map(coordinate => coordinate.toFixed(5)).join(","));
+        url.searchParams.set("zoom", Math.floor(map.getZoom()));
+        set_cluster_data(source, url.toString());
+    }
+    return logMessage(msg);
+}
+
 async function add_images(msg) {
     const map_images = JSON.parse(document.getElementById("mapengine_images").textContent);
     const version = (maplibregl.version === undefined) ? maplibregl.getVersion() : maplibregl.version;
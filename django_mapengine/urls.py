@@ -1,11 +1,11 @@
 """URLs for MVTs and cluster geojsons"""
 
+import functools
+
 from django.conf import settings
 from django.urls import path
 
-from djgeojson.views import GeoJSONLayerView
-
-from . import distill, mvt, views
+from . import clusters, distill, formats, metrics, mvt, views
 
 app_name = "django_mapengine"  # noqa: C0103
 
@@ -13,14 +13,35 @@ urlpatterns = [
     path("", views.index, name="index"),
 ]
 
-urlpatterns += [
-    path(
-        f"clusters/{cluster.layer_id}.geojson",
-        GeoJSONLayerView.as_view(model=cluster.model, properties=cluster.properties),
-        name=f"{cluster.layer_id}_cluster",
-    )
-    for cluster in settings.MAP_ENGINE_API_CLUSTERS
-]
+if settings.MAP_ENGINE_METRICS_VIEW and metrics.get_memory_sink() is not None:
+    urlpatterns.append(path("metrics/", metrics.metrics_view, name="metrics"))
+
+for cluster in settings.MAP_ENGINE_API_CLUSTERS:
+    if cluster.server_side:
+        urlpatterns.append(
+            path(
+                f"clusters/{cluster.layer_id}/<int:z>/<int:x>/<int:y>/",
+                clusters.cluster_mvt_view_factory(cluster),
+                name=f"{cluster.layer_id}_cluster",
+            )
+        )
+    else:
+        for output_format, suffix in formats.SUFFIXES.items():
+            urlpatterns.append(
+                path(
+                    f"clusters/{cluster.layer_id}.{suffix}",
+                    clusters.cluster_feature_view_factory(cluster, output_format),
+                    name=formats.get_url_name(cluster.layer_id, output_format),
+                )
+            )
+        # Format is negotiated via "Accept" header
+        urlpatterns.append(
+            path(
+                f"clusters/{cluster.layer_id}",
+                clusters.cluster_feature_view_factory(cluster),
+                name=formats.get_url_name(cluster.layer_id, None),
+            )
+        )
 
 managers = []
 for source, mvt_apis in settings.MAP_ENGINE_API_MVTS.items():
@@ -31,11 +52,18 @@ for source, mvt_apis in settings.MAP_ENGINE_API_MVTS.items():
             # Add model managers only once and use source layer in multiple layers
             continue
         managers.append(manager_reference)
-        source_layers.append(mvt.MVTSourceLayer(mvt_api.layer_id, queryset=mvt_api.manager))
+        source_layers.append(mvt.MVTSourceLayer.from_api(mvt_api))
+    if settings.MAP_ENGINE_ASYNC_MVTS:
+        # pylint: disable=C0415
+        from . import async_mvt
+
+        view = async_mvt.async_mvt_view_factory(source, source_layers)
+    else:
+        view = mvt.mvt_view_factory(source, source_layers)
     urlpatterns.append(
         path(
             f"{source}_mvt/<int:z>/<int:x>/<int:y>/",
-            mvt.mvt_view_factory(source, source_layers),
+            view,
         )
     )
 
@@ -51,11 +79,19 @@ if settings.MAP_ENGINE_DISTILL:
         distill_path(
             f"<int:z>/<int:x>/<int:y>/{name}.mvt",
             mvt.mvt_view_factory(
-                name, [mvt.MVTSourceLayer(mvt_api.layer_id, queryset=mvt_api.manager) for mvt_api in mvt_apis]
+                name,
+                [mvt.MVTSourceLayer.from_api(mvt_api) for mvt_api in mvt_apis],
             ),
             name=name,
-            distill_func=distill.get_all_statics_for_state_lod,
+            distill_func=functools.partial(distill.get_all_statics_for_state_lod, source=name),
             distill_status_codes=(200, 204, 400),
         )
         for name, mvt_apis in settings.MAP_ENGINE_API_MVTS.items()
     ]
+
+# Serve distilled MVTs from MBTiles archives:
+if settings.MAP_ENGINE_DISTILL_FORMAT == "mbtiles":
+    urlpatterns += [
+        path(f"{source}_distilled/<int:z>/<int:x>/<int:y>/", mvt.mbtiles_view_factory(source))
+        for source in settings.MAP_ENGINE_API_MVTS
+    ]
@@ -1,8 +1,11 @@
 """Various function to be used in other modules"""
-from typing import Union
+import math
+from typing import Iterable, Optional, TypeVar, Union
 
 from django.conf import settings
 
+T = TypeVar("T")
+
 
 def get_color(layer_id: str) -> Union[str, dict]:
     """
@@ -54,3 +57,80 @@ def get_layer_style(layer_id: str) -> dict:
     if layer_id not in settings.MAP_ENGINE_LAYER_STYLES:
         raise LookupError(f"Could not find '{layer_id=}' in layer styles.")
     return settings.MAP_ENGINE_LAYER_STYLES[layer_id]
+
+
+def get_zoom_value(zoom_values: Union[T, dict[tuple[int, int], T], None], z: Optional[int]) -> Optional[T]:
+    """
+    Return value for given zoom level from per-zoom setting
+
+    Per-zoom settings are dicts with zoom ranges (minzoom, maxzoom; both inclusive) as keys.
+    Any other value is returned as is, as it is valid for all zoom levels.
+
+    Parameters
+    ----------
+    zoom_values : Union[T, dict[tuple[int, int], T], None]
+        Either dict holding values per zoom range or single value for all zooms
+    z : Optional[int]
+        Zoom level to look up; if None, value for highest zoom range is returned
+
+    Returns
+    -------
+    Optional[T]
+        Value for given zoom level or None if zoom level is not covered
+    """
+    if not isinstance(zoom_values, dict):
+        return zoom_values
+    if z is None:
+        return zoom_values[max(zoom_values, key=lambda zoom_range: zoom_range[1])] if zoom_values else None
+    for (minzoom, maxzoom), value in zoom_values.items():
+        if minzoom <= z <= maxzoom:
+            return value
+    return None
+
+
+def get_tile(lon: float, lat: float, z: int) -> tuple[int, int]:
+    """
+    Return x and y of tile containing given WGS84 coordinates at given zoom level
+
+    Parameters
+    ----------
+    lon : float
+        Longitude
+    lat : float
+        Latitude
+    z : int
+        Zoom level
+
+    Returns
+    -------
+    tuple[int, int]
+        x and y of tile
+    """
+    num_tiles = 2**z
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    x = int((lon + 180.0) / 360.0 * num_tiles)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * num_tiles)
+    return min(max(x, 0), num_tiles - 1), min(max(y, 0), num_tiles - 1)
+
+
+def get_tiles_for_bbox(bbox: tuple[float, float, float, float], z: int) -> Iterable[tuple[int, int]]:
+    """
+    Return all tiles covering given WGS84 bbox at given zoom level
+
+    Parameters
+    ----------
+    bbox : tuple[float, float, float, float]
+        Holding xmin, ymin, xmax, ymax
+    z : int
+        Zoom level
+
+    Yields
+    ------
+    tuple[int, int]
+        x and y of tile
+    """
+    x_min, y_min = get_tile(bbox[0], bbox[3], z)
+    x_max, y_max = get_tile(bbox[2], bbox[1], z)
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            yield x, y
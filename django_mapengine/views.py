@@ -67,6 +67,17 @@ class MapEngineMixin(ContextMixin):
             ),
             "result_views": {},  # Placeholder for already downloaded results (used in results.js)
             "cluster_layers": [cluster.layer_id for cluster in settings.MAP_ENGINE_API_CLUSTERS],
+            "visible_cluster_layers": [
+                cluster.layer_id
+                for cluster in settings.MAP_ENGINE_API_CLUSTERS
+                if cluster.visible_only and not cluster.server_side
+            ],
+            # Binary formats of clusters, which are decoded into GeoJSON by the map
+            "cluster_formats": {
+                cluster.layer_id: cluster.format
+                for cluster in settings.MAP_ENGINE_API_CLUSTERS
+                if cluster.format != "geojson" and not cluster.server_side
+            },
             "choropleths": {choropleth.name: choropleth.as_dict() for choropleth in settings.MAP_ENGINE_CHOROPLETHS},
             "basemap": "default",
         }
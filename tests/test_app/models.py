@@ -1,7 +1,10 @@
 """Fake django models used in tests"""
 
+from django.contrib.gis.db import models as gis_models
 from django.db import models
 
+from django_mapengine.managers import MVTManager
+
 
 class Municipality(models.Model):
     """Test region"""
@@ -19,3 +22,12 @@ class PVRoof(models.Model):
     """Test cluster/MVT model"""
 
     name = models.CharField(max_length=255)
+
+
+class Building(gis_models.Model):
+    """Test MVT model holding precomputed EPSG:3857 geometry as model field"""
+
+    geom = gis_models.PolygonField()
+    geom_3857 = gis_models.PolygonField(srid=3857)
+
+    vector_tiles = MVTManager(geo_col_3857="geom_3857")
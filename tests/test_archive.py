@@ -0,0 +1,31 @@
+"""Tests for MBTiles archives"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django_mapengine import archive
+
+
+def test_mbtiles_roundtrip(tmp_path):
+    """Test writing tiles into archive and reading them again"""
+    path = tmp_path / "static.mbtiles"
+    zoom_settings = SimpleNamespace(MAP_ENGINE_MIN_ZOOM=8, MAP_ENGINE_MAX_DISTILLED_ZOOM=9)
+    with mock.patch.object(archive, "settings", zoom_settings):
+        writer = archive.MBTilesWriter(path, "static", replace=True)
+    writer.write_tiles(8, 136, [(84, b"tile"), (85, b"tile"), (86, b"")])
+    writer.write_tiles(9, 272, [(168, b"other")])
+    writer.close()
+    assert not path.with_name("static.mbtiles.tmp").exists()
+
+    reader = archive.MBTilesReader(path)
+    assert reader.get_tile(8, 136, 84) == b"tile"
+    assert reader.get_tile(8, 136, 85) == b"tile"
+    assert reader.get_tile(8, 136, 86) is None
+    assert reader.get_tile(9, 272, 168) == b"other"
+    # Identical tiles are stored only once
+    assert reader._get_connection().execute("SELECT count(*) FROM images").fetchone()[0] == 2
+
+
+def test_missing_archive(tmp_path):
+    """Test reading from archive which has not been distilled yet"""
+    assert archive.MBTilesReader(tmp_path / "missing.mbtiles").get_tile(8, 1, 1) is None
@@ -0,0 +1,18 @@
+"""Tests for async MVT views"""
+
+from unittest import mock
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from django_mapengine import async_mvt
+
+
+def test_async_views_require_django_4_1():
+    """Test that async views fail on setup with django versions not awaiting async handlers of class-based views"""
+    with mock.patch.object(async_mvt.django, "VERSION", (4, 0, 10, "final", 0)), pytest.raises(
+        ImproperlyConfigured, match="Django >= 4.1"
+    ):
+        async_mvt.async_mvt_view_factory("static", [])
+    with mock.patch.object(async_mvt.django, "VERSION", (4, 1, 0, "final", 0)):
+        assert async_mvt.async_mvt_view_factory("static", []).view_class.source == "static"
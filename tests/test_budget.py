@@ -0,0 +1,48 @@
+"""Tests for thinning layers exceeding their tile budget"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from django_mapengine import setup
+from django_mapengine.setup import TileBudget
+
+CONNECTION = SimpleNamespace(ops=SimpleNamespace(quote_name=lambda name: f'"{name}"'))
+
+
+@mock.patch.object(setup, "connection", CONNECTION)
+def test_priority_thinning():
+    """Test that features are ranked by (quoted) priority column and primary key and limited"""
+    budget = TileBudget(max_features=100, priority="-capacity")
+    assert budget.get_thinned_relation("q", "id", 100) == 'q ORDER BY "capacity" DESC NULLS LAST, "id" LIMIT 100'
+    assert TileBudget().get_thinned_relation("q0", "pk", 5) == 'q0 ORDER BY "pk" LIMIT 5'
+
+
+@mock.patch.object(setup, "connection", CONNECTION)
+def test_primary_key_is_quoted():
+    """Test that primary key columns which are reserved words or mixed case are quoted"""
+    assert TileBudget().get_order("order") == '"order"'
+    assert TileBudget(priority="Rank").get_order("ID") == '"Rank" ASC NULLS LAST, "ID"'
+
+
+@mock.patch.object(setup, "connection", CONNECTION)
+def test_grid_thinning():
+    """Test that features are ranked within grid cells first"""
+    relation = TileBudget(method="grid", grid_size=512).get_thinned_relation("q", "id", 10)
+    assert "PARTITION BY floor(ST_X(ST_Centroid(mvt_geom)) / 512), floor(ST_Y(ST_Centroid(mvt_geom)) / 512)" in relation
+    assert relation.endswith('AS thinned ORDER BY mvt_rank, "id" LIMIT 10')
+
+
+def test_unknown_thinning_method():
+    """Test that unknown thinning methods are rejected"""
+    with pytest.raises(ValueError, match="Unknown thinning method"):
+        TileBudget(method="kmeans")
+
+
+def test_priority_must_be_column_name():
+    """Test that priority is rejected, if it is not a plain column name"""
+    with pytest.raises(ValueError, match="Priority must be a column name"):
+        TileBudget(priority="capacity; DROP TABLE wind")
+    with pytest.raises(ValueError, match="Priority must be a column name"):
+        TileBudget(priority="-capacity DESC")
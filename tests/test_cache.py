@@ -0,0 +1,109 @@
+"""Tests for tile caches"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from django_mapengine import cache
+
+
+def test_filter_key_is_normalized():
+    """Test that filter order does not change filter key"""
+    assert cache.get_filter_key({}) == "all"
+    assert cache.get_filter_key({"a": 1, "b": "2"}) == cache.get_filter_key({"b": "2", "a": "1"})
+    assert cache.get_filter_key({"a": 1}) != cache.get_filter_key({"a": 2})
+
+
+def test_memory_cache_evicts_least_recently_used_tiles():
+    """Test LRU eviction of memory tile cache"""
+    tile_cache = cache.MemoryTileCache(max_size=10)
+    tile_cache.set("static", 8, 1, 1, None, b"12345")
+    tile_cache.set("static", 8, 1, 2, None, b"12345")
+    assert tile_cache.get("static", 8, 1, 1) == b"12345"
+    tile_cache.set("static", 8, 1, 3, None, b"12345")
+
+    assert tile_cache.get("static", 8, 1, 1) == b"12345"
+    assert tile_cache.get("static", 8, 1, 2) is None
+    assert tile_cache.get("static", 8, 1, 3) == b"12345"
+    assert tile_cache.size == 10
+
+
+def test_memory_cache_invalidates_source():
+    """Test invalidation of single source"""
+    tile_cache = cache.MemoryTileCache()
+    tile_cache.set("static", 8, 1, 1, {"a": 1}, b"")
+    tile_cache.set("municipality", 8, 1, 1, None, b"tile")
+    assert tile_cache.get("static", 8, 1, 1, {"a": 1}) == b""
+    tile_cache.invalidate("static")
+
+    assert tile_cache.get("static", 8, 1, 1, {"a": 1}) is None
+    assert tile_cache.get("municipality", 8, 1, 1) == b"tile"
+
+
+def test_django_cache_reads_generation_once_per_hit():
+    """Test that cache hits do not initialize generation again and invalidation orphans cached tiles"""
+    backend = LocMemCache("tiles", {})
+    with mock.patch.object(cache, "caches", {"tiles": backend}):
+        tile_cache = cache.DjangoTileCache("tiles")
+        tile_cache.set("static", 8, 1, 1, None, b"tile")
+        with mock.patch.object(backend, "add", wraps=backend.add) as add:
+            assert tile_cache.get("static", 8, 1, 1) == b"tile"
+            add.assert_not_called()
+        tile_cache.invalidate("static")
+        assert tile_cache.get("static", 8, 1, 1) is None
+
+
+def test_filesystem_cache(tmp_path):
+    """Test filesystem cache including timeout, eviction and invalidation"""
+    tile_cache = cache.FileSystemTileCache(tmp_path, max_size=25, timeouts={"expired": -1})
+    tile_cache.set("expired", 8, 1, 1, None, b"tile")
+    assert tile_cache.get("expired", 8, 1, 1) is None
+
+    for y in range(3):
+        tile_cache.set("static", 8, 1, y, None, b"0123456789")
+    assert sum(path.stat().st_size for path in tmp_path.rglob("*.mvt")) <= 25
+
+    tile_cache.set("static", 8, 2, 1, None, b"tile")
+    tile_cache.invalidate("static")
+    assert tile_cache.get("static", 8, 2, 1) is None
+    assert not list((tmp_path / "static").rglob("*.mvt"))
+
+
+def test_filesystem_cache_drops_tiles_rendered_before_invalidation(tmp_path):
+    """Test that tile missed before invalidation (and thus rendered from outdated data) is not stored"""
+    tile_cache = cache.FileSystemTileCache(tmp_path)
+    assert tile_cache.get("static", 8, 1, 1) is None
+    tile_cache.invalidate("static")
+    tile_cache.set("static", 8, 1, 1, None, b"outdated")
+    assert tile_cache.get("static", 8, 1, 1) is None
+    tile_cache.set("static", 8, 1, 1, None, b"current")
+    assert tile_cache.get("static", 8, 1, 1) == b"current"
+
+
+def test_cluster_sources_are_invalidated():
+    """Test that tiles of server-side clusters are cleared and can be invalidated like MVT sources"""
+    settings = SimpleNamespace(
+        MAP_ENGINE_API_MVTS={"static": []},
+        MAP_ENGINE_API_CLUSTERS=[
+            SimpleNamespace(layer_id="wind", server_side=True, model=mock.sentinel.wind),
+            SimpleNamespace(layer_id="pvroof", server_side=False),
+        ],
+    )
+    tile_cache = cache.MemoryTileCache()
+    with mock.patch.object(cache, "settings", settings), mock.patch.object(
+        cache, "get_tile_cache", return_value=tile_cache
+    ):
+        assert cache.get_sources() == ["static", "wind_cluster"]
+        assert cache.get_source_models("wind_cluster") == {mock.sentinel.wind}
+        with pytest.raises(KeyError):
+            cache.invalidate_source("pvroof_cluster")
+
+        tile_cache.set("wind_cluster", 8, 1, 1, None, b"tile")
+        cache.invalidate_source("wind_cluster")
+        assert tile_cache.get("wind_cluster", 8, 1, 1) is None
+
+        tile_cache.set("wind_cluster", 8, 1, 1, None, b"tile")
+        tile_cache.clear()
+        assert tile_cache.get("wind_cluster", 8, 1, 1) is None
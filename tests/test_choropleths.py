@@ -1,6 +1,9 @@
 """Test for choropleths."""
 
 import pathlib
+from unittest import mock
+
+import pytest
 
 from django_mapengine import choropleth
 
@@ -46,3 +49,59 @@ def test_choropleths_without_values() -> None:
         833.3333333333333,
         "rgb(37, 52, 148)",
     ]
+
+
+def test_summarize_values() -> None:
+    """Test that values are summarized equally with and without NumPy, dropping missing values."""
+    summary = choropleth.summarize_values([10, 40, None, 50, 310])
+    assert summary == {"count": 4, "min": 10.0, "max": 310.0, "quantiles": {0.25: 32.5, 0.5: 45.0, 0.75: 115.0}}
+    with mock.patch.object(choropleth, "_get_numpy", return_value=None):
+        assert choropleth.summarize_values([10, 40, None, 50, 310]) == summary
+    with pytest.raises(choropleth.ChoroplethError):
+        choropleth.summarize_values([None])
+
+
+def test_choropleth_data_is_columnar() -> None:
+    """Test that choropleth payload holds IDs and values as arrays and array values give same colors as lists."""
+    np = pytest.importorskip("numpy")
+    data = CHOROPLETHS.get_choropleth_data("without_values", np.array([1, 2, 3]), np.array([10.0, np.nan, 310.0]))
+    assert data["ids"] == [1, 2, 3]
+    assert data["values"] == [10.0, None, 310.0]
+    assert data["paintProperties"]["fill-color"] == CHOROPLETHS.get_fill_color("without_values", [10, 310])
+
+
+def test_classifications() -> None:
+    """Test class breaks of classification methods."""
+    pytest.importorskip("numpy")
+    values = [1, 2, 3, 4, 10, 11, 12, 100]
+    assert choropleth.classify(values, "equal_interval", 3) == [1.0, 34.0, 67.0, 100.0]
+    assert choropleth.classify(values, "quantile", 2) == [1.0, 7.0, 100.0]
+    assert choropleth.classify(values, "jenks", 3) == [1.0, 10.0, 100.0]
+    assert choropleth.classify(values, "head_tail", 6) == [1.0, 17.875, 100.0]
+    assert choropleth.classify([0, 1, 10, 100], "log", 2) == [0.0, 10.0, 100.0]
+    # Duplicate breaks of skewed values are merged
+    assert choropleth.classify([0, 0, 0, 0, 0, 5], "quantile", 4) == [0.0, 5.0]
+    with pytest.raises(choropleth.ChoroplethError):
+        choropleth.classify(values, "unknown", 3)
+
+
+def test_classification_is_cached() -> None:
+    """Test that breaks of same values are computed only once."""
+    np = pytest.importorskip("numpy")
+    values = np.arange(1000, dtype=float)
+    quantile = mock.Mock(wraps=choropleth.CLASSIFICATIONS["quantile"])
+    with mock.patch.dict(choropleth.CLASSIFICATIONS, {"quantile": quantile}):
+        breaks = choropleth.classify(values, "quantile", 5)
+        assert choropleth.classify(values[::-1].copy(), "quantile", 5) == breaks
+        assert quantile.call_count == 1
+        choropleth.classify(values, "quantile", 4)
+        assert quantile.call_count == 2
+
+
+def test_choropleth_with_classification() -> None:
+    """Test that classification of choropleth config is used for dynamic values."""
+    pytest.importorskip("numpy")
+    choropleths = choropleth.Choropleth(TEST_CHOROPLETH_STYLES_FILE)
+    choropleths.choropleths["jenks"] = {"color_palette": "YlGnBu", "num_colors": 3, "classification": "jenks"}
+    fill_color = choropleths.get_fill_color("jenks", [1, 2, 3, 4, 10, 11, 12, 100])
+    assert fill_color[3::2] == [1.0, 10.0, 100.0]
@@ -0,0 +1,89 @@
+"""Tests for serving cluster points"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from django_mapengine import clusters, mvt
+
+CONNECTION = SimpleNamespace(ops=SimpleNamespace(quote_name=lambda name: f'"{name}"'))
+QUERYSET = SimpleNamespace(
+    get_mvt_sql=lambda x, y, z, filters: ("SELECT id, name, mvt_geom FROM points", [x, y, z]),
+    get_columns=lambda z: ["id", "name"],
+    budget=None,
+    model=SimpleNamespace(_meta=SimpleNamespace(pk=SimpleNamespace(column="id"))),
+)
+
+
+@mock.patch.object(clusters, "connection", CONNECTION)
+def test_cluster_template():
+    """Test that points are clustered per grid cell and clusters hold point counts instead of properties"""
+    layer = mvt.MVTSourceLayer("wind", QUERYSET)
+    query = clusters.build_cluster_template("SELECT 1", layer, 8, 64)
+    assert query.startswith("WITH q AS (SELECT 1), ")
+    assert "WINDOW cell AS (PARTITION BY floor(ST_X(mvt_geom) / 64), floor(ST_Y(mvt_geom) / 64))" in query
+    assert 'row_number() OVER (cell ORDER BY "id") AS cluster_rank' in query
+    assert 'CASE WHEN cluster_count = 1 THEN "name" END AS "name", ' in query
+    assert "CASE WHEN cluster_count > 1 THEN true END AS cluster, " in query
+    assert "CASE WHEN cluster_count > 1 THEN cluster_count END AS point_count, " in query
+    assert "END AS point_count_abbreviated, " in query
+    assert "FROM c WHERE cluster_rank = 1" in query
+    assert query.endswith("SELECT ST_AsMVT(s.*, 'wind') FROM s")
+
+
+@mock.patch.object(clusters, "connection", CONNECTION)
+@mock.patch.object(clusters, "settings", SimpleNamespace(MAP_ENGINE_CLUSTER_ZOOM=12))
+def test_points_are_unclustered_above_cluster_zoom():
+    """Test that points are served unclustered above cluster zoom, using grid size of zoom level otherwise"""
+    # pylint: disable=W0212
+    view = clusters.ClusterMVTView(
+        source="wind_cluster", layers=[mvt.MVTSourceLayer("wind", QUERYSET)], cluster=SimpleNamespace(grid_size=64)
+    )
+    query, params = view._get_mvt_query(12, 1, 2, {})  # noqa: SLF001
+    assert "point_count" in query
+    assert params == [1, 2, 12]
+    with mock.patch.object(mvt.metrics, "is_active", return_value=False):
+        query, params = view._get_mvt_query(13, 1, 2, {})  # noqa: SLF001
+    assert "point_count" not in query
+    assert "cluster" not in query
+    assert query.endswith("SELECT ST_AsMVT(s0.*, 'wind') FROM s0")
+    assert params == [1, 2, 13]
+
+
+def test_parse_bbox():
+    """Test that bbox is parsed and invalid bboxes are rejected"""
+    assert clusters.parse_bbox("5.9,47.3,15.0,55.0") == (5.9, 47.3, 15.0, 55.0)
+    for bbox in ("5.9,47.3,15.0", "a,b,c,d", "15,47,5,55", "nan,1,2,3"):
+        with pytest.raises(ValueError):  # noqa: PT011
+            clusters.parse_bbox(bbox)
+
+
+@mock.patch.object(clusters, "settings", SimpleNamespace(MAP_ENGINE_CLUSTER_PRECISION=6))
+def test_get_precision():
+    """Test that coordinate precision increases with zoom, but does not exceed maximum"""
+    assert clusters.get_precision(None) == 6
+    assert clusters.get_precision(0) == 1
+    assert clusters.get_precision(10) == 4
+    assert clusters.get_precision(22) == 6
+
+
+def test_stream_features():
+    """Test that features are streamed as valid feature collection in chunks"""
+    features = ['{"id": 1}', '{"id": 2}', '{"id": 3}']
+    chunks = list(clusters.stream_features(iter(features), chunk_size=2))
+    assert len(chunks) == 4
+    assert "".join(chunks) == '{"type": "FeatureCollection", "features": [{"id": 1},{"id": 2},{"id": 3}]}'
+    assert "".join(clusters.stream_features(iter([]), chunk_size=2)) == '{"type": "FeatureCollection", "features": []}'
+
+
+def test_empty_flatgeobuf_is_answered_with_204():
+    """Test that empty FlatGeobuf is not sent with status 200, as it cannot be deserialized"""
+    # pylint: disable=W0212
+    view = clusters.ClusterFeatureView(cluster=SimpleNamespace(), output_format="flatgeobuf")
+    with mock.patch.object(clusters, "get_binary_rows_query", return_value=("SELECT 1", [], None)):
+        with mock.patch.object(clusters.formats, "get_flatgeobuf", return_value=b""):
+            assert view._get_response(None, "flatgeobuf", None, None).status_code == 204  # noqa: SLF001
+        with mock.patch.object(clusters.formats, "get_flatgeobuf", return_value=b"fgb"):
+            response = view._get_response(None, "flatgeobuf", None, None)  # noqa: SLF001
+            assert response.content == b"fgb"
@@ -0,0 +1,76 @@
+"""Tests for coalescing of concurrent tile requests"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from django_mapengine import cache, coalesce
+
+
+def test_single_flight_runs_function_once():
+    """Test that concurrent calls with same key share one result"""
+    flight = coalesce.SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def render():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return b"tile"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flight.do, "key", render)
+        started.wait()
+        followers = [executor.submit(flight.do, "key", render) for _ in range(3)]
+        results = [leader.result()] + [follower.result() for follower in followers]
+
+    assert results == [b"tile"] * 4
+    assert len(calls) == 1
+    assert flight.do("key", lambda: b"new") == b"new"
+
+
+def test_async_single_flight_runs_coroutine_once():
+    """Test that concurrent coroutines with same key share one result"""
+    flight = coalesce.AsyncSingleFlight()
+    calls = []
+
+    async def render():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b"tile"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", render) for _ in range(4)))
+
+    assert asyncio.run(run()) == [b"tile"] * 4
+    assert len(calls) == 1
+
+
+LOCK_SETTINGS = SimpleNamespace(MAP_ENGINE_TILE_LOCK_CACHE="locks", MAP_ENGINE_TILE_LOCK_TIMEOUT=1)
+
+
+@mock.patch.object(coalesce, "caches", {"locks": LocMemCache("locks", {})})
+@mock.patch.object(coalesce, "settings", LOCK_SETTINGS)
+def test_get_or_render_waits_for_other_worker():
+    """Test that tile locked by another worker is taken from tile cache once it is rendered"""
+    tile_cache = cache.MemoryTileCache()
+    token = coalesce.acquire_lock("static", 8, 1, 1, None)
+    assert coalesce.acquire_lock("static", 8, 1, 1, None) is None
+
+    def other_worker():
+        time.sleep(0.1)
+        tile_cache.set("static", 8, 1, 1, None, b"tile")
+        coalesce.release_lock("static", 8, 1, 1, None, token)
+
+    thread = threading.Thread(target=other_worker)
+    thread.start()
+    assert coalesce.get_or_render(tile_cache, "static", 8, 1, 1, None, lambda: b"own") == b"tile"
+    thread.join()
+    assert coalesce.get_or_render(tile_cache, "static", 8, 1, 2, None, lambda: b"own") == b"own"
+    assert not coalesce.is_locked("static", 8, 1, 2, None)
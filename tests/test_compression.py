@@ -0,0 +1,32 @@
+"""Tests for tile compression and content negotiation"""
+
+from types import SimpleNamespace
+
+from django_mapengine import compression
+
+
+def test_accepts_encoding():
+    """Test parsing of "Accept-Encoding" header incl. quality values and wildcard"""
+    assert compression.accepts_encoding("gzip, deflate, br", "br")
+    assert compression.accepts_encoding("GZIP;q=0.5", "gzip")
+    assert not compression.accepts_encoding("gzip;q=0, br", "gzip")
+    assert not compression.accepts_encoding("", "gzip")
+    assert compression.accepts_encoding("*", "gzip")
+    assert not compression.accepts_encoding("br, *;q=0", "gzip")
+
+
+def test_gzip_is_deterministic():
+    """Test that identical tiles result in identical compressed bytes"""
+    assert compression.compress(b"tile" * 100, "gzip", 6) == compression.compress(b"tile" * 100, "gzip", 6)
+    assert compression.decompress(compression.compress(b"tile", "gzip", 9), "gzip") == b"tile"
+
+
+def test_negotiate():
+    """Test that compressed tiles are decompressed for clients not accepting encoding"""
+    tile = compression.compress(b"tile", "gzip", 6)
+    accepting = SimpleNamespace(META={"HTTP_ACCEPT_ENCODING": "gzip, br"})
+    refusing = SimpleNamespace(META={})
+    assert compression.negotiate(accepting, tile, "gzip") == (tile, "gzip")
+    assert compression.negotiate(refusing, tile, "gzip") == (b"tile", None)
+    assert compression.negotiate(accepting, b"", "gzip") == (b"", None)
+    assert compression.negotiate(accepting, b"tile", None) == (b"tile", None)
@@ -0,0 +1,42 @@
+"""Tests for distilling MVTs derived from data"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django_mapengine import distill
+
+SETTINGS = SimpleNamespace(MAP_ENGINE_MAX_DISTILLED_ZOOM=10)
+
+
+def test_get_child_chunks():
+    """Test that child tile columns hold children of given tiles only and stop at max distilled zoom"""
+    with mock.patch.object(distill, "settings", SETTINGS):
+        assert distill.get_child_chunks("static", 5, 3, [1, 4]) == [
+            ("static", 6, 6, [2, 3, 8, 9]),
+            ("static", 6, 7, [2, 3, 8, 9]),
+        ]
+        assert distill.get_child_chunks("static", 5, 3, []) == []
+        assert distill.get_child_chunks("static", 10, 3, [1]) == []
+
+
+def test_read_manifest(tmp_path):
+    """Test that tile columns derived from data keep y-coordinates of tiles holding features"""
+    manifest_path = tmp_path / distill.MANIFEST_FILENAME
+    manifest_path.write_text("static/5/3\nstatic/6/6 2,9\nstatic/6/7 \n", encoding="utf-8")
+    assert distill.read_manifest(manifest_path) == {"static/5/3": None, "static/6/6": [2, 9], "static/6/7": []}
+
+
+def test_distill_chunk_checks_empty_tiles_only():
+    """Test that worker returns tiles holding features and only checks empty tiles for features"""
+    view = SimpleNamespace(_create_mvt=lambda z, x, y, filters: b"tile" if y == 1 else None)
+    manager = mock.Mock(has_features=mock.Mock(side_effect=lambda x, y, z: y == 2))
+    with mock.patch.object(distill, "get_distill_view", return_value=view), mock.patch.object(
+        distill, "get_source_managers", return_value=[manager]
+    ), mock.patch.object(distill.compression, "get_encoding", return_value=None):
+        empty, _, tiles, feature_ys = distill.distill_chunk(
+            None, "static", 5, 3, [1, 2, 3], collect=True, check_data=True
+        )
+    assert feature_ys == [1, 2]
+    assert empty == 2
+    assert tiles == [(1, b"tile"), (2, b""), (3, b"")]
+    assert [call.args for call in manager.has_features.call_args_list] == [(3, 2, 5), (3, 3, 5)]
@@ -0,0 +1,51 @@
+"""Tests for binary feature formats of clusters"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from django_mapengine import formats
+
+
+def get_field(internal_type, target_field=None):  # noqa: ANN001,ANN201
+    return SimpleNamespace(
+        is_relation=target_field is not None, target_field=target_field, get_internal_type=lambda: internal_type
+    )
+
+
+def test_negotiate_format():
+    """Test that format with highest quality is chosen and GeoJSON is used by default"""
+    assert formats.negotiate_format("") == "geojson"
+    assert formats.negotiate_format("*/*") == "geojson"
+    assert formats.negotiate_format("application/flatgeobuf") == "flatgeobuf"
+    assert formats.negotiate_format("application/geo+json;q=0.5, application/vnd.apache.arrow.stream") == "arrow"
+    assert formats.negotiate_format("application/flatgeobuf;q=0, text/html") == "geojson"
+
+
+def test_get_url_name():
+    """Test that GeoJSON keeps former URL name"""
+    assert formats.get_url_name("wind", "geojson") == "wind_cluster"
+    assert formats.get_url_name("wind", "flatgeobuf") == "wind_cluster_fgb"
+    assert formats.get_url_name("wind", None) == "wind_cluster_features"
+
+
+def test_get_arrow_type():
+    """Test that columns are cast to Arrow compatible types; relations use type of target field"""
+    assert formats.get_arrow_type(get_field("BigAutoField")) == ("bigint", "int64")
+    assert formats.get_arrow_type(get_field("DecimalField")) == ("double precision", "float64")
+    assert formats.get_arrow_type(get_field("BooleanField")) == ("boolean", "bool_")
+    assert formats.get_arrow_type(get_field("ForeignKey", get_field("AutoField"))) == ("bigint", "int64")
+    assert formats.get_arrow_type(get_field("CharField")) == ("text", "string")
+    assert formats.get_arrow_type(None) == ("text", "string")
+
+
+def test_arrow_record_batch():
+    """Test that rows are transposed into columns and GeoArrow point column"""
+    pa = pytest.importorskip("pyarrow")
+    schema = formats.get_arrow_schema({"id": "int64", "name": "string"})
+    batch = formats.get_record_batch(schema, [(1, "a", 10.0, 50.0), (2, None, 11.0, 51.0)])
+    stream = schema.serialize().to_pybytes() + batch.serialize().to_pybytes() + formats.ARROW_END_OF_STREAM
+    table = pa.ipc.open_stream(stream).read_all()
+    assert table.column("name").to_pylist() == ["a", None]
+    assert table.column("geometry").to_pylist() == [{"x": 10.0, "y": 50.0}, {"x": 11.0, "y": 51.0}]
+    assert table.schema.field("geometry").metadata[b"ARROW:extension:name"] == b"geoarrow.point"
@@ -1,5 +1,10 @@
 """Tests for testing layers module"""
 
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import override_settings
+
 from django_mapengine import layers
 
 
@@ -41,3 +46,16 @@ def test_static_layers_from_settings():
     assert static_layers[1].id == "pvroof"
     assert issubclass(static_layers[1].model, models.PVRoof)
     assert static_layers[1].source == "static"
+
+
+@override_settings(MAP_ENGINE_API_CLUSTERS=[SimpleNamespace(layer_id="wind", server_side=True)])
+def test_server_side_cluster_layers_use_source_layer():
+    """Test that all map layers of server-side clusters refer to source layer of cluster MVTs"""
+    with mock.patch.object(layers, "get_layer_style", return_value={"type": "circle"}):
+        (cluster_layer,) = layers.get_cluster_layers()
+        map_layers = [map_layer.get_layer() for map_layer in cluster_layer.get_map_layers()]
+
+    assert isinstance(cluster_layer, layers.ClusterModelLayer)
+    assert [map_layer["id"] for map_layer in map_layers] == ["wind", "wind_cluster", "wind_cluster_count"]
+    assert all(map_layer["source"] == "wind" for map_layer in map_layers)
+    assert all(map_layer["source-layer"] == "wind" for map_layer in map_layers)
@@ -0,0 +1,10 @@
+"""Tests for MVT queries built by MVTManager"""
+
+from tests.test_app.models import Building
+
+
+def test_geom_3857_model_field():
+    """Test that precomputed EPSG:3857 geometry can be a model field named like the internal alias"""
+    query = Building.vector_tiles._get_mvt_geom_query(1, 2, 3)  # noqa: SLF001  # pylint: disable=W0212
+    assert "mapengine_geom_3857" in query.query.annotations
+    assert query.query.where.children[0].lhs.target.name == "geom_3857"
@@ -0,0 +1,59 @@
+"""Tests for tile-serving metrics"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from django.test import RequestFactory
+
+from django_mapengine import metrics
+
+
+def test_memory_sink_renders_prometheus_text():
+    """Test counters and cumulative histogram buckets in Prometheus output"""
+    sink = metrics.MemorySink()
+    sink.increment("mapengine_tiles_total", {"source": "static", "status": 204})
+    sink.increment("mapengine_tiles_total", {"source": "static", "status": 204})
+    sink.observe("mapengine_tile_seconds", 0.02, {"source": "static", "z": 8})
+    sink.observe("mapengine_tile_seconds", 3, {"source": "static", "z": 8})
+
+    text = sink.to_prometheus()
+    assert 'mapengine_tiles_total{source="static",status="204"} 2.0' in text
+    assert 'mapengine_tile_seconds_bucket{source="static",z="8",le="0.01"} 0' in text
+    assert 'mapengine_tile_seconds_bucket{source="static",z="8",le="0.025"} 1' in text
+    assert 'mapengine_tile_seconds_bucket{source="static",z="8",le="+Inf"} 2' in text
+    assert 'mapengine_tile_seconds_count{source="static",z="8"} 2' in text
+
+
+def test_buckets_depend_on_unit():
+    """Test that buckets are chosen by suffix of metric name"""
+    assert metrics.get_buckets("mapengine_layer_bytes") == metrics.BUCKETS["bytes"]
+    assert metrics.get_buckets("mapengine_layer_features") == metrics.BUCKETS["features"]
+    assert metrics.get_buckets("mapengine_tile_seconds") == metrics.BUCKETS["seconds"]
+
+
+def test_statsd_names():
+    """Test that labels are appended to statsd metric names"""
+    sink = metrics.StatsdSink(prefix="maps")
+    # pylint: disable=W0212
+    name = sink._get_name("mapengine_tile_seconds", {"source": "static", "z": 8})  # noqa: SLF001
+    assert name == "maps.tile_seconds.static.z8"
+
+
+def test_sinks_must_implement_increment_and_observe():
+    """Test that sinks missing a method cannot be set up"""
+
+    class CounterSink(metrics.MetricsSink):  # pylint: disable=W0223
+        def increment(self, name, labels, value=1):  # noqa: ANN001,ANN202
+            pass
+
+    with pytest.raises(TypeError, match="observe"):
+        CounterSink()
+
+
+def test_metrics_view_denies_clients_not_allowed():
+    """Test that metrics are only exposed to allowed IP addresses, if set"""
+    settings = SimpleNamespace(MAP_ENGINE_METRICS=metrics.MemorySink(), MAP_ENGINE_METRICS_ALLOWED_IPS=["10.0.0.1"])
+    with mock.patch.object(metrics, "settings", settings):
+        assert metrics.metrics_view(RequestFactory().get("/metrics/", REMOTE_ADDR="10.0.0.2")).status_code == 403
+        assert metrics.metrics_view(RequestFactory().get("/metrics/", REMOTE_ADDR="10.0.0.1")).status_code == 200
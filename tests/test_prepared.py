@@ -0,0 +1,93 @@
+"""Tests for running MVT queries as prepared statements"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from django.db import DataError, ProgrammingError
+
+from django_mapengine import mvt
+
+
+class FakeCursor:
+    """Cursor recording executed SQL, losing prepared statements on demand"""
+
+    def __init__(self):
+        self.db = SimpleNamespace(connection=object(), in_atomic_block=False, alias="default")
+        self.statements = set()
+        self.executed = []
+        self.fail_execute = False
+
+    def execute(self, query, params=None):  # noqa: ANN001
+        self.executed.append(query)
+        command, _, rest = query.partition(" ")
+        name = rest.split(" ")[0].split("(")[0]
+        if command == "PREPARE":
+            if name in self.statements:
+                error = ProgrammingError(f'prepared statement "{name}" already exists')
+                error.pgcode = "42P05"
+                raise error
+            self.statements.add(name)
+        elif command == "EXECUTE" and self.fail_execute:
+            error = DataError("invalid input syntax")
+            error.pgcode = "22P02"
+            raise error
+        elif command in ("EXECUTE", "DEALLOCATE") and name not in self.statements:
+            error = ProgrammingError(f'prepared statement "{name}" does not exist')
+            error.pgcode = "26000"
+            raise error
+        elif command == "DEALLOCATE":
+            self.statements.discard(name)
+
+
+def test_statement_is_prepared_once():
+    """Test that statement is prepared once per connection and executed with parameters"""
+    cursor = FakeCursor()
+    mvt.execute_prepared(cursor, "SELECT %s, '%%'", [1])
+    mvt.execute_prepared(cursor, "SELECT %s, '%%'", [2])
+    assert [query.split(" ")[0] for query in cursor.executed] == ["PREPARE", "EXECUTE", "EXECUTE"]
+    assert cursor.executed[0].endswith("AS SELECT $1, '%'")
+
+
+def test_lost_statement_is_prepared_again():
+    """Test that statements lost on server (i.e. after rollback or pooler reset) are prepared again"""
+    cursor = FakeCursor()
+    mvt.execute_prepared(cursor, "SELECT %s", [1])
+    cursor.statements.clear()
+    mvt.execute_prepared(cursor, "SELECT %s", [2])
+    assert [query.split(" ")[0] for query in cursor.executed] == ["PREPARE", "EXECUTE", "EXECUTE", "PREPARE", "EXECUTE"]
+
+
+def test_failing_execution_keeps_statement_prepared():
+    """Test that statement stays usable after execution failed for other reasons than a missing statement"""
+    cursor = FakeCursor()
+    mvt.execute_prepared(cursor, "SELECT %s", [1])
+    cursor.fail_execute = True
+    with pytest.raises(DataError):
+        mvt.execute_prepared(cursor, "SELECT %s", ["invalid"])
+    cursor.fail_execute = False
+    mvt.execute_prepared(cursor, "SELECT %s", [2])
+    assert [query.split(" ")[0] for query in cursor.executed] == ["PREPARE", "EXECUTE", "EXECUTE", "EXECUTE"]
+
+
+def test_existing_statement_is_not_prepared_again():
+    """Test that statement already prepared on connection but not tracked is used as is"""
+    cursor = FakeCursor()
+    mvt.execute_prepared(cursor, "SELECT %s", [1])
+    mvt._get_prepared_statements(cursor).clear()  # noqa: SLF001  # pylint: disable=W0212
+    mvt.execute_prepared(cursor, "SELECT %s", [2])
+    assert [query.split(" ")[0] for query in cursor.executed] == ["PREPARE", "EXECUTE", "PREPARE", "EXECUTE"]
+
+
+def test_least_recently_used_statements_are_deallocated():
+    """Test that number of prepared statements per connection is limited"""
+    cursor = FakeCursor()
+    with mock.patch.object(mvt, "MAX_PREPARED_STATEMENTS", 2):
+        for query in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+            mvt.execute_prepared(cursor, query, [])
+    assert len(cursor.statements) == 2
+    assert cursor.executed[-2].startswith("DEALLOCATE")
+    assert list(mvt._get_prepared_statements(cursor)) == [  # noqa: SLF001  # pylint: disable=W0212
+        mvt.get_statement_name("SELECT 1"),
+        mvt.get_statement_name("SELECT 3"),
+    ]
@@ -0,0 +1,68 @@
+"""Tests for recording tile requests and pre-warming tile cache"""
+
+import datetime
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+from django_mapengine import cache, distill, prewarm
+
+
+@mock.patch.object(
+    prewarm, "settings", SimpleNamespace(MAP_ENGINE_RECORD_TILE_HITS=True, MAP_ENGINE_TILE_HIT_FLUSH_INTERVAL=60)
+)
+def test_record_hit_counts_unfiltered_tiles():
+    """Test that only unfiltered tiles of sources are counted"""
+    counter = prewarm.HitCounter()
+    with mock.patch.object(prewarm, "hit_counter", counter):
+        prewarm.record_hit("static", 8, 1, 1, {})
+        prewarm.record_hit("static", 8, 1, 1, {})
+        prewarm.record_hit("static", 8, 1, 1, {"year": "2020"})
+        prewarm.record_hit(None, 8, 1, 1, {})
+    assert counter._hits == {("static", 8, 1, 1): 2}  # noqa: SLF001  # pylint: disable=W0212
+
+
+@mock.patch.object(
+    prewarm, "settings", SimpleNamespace(MAP_ENGINE_RECORD_TILE_HITS=True, MAP_ENGINE_TILE_HIT_FLUSH_INTERVAL=0)
+)
+def test_flush_is_submitted_to_background_thread():
+    """Test that counts are flushed in background once flush interval has passed"""
+    counter = prewarm.HitCounter()
+    with mock.patch.object(counter, "flush") as flush, mock.patch.object(prewarm, "connection"):
+        counter.record("static", 8, 1, 1)
+        counter._executor.shutdown(wait=True)  # noqa: SLF001  # pylint: disable=W0212
+    flush.assert_called_once_with()
+
+
+def test_upsert_aggregates_hits_per_tile():
+    """Test that hits are written via multi-row upserts holding one row per tile"""
+    now = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    hits = Counter({("static", 8, 1, 1): 3, ("static", 8, 1, 2): 1, ("wind", 9, 3, 4): 2})
+    with mock.patch.object(prewarm, "FLUSH_BATCH_SIZE", 2):
+        queries = list(prewarm.get_upsert_queries('"hits"', hits, now))
+    assert len(queries) == 2
+    query, params = queries[0]
+    assert query.startswith('INSERT INTO "hits" (source, z, x, y, hits, last_hit) VALUES (%s, %s, %s, %s, %s, %s), (')
+    assert query.endswith('SET hits = "hits".hits + EXCLUDED.hits, last_hit = EXCLUDED.last_hit')
+    assert params == ["static", 8, 1, 1, 3, now, "static", 8, 1, 2, 1, now]
+    assert queries[1][1] == ["wind", 9, 3, 4, 2, now]
+
+
+def test_select_tiles():
+    """Test that most requested tiles are selected per source and zoom level and ordered by requests"""
+    hits = [(5, "static", 8, 1, 1), (7, "static", 8, 1, 2), (1, "static", 8, 1, 3), (6, "static", 9, 2, 2)]
+    assert prewarm.select_tiles(hits, 2) == [("static", 8, 1, 2), ("static", 9, 2, 2), ("static", 8, 1, 1)]
+
+
+def test_prewarm_counts_cached_tiles_separately():
+    """Test that tiles already in tile cache are not rendered again and counted as cached"""
+    tile_cache = cache.MemoryTileCache()
+    tile_cache.set("static", 8, 1, 1, {}, b"tile")
+    view = mock.Mock()
+    view._get_cache_filters.return_value = {}  # noqa: SLF001  # pylint: disable=W0212
+    with mock.patch.object(cache, "get_tile_cache", return_value=tile_cache), mock.patch.object(
+        distill, "get_distill_view", return_value=view
+    ), mock.patch.object(prewarm, "connection"):
+        stats = prewarm.prewarm([("static", 8, 1, 1), ("static", 8, 1, 2)], workers=1)
+    assert (stats.rendered, stats.cached, stats.failed) == (1, 1, 0)
+    view._get_mvt.assert_called_once_with(8, 1, 2, {})  # noqa: SLF001  # pylint: disable=W0212
@@ -0,0 +1,39 @@
+"""Tests for profiling slow tiles"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django_mapengine import profiling
+
+
+def test_is_slow():
+    """Test that tiles are only profiled, if threshold is set and exceeded and tile is sampled"""
+    with mock.patch.object(
+        profiling, "settings", SimpleNamespace(MAP_ENGINE_SLOW_TILE_THRESHOLD=None, MAP_ENGINE_SLOW_TILE_SAMPLE_RATE=1)
+    ):
+        assert not profiling.is_slow(100)
+    with mock.patch.object(
+        profiling, "settings", SimpleNamespace(MAP_ENGINE_SLOW_TILE_THRESHOLD=1, MAP_ENGINE_SLOW_TILE_SAMPLE_RATE=1)
+    ):
+        assert not profiling.is_slow(0.5)
+        assert profiling.is_slow(1.5)
+    with mock.patch.object(
+        profiling, "settings", SimpleNamespace(MAP_ENGINE_SLOW_TILE_THRESHOLD=1, MAP_ENGINE_SLOW_TILE_SAMPLE_RATE=0)
+    ):
+        assert not profiling.is_slow(1.5)
+
+
+def test_record_slow_tile_drops_tiles_while_busy():
+    """Test that slow tiles are dropped, if too many tiles are waiting to be explained"""
+    executor = mock.Mock()
+    with mock.patch.object(profiling, "_executor", executor), mock.patch.object(profiling, "_pending", 0):
+        for _ in range(profiling.MAX_PENDING):
+            assert profiling.record_slow_tile("static", 8, 1, 1, {}, 2.0, [("SELECT 1", [])])
+        assert not profiling.record_slow_tile("static", 8, 1, 1, {}, 2.0, [("SELECT 1", [])])
+    assert executor.submit.call_count == profiling.MAX_PENDING
+
+
+def test_serialize_params():
+    """Test that parameters of unknown types are stored as strings"""
+    assert profiling._serialize_params((1, 2.5, "a", object)) == [1, 2.5, "a", str(object)]  # noqa: SLF001
+    assert profiling._serialize_params(None) == []  # noqa: SLF001
@@ -0,0 +1,56 @@
+"""Tests for data revisions used in conditional tile requests"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from django_mapengine import cache, coalesce, compression, mvt, revisions
+
+TURBINE = SimpleNamespace(_meta=SimpleNamespace(label_lower="map.windturbine"))
+PARK = SimpleNamespace(_meta=SimpleNamespace(label_lower="map.windpark"))
+
+
+@mock.patch.object(revisions, "settings", SimpleNamespace(MAP_ENGINE_REVISION_CACHE="revisions"))
+@mock.patch.object(revisions, "caches", {"revisions": LocMemCache("revisions", {})})
+def test_version_changes_with_revision_of_any_model():
+    """Test that version is stable until revision of any related model is bumped"""
+    version, last_modified = revisions.get_version([TURBINE, PARK])
+    assert revisions.get_version([PARK, TURBINE]) == (version, last_modified)
+
+    revision = revisions.get_revision(PARK)
+    assert revisions.bump_revision(PARK) > revision
+    new_version, new_last_modified = revisions.get_version([TURBINE, PARK])
+    assert new_version != version
+    assert new_last_modified >= last_modified
+
+
+def test_cached_tiles_are_keyed_by_version():
+    """Test that tiles cached before a new data revision are not served anymore"""
+    view = mvt.MVTView(source="static", layers=[SimpleNamespace(queryset=SimpleNamespace(model=mock.sentinel.model))])
+    tile_cache = cache.MemoryTileCache()
+    settings = SimpleNamespace(MAP_ENGINE_TILE_REVISIONS=True, MAP_ENGINE_TILE_COALESCING=False)
+    with mock.patch.object(mvt, "settings", settings), mock.patch.object(
+        cache, "get_tile_cache", return_value=tile_cache
+    ), mock.patch.object(coalesce, "settings", SimpleNamespace(MAP_ENGINE_TILE_LOCK_CACHE=None)), mock.patch.object(
+        view, "_render_mvt", side_effect=[b"v1", b"v2"]
+    ), mock.patch.object(
+        revisions, "get_version", return_value=("v1", 0)
+    ):
+        assert view._get_mvt(8, 1, 2, {}) == b"v1"  # noqa: SLF001  # pylint: disable=W0212
+        assert view._get_mvt(8, 1, 2, {}, version="v1") == b"v1"  # noqa: SLF001  # pylint: disable=W0212
+        assert view._get_mvt(8, 1, 2, {}, version="v2") == b"v2"  # noqa: SLF001  # pylint: disable=W0212
+
+
+def test_cached_tiles_are_keyed_by_encoding():
+    """Test that tiles cached with former tile compression are not served with current content encoding"""
+    view = mvt.MVTView(source="static", layers=[])
+    settings = SimpleNamespace(
+        MAP_ENGINE_TILE_REVISIONS=False, MAP_ENGINE_TILE_COMPRESSION=None, MAP_ENGINE_TILE_COMPRESSION_LEVEL=None
+    )
+    with mock.patch.object(mvt, "settings", settings), mock.patch.object(compression, "settings", settings):
+        plain = cache.get_filter_key(view._get_cache_filters({"a": 1}))  # noqa: SLF001  # pylint: disable=W0212
+        settings.MAP_ENGINE_TILE_COMPRESSION = "gzip"
+        gzipped = cache.get_filter_key(view._get_cache_filters({"a": 1}))  # noqa: SLF001  # pylint: disable=W0212
+    assert plain == cache.get_filter_key({"a": 1})
+    assert gzipped != plain
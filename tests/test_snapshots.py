@@ -0,0 +1,82 @@
+"""Tests for snapshots of cluster GeoJSONs"""
+
+import gzip
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import RequestFactory
+
+from django_mapengine import clusters, snapshots
+
+CLUSTER = SimpleNamespace(layer_id="wind", model=SimpleNamespace(_meta=SimpleNamespace(label_lower="map.windturbine")))
+FEATURES = ['{"id": 1}', '{"id": 2}']
+
+
+def get_settings(snapshot_dir, *, revisions=False):  # noqa: ANN001,ANN201
+    return SimpleNamespace(
+        MAP_ENGINE_CLUSTER_SNAPSHOT_DIR=str(snapshot_dir),
+        MAP_ENGINE_TILE_REVISIONS=revisions,
+        MAP_ENGINE_TILE_CACHE_CONTROL="no-cache",
+    )
+
+
+def write_snapshot(snapshot_dir, version="v1"):  # noqa: ANN001,ANN201
+    with mock.patch.object(snapshots, "settings", get_settings(snapshot_dir)), mock.patch.object(
+        clusters, "get_features", return_value=iter(FEATURES)
+    ), mock.patch.object(snapshots.revisions, "get_version", return_value=(version, 0)), mock.patch.object(
+        snapshots, "get_available_encodings", return_value=["gzip"]
+    ):
+        return snapshots.write_snapshot(CLUSTER)
+
+
+def test_write_snapshot(tmp_path):
+    """Test that snapshot is written uncompressed and compressed and hashed deterministically"""
+    metadata = write_snapshot(tmp_path)
+    geojson = (tmp_path / "wind.geojson").read_bytes()
+    assert json.loads(geojson)["features"] == [{"id": 1}, {"id": 2}]
+    assert gzip.decompress((tmp_path / "wind.geojson.gz").read_bytes()) == geojson
+    assert json.loads((tmp_path / "wind.json").read_text()) == metadata
+    assert metadata["version"] == "v1"
+    assert metadata["size"] == len(geojson)
+    assert not list(tmp_path.glob("*.tmp"))
+    assert write_snapshot(tmp_path)["etag"] == metadata["etag"]
+
+
+def test_snapshot_is_stale_after_revision(tmp_path):
+    """Test that snapshot is only served while data version is unchanged (if revisions are activated)"""
+    write_snapshot(tmp_path, version="v1")
+    with mock.patch.object(snapshots, "settings", get_settings(tmp_path, revisions=True)):
+        with mock.patch.object(snapshots.revisions, "get_version", return_value=("v1", 0)):
+            assert snapshots.get_current_snapshot(CLUSTER) is not None
+        with mock.patch.object(snapshots.revisions, "get_version", return_value=("v2", 0)):
+            assert snapshots.get_current_snapshot(CLUSTER) is None
+    with mock.patch.object(snapshots, "settings", get_settings(tmp_path / "missing")):
+        assert snapshots.get_current_snapshot(CLUSTER) is None
+
+
+def test_snapshot_response(tmp_path):
+    """Test that snapshot is served in accepted encoding with strong ETag and answered by 304 if unchanged"""
+    metadata = write_snapshot(tmp_path)
+    factory = RequestFactory()
+    with mock.patch.object(snapshots, "settings", get_settings(tmp_path)):
+        response = snapshots.get_snapshot_response(factory.get("/", HTTP_ACCEPT_ENCODING="gzip"), CLUSTER, metadata)
+        assert response.status_code == 200
+        assert response["Content-Encoding"] == "gzip"
+        assert response["ETag"] == f'"{metadata["etag"]}-gzip"'
+        assert response["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(b"".join(response.streaming_content)) == (tmp_path / "wind.geojson").read_bytes()
+        response.close()
+
+        response = snapshots.get_snapshot_response(factory.get("/"), CLUSTER, metadata)
+        assert not response.has_header("Content-Encoding")
+        assert response["ETag"] == f'"{metadata["etag"]}"'
+        response.close()
+
+        request = factory.get("/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=f'"{metadata["etag"]}-gzip"')
+        response = snapshots.get_snapshot_response(request, CLUSTER, metadata)
+        assert response.status_code == 304
+        assert not response.has_header("Content-Encoding")
+
+        (tmp_path / "wind.geojson").unlink()
+        assert snapshots.get_snapshot_response(factory.get("/"), CLUSTER, metadata) is None
@@ -0,0 +1,36 @@
+"""Tests for source layers of MVT views"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django_mapengine import mvt, setup
+
+QUERYSET = SimpleNamespace(get_columns=lambda z: ["id", "name"], budget=setup.TileBudget(max_features=10))
+
+
+def test_columns_per_zoom():
+    """Test that empty column list is kept and zooms not covered by layer columns fall back to queryset columns"""
+    layer = mvt.MVTSourceLayer("wind", QUERYSET, columns={(0, 8): [], (9, 12): ["id"]})
+    assert layer.get_columns(5) == []
+    assert layer.get_columns(10) == ["id"]
+    assert layer.get_columns(14) == ["id", "name"]
+    assert mvt.MVTSourceLayer("wind", QUERYSET).get_columns(5) == ["id", "name"]
+
+
+def test_budget_per_zoom():
+    """Test that zooms not covered by layer budget fall back to queryset budget"""
+    budget = setup.TileBudget(max_features=5)
+    layer = mvt.MVTSourceLayer("wind", QUERYSET, budget={(0, 8): budget})
+    assert layer.get_budget(5) is budget
+    assert layer.get_budget(10) is QUERYSET.budget
+
+
+def test_layer_mvts_are_concatenated():
+    """Test that layers are encoded in separate queries and concatenated in order of layers"""
+    queryset = SimpleNamespace(get_mvt_query=lambda x, y, z, filters: "SELECT 1", get_columns=lambda z: ["id"])
+    view = mvt.MVTView(source="static", layers=[mvt.MVTSourceLayer(name, queryset) for name in ("wind", "pv")])
+    queries = view._get_layer_queries(range(2), 8, 1, 2, {})  # noqa: SLF001  # pylint: disable=W0212
+    assert [query[0] for query in queries] == [0, 1]
+    assert queries[1][1].endswith("SELECT ST_AsMVT(s1.*, 'pv'), count(*) FROM s1")
+    with mock.patch.object(mvt, "_run_layer_query", side_effect=[[(b"wind", 1)], [(b"pv", 2)]]):
+        assert view._create_layer_mvts(8, 1, 2, {}) == b"windpv"  # noqa: SLF001  # pylint: disable=W0212
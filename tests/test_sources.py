@@ -1,6 +1,10 @@
 """Tests for testing sources module"""
 
+from types import SimpleNamespace
+from unittest import mock
+
 from django.conf import settings
+from django.test import override_settings
 
 import django_mapengine.setup
 from django_mapengine import sources
@@ -79,3 +83,21 @@ def test_cluster_sources_from_settings():
     assert cluster_sources[1].url == "map/clusters/pvroof.geojson"
     assert cluster_sources[1].minzoom is None
     assert cluster_sources[1].maxzoom is None
+
+
+@override_settings(MAP_ENGINE_API_CLUSTERS=[SimpleNamespace(layer_id="wind", server_side=True)])
+def test_server_side_cluster_sources():
+    """Test that server-side clusters are vector sources, which are not clustered by the map"""
+    with mock.patch.object(sources.urls, "reverse_lazy", return_value="/map/"):
+        cluster_sources = list(sources.get_cluster_sources())
+
+    assert len(cluster_sources) == 1
+    assert isinstance(cluster_sources[0], sources.ClusterMapSource)
+    assert cluster_sources[0].type == "vector"
+    assert cluster_sources[0].tiles == ["/map/clusters/wind/{z}/{x}/{y}/"]
+    assert cluster_sources[0].url is None
+
+    source = cluster_sources[0].get_source(SimpleNamespace(scheme="https", get_host=lambda: "example.org"))
+    assert source["tiles"] == ["https://example.org/map/clusters/wind/{z}/{x}/{y}/"]
+    assert "cluster" not in source
+    assert "clusterMaxZoom" not in source